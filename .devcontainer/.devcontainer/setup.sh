@@ -18,5 +18,8 @@ sudo mysql -e "FLUSH PRIVILEGES;"
 # Installer les dépendances Python
 pip install -r requirements.txt
 
+# Créer ou mettre à jour le schéma
+alembic upgrade head
+
 echo "✅ Installation terminée !"
 echo "👉 Pour démarrer l'API : uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
\ No newline at end of file
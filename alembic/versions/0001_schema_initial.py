@@ -0,0 +1,95 @@
+"""Schéma initial (équivalent de scripts/init_database.sql d'origine)
+
+Une base créée avec l'ancien script SQL est déjà à ce niveau :
+    alembic stamp 0001
+    alembic upgrade head
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "utilisateurs",
+        sa.Column("id_utilisateur", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False, unique=True),
+        sa.Column("mot_de_passe_hash", sa.String(255), nullable=False),
+        sa.Column("nom", sa.String(100)),
+        sa.Column("prenom", sa.String(100)),
+        sa.Column("role", sa.Enum("fournisseur", "responsable_technique", "responsable_agent", "agent", name="roleenum"), nullable=False),
+        sa.Column("date_creation", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("est_actif", sa.Boolean()),
+    )
+    op.create_table(
+        "sites",
+        sa.Column("id_site", sa.Integer(), primary_key=True),
+        sa.Column("nom_site", sa.String(255), nullable=False),
+        sa.Column("adresse", sa.Text()),
+        sa.Column("id_responsable_technique", sa.Integer(), sa.ForeignKey("utilisateurs.id_utilisateur")),
+    )
+    op.create_table(
+        "bornes",
+        sa.Column("id_borne", sa.Integer(), primary_key=True),
+        sa.Column("uuid_esp", sa.String(255), nullable=False, unique=True),
+        sa.Column("nom_borne", sa.String(100)),
+        sa.Column("id_site", sa.Integer(), sa.ForeignKey("sites.id_site"), nullable=False),
+        sa.Column("salle_local", sa.String(100), nullable=False),
+        sa.Column("seuil_alerte_gel", sa.Integer()),
+        sa.Column("seuil_alerte_batterie", sa.Integer()),
+        sa.Column("id_agent_affecte", sa.Integer(), sa.ForeignKey("utilisateurs.id_utilisateur")),
+        sa.Column("date_installation", sa.Date()),
+        sa.Column("est_active", sa.Boolean()),
+        sa.Index("idx_site", "id_site"),
+        sa.Index("idx_agent", "id_agent_affecte"),
+    )
+    op.create_table(
+        "mesures",
+        sa.Column("id_mesure", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("id_borne", sa.Integer(), sa.ForeignKey("bornes.id_borne"), nullable=False),
+        sa.Column("niveau_gel", sa.Integer(), nullable=False),
+        sa.Column("niveau_batterie", sa.Integer(), nullable=False),
+        sa.Column("horodatage", sa.DateTime(), server_default=sa.func.now()),
+        sa.Index("idx_borne_horodatage", "id_borne", "horodatage"),
+    )
+    op.create_table(
+        "alertes",
+        sa.Column("id_alerte", sa.Integer(), primary_key=True),
+        sa.Column("id_borne", sa.Integer(), sa.ForeignKey("bornes.id_borne"), nullable=False),
+        sa.Column("type_alerte", sa.Enum("gel_bas", "batterie_basse", "gel_critique", "batterie_critique", name="typealerteenum"), nullable=False),
+        sa.Column("niveau_valeur", sa.Integer(), nullable=False),
+        sa.Column("statut", sa.Enum("nouvelle", "assignee", "resolue", name="statutalerteenum")),
+        sa.Column("id_agent_assignee", sa.Integer(), sa.ForeignKey("utilisateurs.id_utilisateur")),
+        sa.Column("date_declenchement", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("date_resolution", sa.DateTime()),
+        sa.Index("idx_statut", "statut"),
+        sa.Index("idx_borne", "id_borne"),
+    )
+    op.create_table(
+        "interventions",
+        sa.Column("id_intervention", sa.Integer(), primary_key=True),
+        sa.Column("id_borne", sa.Integer(), sa.ForeignKey("bornes.id_borne"), nullable=False),
+        sa.Column("id_agent", sa.Integer(), sa.ForeignKey("utilisateurs.id_utilisateur"), nullable=False),
+        sa.Column("type_intervention", sa.Enum("remplissage_gel", "changement_batterie", "maintenance", name="typeinterventionenum"), nullable=False),
+        sa.Column("date_intervention", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("commentaire", sa.Text()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("interventions")
+    op.drop_table("alertes")
+    op.drop_table("mesures")
+    op.drop_table("bornes")
+    op.drop_table("sites")
+    op.drop_table("utilisateurs")
@@ -0,0 +1,46 @@
+"""Numéro de séquence des mesures et alerte hors ligne
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TYPES_ALERTE = ("gel_bas", "batterie_basse", "gel_critique", "batterie_critique")
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("mesures") as batch:
+        batch.add_column(sa.Column("sequence", sa.BigInteger(), nullable=True))
+        batch.create_unique_constraint("uq_mesure_borne_sequence", ["id_borne", "sequence"])
+
+    with op.batch_alter_table("alertes") as batch:
+        batch.alter_column(
+            "type_alerte",
+            existing_type=sa.Enum(*TYPES_ALERTE, name="typealerteenum"),
+            type_=sa.Enum(*TYPES_ALERTE, "hors_ligne", name="typealerteenum"),
+            existing_nullable=False,
+        )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM alertes WHERE type_alerte = 'hors_ligne'")
+    with op.batch_alter_table("alertes") as batch:
+        batch.alter_column(
+            "type_alerte",
+            existing_type=sa.Enum(*TYPES_ALERTE, "hors_ligne", name="typealerteenum"),
+            type_=sa.Enum(*TYPES_ALERTE, name="typealerteenum"),
+            existing_nullable=False,
+        )
+
+    with op.batch_alter_table("mesures") as batch:
+        batch.drop_constraint("uq_mesure_borne_sequence", type_="unique")
+        batch.drop_column("sequence")
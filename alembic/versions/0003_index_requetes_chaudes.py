@@ -0,0 +1,38 @@
+"""Index composites des alertes actives et des interventions
+
+- get_alertes_actives filtre sur statut (et id_borne) et trie par date_declenchement
+- l'historique des interventions d'une borne est lu par (id_borne, date_intervention)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_alertes_statut_date", "alertes", ["statut", "date_declenchement"])
+    op.create_index("idx_alertes_statut_borne_date", "alertes", ["statut", "id_borne", "date_declenchement"])
+    op.create_index("idx_alertes_borne_date", "alertes", ["id_borne", "date_declenchement"])
+    # Couverts par les index composites ci-dessus
+    op.drop_index("idx_statut", table_name="alertes")
+    op.drop_index("idx_borne", table_name="alertes")
+
+    op.create_index("idx_interventions_borne_date", "interventions", ["id_borne", "date_intervention"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_interventions_borne_date", table_name="interventions")
+
+    op.create_index("idx_borne", "alertes", ["id_borne"])
+    op.create_index("idx_statut", "alertes", ["statut"])
+    op.drop_index("idx_alertes_borne_date", table_name="alertes")
+    op.drop_index("idx_alertes_statut_borne_date", table_name="alertes")
+    op.drop_index("idx_alertes_statut_date", table_name="alertes")
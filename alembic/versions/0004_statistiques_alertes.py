@@ -0,0 +1,70 @@
+"""Tables de statistiques journalières des alertes et interventions
+
+- stats_alertes_jour, stats_resolutions_jour, stats_interventions_jour :
+  agrégats recalculés de façon incrémentale par app/core/analyses.py
+- index par date pour leur rafraîchissement et l'historique paginé
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TYPES_ALERTE = sa.Enum("gel_bas", "batterie_basse", "gel_critique", "batterie_critique", "hors_ligne", name="typealerteenum")
+TYPES_INTERVENTION = sa.Enum("remplissage_gel", "changement_batterie", "maintenance", name="typeinterventionenum")
+
+
+def upgrade() -> None:
+    op.create_index("idx_alertes_date", "alertes", ["date_declenchement"])
+    op.create_index("idx_alertes_date_resolution", "alertes", ["date_resolution"])
+    op.create_index("idx_interventions_date", "interventions", ["date_intervention"])
+
+    op.create_table(
+        "stats_alertes_jour",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("jour", sa.Date(), nullable=False),
+        sa.Column("id_borne", sa.Integer(), nullable=False),
+        sa.Column("type_alerte", TYPES_ALERTE, nullable=False),
+        sa.Column("nb_declenchees", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("jour", "id_borne", "type_alerte", name="uq_stats_alertes_jour"),
+    )
+    op.create_table(
+        "stats_resolutions_jour",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("jour", sa.Date(), nullable=False),
+        sa.Column("id_borne", sa.Integer(), nullable=False),
+        sa.Column("id_agent", sa.Integer(), nullable=True),
+        sa.Column("type_alerte", TYPES_ALERTE, nullable=False),
+        sa.Column("nb_resolues", sa.Integer(), nullable=False),
+        sa.Column("duree_totale_secondes", sa.BigInteger(), nullable=False),
+        sa.Column("duree_max_secondes", sa.BigInteger(), nullable=False),
+        sa.UniqueConstraint("jour", "id_borne", "id_agent", "type_alerte", name="uq_stats_resolutions_jour"),
+    )
+    op.create_table(
+        "stats_interventions_jour",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("jour", sa.Date(), nullable=False),
+        sa.Column("id_borne", sa.Integer(), nullable=False),
+        sa.Column("id_agent", sa.Integer(), nullable=False),
+        sa.Column("type_intervention", TYPES_INTERVENTION, nullable=False),
+        sa.Column("nb", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("jour", "id_borne", "id_agent", "type_intervention", name="uq_stats_interventions_jour"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stats_interventions_jour")
+    op.drop_table("stats_resolutions_jour")
+    op.drop_table("stats_alertes_jour")
+
+    op.drop_index("idx_interventions_date", table_name="interventions")
+    op.drop_index("idx_alertes_date_resolution", table_name="alertes")
+    op.drop_index("idx_alertes_date", table_name="alertes")
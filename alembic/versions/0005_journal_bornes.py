@@ -0,0 +1,33 @@
+"""Journal des changements de bornes pour la synchronisation incrémentale
+
+- journal_bornes : une ligne par borne modifiée (mesure, alerte, seuils,
+  affectation), écrite dans la transaction du changement par app/core/journal.py
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "journal_bornes",
+        sa.Column("id_changement", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("id_borne", sa.Integer(), nullable=False),
+        sa.Column("date_changement", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("idx_journal_bornes_date", "journal_bornes", ["date_changement"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_journal_bornes_date", table_name="journal_bornes")
+    op.drop_table("journal_bornes")
@@ -0,0 +1,32 @@
+"""Heatmaps d'utilisation des bornes par jour de la semaine et heure
+
+- heatmaps_bornes : compteurs 7 × 24 par borne (tableaux uint32 binaires),
+  tenus à jour de façon incrémentale par app/core/heatmaps.py
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "heatmaps_bornes",
+        sa.Column("id_borne", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("utilisations", sa.LargeBinary(), nullable=False),
+        sa.Column("gel_consomme", sa.LargeBinary(), nullable=False),
+        sa.Column("date_maj", sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("heatmaps_bornes")
@@ -0,0 +1,32 @@
+"""Filtre du bruit des capteurs, réglable par borne
+
+- bornes.filtre_mesures, bornes.filtre_fenetre : filtre appliqué aux mesures
+  avant la décision d'alerte (NULL : réglage par défaut de la configuration)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FILTRES = sa.Enum("aucun", "mediane", "rebond", name="filtremesuresenum")
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("bornes") as batch:
+        batch.add_column(sa.Column("filtre_mesures", FILTRES, nullable=True))
+        batch.add_column(sa.Column("filtre_fenetre", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("bornes") as batch:
+        batch.drop_column("filtre_fenetre")
+        batch.drop_column("filtre_mesures")
@@ -0,0 +1,45 @@
+"""Outbox des notifications d'alerte
+
+- outbox_notifications : une notification par alerte créée, écrite dans la
+  même transaction, puis envoyée par le répartiteur de app/core/outbox.py
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TYPES_ALERTE = sa.Enum("gel_bas", "batterie_basse", "gel_critique", "batterie_critique", "hors_ligne", name="typealerteenum")
+STATUTS = sa.Enum("en_attente", "envoyee", "abandonnee", name="statutnotificationenum")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "outbox_notifications",
+        sa.Column("id_notification", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("id_alerte", sa.Integer(), nullable=False),
+        sa.Column("id_borne", sa.Integer(), nullable=False),
+        sa.Column("id_agent", sa.Integer(), nullable=True),
+        sa.Column("type_alerte", TYPES_ALERTE, nullable=False),
+        sa.Column("niveau_valeur", sa.Integer()),
+        sa.Column("date_creation", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("statut", STATUTS, nullable=False),
+        sa.Column("tentatives", sa.Integer(), nullable=False),
+        sa.Column("prochain_essai", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("date_envoi", sa.DateTime(), nullable=True),
+        sa.Column("erreur", sa.String(255), nullable=True),
+    )
+    op.create_index("idx_outbox_a_envoyer", "outbox_notifications", ["statut", "prochain_essai"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_outbox_a_envoyer", table_name="outbox_notifications")
+    op.drop_table("outbox_notifications")
@@ -0,0 +1,28 @@
+"""Clés d'authentification des bornes
+
+- bornes.cle_sel : sel de la clé HMAC de la borne, dérivée de la clé
+  maîtresse du serveur (NULL : borne sans clé)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("bornes") as batch:
+        batch.add_column(sa.Column("cle_sel", sa.String(32), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("bornes") as batch:
+        batch.drop_column("cle_sel")
@@ -0,0 +1,63 @@
+"""Déduplication des mesures par séquence et horodatage
+
+- mesures : la contrainte unique (id_borne, sequence) devient
+  (id_borne, sequence, horodatage). Le compteur de séquence d'un ESP32
+  repart de zéro à son redémarrage : ses nouvelles mesures ne doivent
+  plus être prises pour des renvois.
+
+La table `mesures` des shards (SHARDS_MESURES) est modifiée de la même
+façon, sauf en mode hors ligne (--sql).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from typing import Callable, Sequence, Union
+
+from alembic import context, op
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _toutes_les_bases(modifier: Callable[[Operations], None]) -> None:
+    """Applique `modifier` à la base principale puis à chaque shard de mesures."""
+    modifier(op)
+    if context.is_offline_mode():
+        return
+    for url in settings.SHARDS_MESURES.values():
+        moteur = sa.create_engine(url)
+        try:
+            with moteur.begin() as connexion:
+                modifier(Operations(MigrationContext.configure(connexion)))
+        finally:
+            moteur.dispose()
+
+
+def _par_horodatage(operations: Operations) -> None:
+    with operations.batch_alter_table("mesures") as batch:
+        batch.drop_constraint("uq_mesure_borne_sequence", type_="unique")
+        batch.create_unique_constraint(
+            "uq_mesure_borne_sequence_horodatage", ["id_borne", "sequence", "horodatage"]
+        )
+
+
+def _par_sequence(operations: Operations) -> None:
+    with operations.batch_alter_table("mesures") as batch:
+        batch.drop_constraint("uq_mesure_borne_sequence_horodatage", type_="unique")
+        batch.create_unique_constraint("uq_mesure_borne_sequence", ["id_borne", "sequence"])
+
+
+def upgrade() -> None:
+    _toutes_les_bases(_par_horodatage)
+
+
+def downgrade() -> None:
+    _toutes_les_bases(_par_sequence)
@@ -0,0 +1,32 @@
+"""Anciennes affectations dans le journal des changements de bornes
+
+- journal_bornes.ancien_id_agent, ancien_id_site : agent et site de la
+  borne avant une réaffectation ou un changement de site (NULL pour les
+  autres changements). La synchronisation incrémentale ne signale comme
+  retirées que les bornes que l'utilisateur voyait avant ce changement.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("journal_bornes") as batch:
+        batch.add_column(sa.Column("ancien_id_agent", sa.Integer(), nullable=True))
+        batch.add_column(sa.Column("ancien_id_site", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("journal_bornes") as batch:
+        batch.drop_column("ancien_id_site")
+        batch.drop_column("ancien_id_agent")
@@ -0,0 +1,36 @@
+"""Nonces des bornes partagés entre les processus
+
+- nonces_bornes : nonces des requêtes signées des bornes pendant la
+  fenêtre de leur horodatage. La clé (uuid_esp, nonce) fait refuser une
+  requête rejouée vers un autre worker que celui qui l'a reçue ; les
+  nonces expirés sont purgés par une tâche de fond.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "nonces_bornes",
+        sa.Column("uuid_esp", sa.String(255), nullable=False),
+        sa.Column("nonce", sa.String(64), nullable=False),
+        sa.Column("expiration", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("uuid_esp", "nonce"),
+    )
+    op.create_index("idx_nonces_expiration", "nonces_bornes", ["expiration"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_nonces_expiration", table_name="nonces_bornes")
+    op.drop_table("nonces_bornes")
@@ -0,0 +1,23 @@
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core import security
+from app.core.shards import carte_shards
+from app.database import get_db_lecture
+
+# Dépendance pour vérifier l'authentification
+def get_current_user_role(token: str = Depends(security.oauth2_scheme)) -> dict:
+    """Récupère le rôle de l'utilisateur depuis le token JWT."""
+    payload = security.verify_token(token)
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide ou expiré"
+        )
+    return {"email": payload.get("sub"), "role": payload.get("role")}
+
+# Dépendance pour lire les mesures d'une borne
+def get_db_mesures(borne_id: int, db: Session = Depends(get_db_lecture)):
+    """Fournit la session de la base qui stocke les mesures de la borne (shard de son site)."""
+    with carte_shards.session_borne(db, borne_id) as session:
+        yield session
@@ -0,0 +1,171 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import get_db, get_db_lecture, get_db_rapports
+from app import models, schemas
+from app.api.deps import get_current_user_role
+from app.core.alerts import resoudre_alertes
+from app.core.evenements import ALERTES_MODIFIEES, publier
+from app.core.pagination import TAILLE_PAGE, TAILLE_PAGE_MAX, apres_curseur, decouper_page, entre_jours
+from app.core.isolation import LECTURE, RAPPORTS, isoler
+from app.core.outbox import repartiteur_notifications
+from app.core.requetes_preparees import utilisateur_par_email
+
+router = APIRouter()
+
+def _resoudre(db: Session, user: dict, criteres: dict, commentaire: str) -> dict:
+    """Résout les alertes au nom de l'utilisateur connecté (un agent ne touche qu'à ses bornes)."""
+    utilisateur = utilisateur_par_email(db, user["email"])
+    
+    if not utilisateur:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+    
+    agent_restreint_id = utilisateur.id_utilisateur if user["role"] == "agent" else None
+    
+    try:
+        resultat = resoudre_alertes(
+            db,
+            agent_id=utilisateur.id_utilisateur,
+            agent_restreint_id=agent_restreint_id,
+            commentaire=commentaire,
+            **criteres
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de la résolution: {str(e)}"
+        )
+    
+    publier(ALERTES_MODIFIEES, ids=resultat["ids_bornes"])
+    return resultat
+
+@router.get("/historique", response_model=schemas.PageAlertes)
+@isoler(LECTURE)
+def get_historique_alertes(
+    borne_id: Optional[int] = None,
+    site_id: Optional[int] = None,
+    type_alerte: Optional[schemas.TypeAlerteEnum] = None,
+    statut: Optional[schemas.StatutAlerteEnum] = None,
+    debut: Optional[date] = Query(None, description="Déclenchées à partir de ce jour"),
+    fin: Optional[date] = Query(None, description="Déclenchées jusqu'à ce jour inclus"),
+    curseur: Optional[str] = Query(None, description="curseur_suivant de la page précédente"),
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
+):
+    """
+    Historique des alertes (actives et résolues), plus récentes en premier.
+    
+    Paginé par curseur : chaque page se lit en temps constant, quelle que soit
+    sa position dans l'historique. Un agent ne voit que les alertes de ses bornes.
+    """
+    query = select(models.Alerte)
+    
+    if user["role"] == "agent" or site_id is not None:
+        query = query.join(models.Borne, models.Borne.id_borne == models.Alerte.id_borne)
+    if user["role"] == "agent":
+        query = query.join(
+            models.Utilisateur, models.Utilisateur.id_utilisateur == models.Borne.id_agent_affecte
+        ).where(models.Utilisateur.email == user["email"])
+    
+    if borne_id is not None:
+        query = query.where(models.Alerte.id_borne == borne_id)
+    if site_id is not None:
+        query = query.where(models.Borne.id_site == site_id)
+    if type_alerte is not None:
+        query = query.where(models.Alerte.type_alerte == models.TypeAlerteEnum(type_alerte.value))
+    if statut is not None:
+        query = query.where(models.Alerte.statut == models.StatutAlerteEnum(statut.value))
+    query = query.where(*entre_jours(models.Alerte.date_declenchement, debut, fin))
+    
+    if curseur:
+        try:
+            query = query.where(apres_curseur(models.Alerte.date_declenchement, models.Alerte.id_alerte, curseur))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Curseur invalide"
+            )
+    
+    lignes = db.scalars(
+        query.order_by(models.Alerte.date_declenchement.desc(), models.Alerte.id_alerte.desc()).limit(taille + 1)
+    ).all()
+    return decouper_page(lignes, taille, "date_declenchement", "id_alerte")
+
+@router.get("/notifications", response_model=schemas.EtatNotifications)
+@isoler(LECTURE)
+def get_etat_notifications(
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
+):
+    """
+    État de l'outbox des notifications d'alerte : notifications en attente,
+    envoyées, abandonnées, et compteurs du répartiteur de ce processus.
+    
+    **Permissions**: fournisseur uniquement.
+    """
+    if user["role"] != "fournisseur":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: droits insuffisants"
+        )
+    return repartiteur_notifications.etat(db)
+
+@router.post("/resoudre", response_model=schemas.ResultatResolutionAlertes)
+@isoler(RAPPORTS)
+def resoudre_alertes_groupees(
+    resolution: schemas.ResolutionAlertes,
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Résout en bloc les alertes actives.
+    
+    - **ids_alertes**: Liste d'alertes à résoudre
+    - **borne_id**: Toutes les alertes actives d'une borne
+    - **site_id**: Toutes les alertes actives d'un site
+    
+    Les critères se combinent (ET). Une intervention est tracée par borne et par type.
+    Un agent ne peut résoudre que les alertes des bornes qui lui sont affectées.
+    """
+    criteres = {
+        "ids_alertes": resolution.ids_alertes,
+        "borne_id": resolution.borne_id,
+        "site_id": resolution.site_id
+    }
+    if all(valeur is None for valeur in criteres.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Au moins un critère est requis (ids_alertes, borne_id ou site_id)"
+        )
+    
+    return _resoudre(db, user, criteres, resolution.commentaire)
+
+@router.post("/{alerte_id}/resoudre", response_model=schemas.ResultatResolutionAlertes)
+async def resoudre_une_alerte(
+    alerte_id: int,
+    commentaire: str = "",
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db)
+):
+    """
+    Résout une alerte active et trace l'intervention correspondante.
+    """
+    resultat = _resoudre(db, user, {"ids_alertes": [alerte_id]}, commentaire)
+    
+    if not resultat["alertes_resolues"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Alerte active ID {alerte_id} non trouvée"
+        )
+    
+    return resultat
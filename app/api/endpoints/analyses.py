@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.database import get_db_rapports
+from app import models, schemas
+from app.api.deps import get_current_user_role
+from app.core import analyses
+from app.core.isolation import RAPPORTS, isoler
+
+router = APIRouter()
+
+# Période par défaut des rapports
+JOURS_PAR_DEFAUT = 30
+
+def _verifier_acces(user: dict):
+    if user["role"] not in ["fournisseur", "responsable_technique", "responsable_agent"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: droits insuffisants"
+        )
+
+def _periode(debut: Optional[date], fin: Optional[date]):
+    fin = fin or date.today()
+    debut = debut or fin - timedelta(days=JOURS_PAR_DEFAUT - 1)
+    if fin < debut:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fin de la période doit être postérieure à son début"
+        )
+    return debut, fin
+
+def _type_alerte(type_alerte: Optional[schemas.TypeAlerteEnum]):
+    return models.TypeAlerteEnum(type_alerte.value) if type_alerte else None
+
+@router.get("/mttr", response_model=List[schemas.LigneMTTR])
+@isoler(RAPPORTS)
+def get_mttr(
+    par: str = Query("site", pattern="^(site|agent|borne)$", description="Regroupement"),
+    debut: Optional[date] = Query(None, description=f"Défaut : {JOURS_PAR_DEFAUT} derniers jours"),
+    fin: Optional[date] = None,
+    site_id: Optional[int] = None,
+    type_alerte: Optional[schemas.TypeAlerteEnum] = None,
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Temps moyen de résolution (MTTR) des alertes résolues sur la période, par site, agent ou borne.
+
+    Classé du plus long au plus court (`rang`). L'agent d'une résolution est celui
+    assigné à l'alerte, sinon celui affecté à la borne.
+
+    **Permissions**: fournisseur, responsable_technique ou responsable_agent.
+    """
+    _verifier_acces(user)
+    debut, fin = _periode(debut, fin)
+    analyses.statistiques_a_jour(db)
+    return analyses.mttr(db, debut, fin, par, site_id, _type_alerte(type_alerte))
+
+@router.get("/frequence-alertes", response_model=schemas.PageFrequenceAlertes)
+@isoler(RAPPORTS)
+def get_frequence_alertes(
+    debut: Optional[date] = Query(None, description=f"Défaut : {JOURS_PAR_DEFAUT} derniers jours"),
+    fin: Optional[date] = None,
+    site_id: Optional[int] = None,
+    type_alerte: Optional[schemas.TypeAlerteEnum] = None,
+    page: int = Query(1, ge=1),
+    taille: int = Query(50, ge=1, le=500),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Nombre d'alertes déclenchées par borne sur la période, des plus fréquentes aux moins fréquentes.
+
+    Le détail d'une borne est donné par `GET /api/alertes/historique?borne_id=...`.
+
+    **Permissions**: fournisseur, responsable_technique ou responsable_agent.
+    """
+    _verifier_acces(user)
+    debut, fin = _periode(debut, fin)
+    analyses.statistiques_a_jour(db)
+    return analyses.frequence_alertes(db, debut, fin, page, taille, site_id, _type_alerte(type_alerte))
+
+@router.get("/interventions", response_model=List[schemas.InterventionsPeriode])
+@isoler(RAPPORTS)
+def get_interventions_par_periode(
+    periode: str = Query("semaine", pattern="^(jour|semaine|mois)$"),
+    debut: Optional[date] = Query(None, description=f"Défaut : {JOURS_PAR_DEFAUT} derniers jours"),
+    fin: Optional[date] = None,
+    site_id: Optional[int] = None,
+    agent_id: Optional[int] = None,
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Nombre d'interventions par jour, semaine (commençant le lundi) ou mois, par type et en cumul.
+
+    Le détail est donné par `GET /api/interventions/`.
+
+    **Permissions**: fournisseur, responsable_technique ou responsable_agent.
+    """
+    _verifier_acces(user)
+    debut, fin = _periode(debut, fin)
+    analyses.statistiques_a_jour(db)
+    return analyses.interventions_par_periode(db, debut, fin, periode, site_id, agent_id)
@@ -3,10 +3,12 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
-from app.database import get_db
+from app.database import get_db, get_db_lecture
 from app import models, schemas
 from app.core import security
 from app.core.config import settings
+from app.core.isolation import LECTURE, isoler
+from app.core.requetes_preparees import utilisateur_par_email
 
 router = APIRouter()
 
@@ -27,9 +29,7 @@ async def login(
     Retourne un token JWT valide pour les requêtes suivantes.
     """
     # Rechercher l'utilisateur par email
-    utilisateur = db.query(models.Utilisateur).filter(
-        models.Utilisateur.email == form_data.username
-    ).first()
+    utilisateur = utilisateur_par_email(db, form_data.username)
     
     # Vérifier si l'utilisateur existe et le mot de passe est correct
     if not utilisateur or not security.verify_password(form_data.password, utilisateur.mot_de_passe_hash):
@@ -71,9 +71,7 @@ async def register(
     et seul un administrateur pourrait créer certains types de comptes.
     """
     # Vérifier si l'email est déjà utilisé
-    existing_user = db.query(models.Utilisateur).filter(
-        models.Utilisateur.email == utilisateur.email
-    ).first()
+    existing_user = utilisateur_par_email(db, utilisateur.email)
     
     if existing_user:
         raise HTTPException(
@@ -105,9 +103,10 @@ async def register(
         )
 
 @router.get("/me", response_model=schemas.Utilisateur)
-async def get_current_user(
+@isoler(LECTURE)
+def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lecture)
 ):
     """
     Retourne les informations de l'utilisateur connecté.
@@ -122,9 +121,7 @@ async def get_current_user(
             detail="Token invalide ou expiré"
         )
     
-    utilisateur = db.query(models.Utilisateur).filter(
-        models.Utilisateur.email == email
-    ).first()
+    utilisateur = utilisateur_par_email(db, email)
     
     if not utilisateur:
         raise HTTPException(
@@ -135,9 +132,10 @@ async def get_current_user(
     return utilisateur
 
 @router.get("/users", response_model=list[schemas.Utilisateur])
-async def get_all_users(
+@isoler(LECTURE)
+def get_all_users(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lecture)
 ):
     """
     Retourne la liste de tous les utilisateurs.
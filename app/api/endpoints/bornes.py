@@ -1,31 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from typing import List, Optional, Union
 
-from app.database import get_db
+from app.database import get_db, get_db_lecture, get_db_rapports
+from app.core.config import settings
 from app import models, schemas
-from app.core import security
+from app.api.deps import get_current_user_role
 from app.core.alerts import get_alertes_actives
+from app.core.auth_bornes import authentification_bornes, deriver_cle, nouveau_sel
+from app.core.evenements import BORNES_MODIFIEES, publier
+from app.core import heatmaps
+from app.core.journal import CurseurExpire, affectations, changements, curseur_courant, journaliser
+from app.core.provisionnement import lire_lignes, provisionner_bornes
+from app.core.requetes import (
+    borne_depuis_ligne, completer_dernieres_mesures, projection_bornes, requete_bornes, requete_bornes_details
+)
+from app.core.depot_mesures import depot_mesures
+from app.core.shards import carte_shards
+from app.core.serialisation import reponse_json
+from app.core.isolation import LECTURE, RAPPORTS, Saturation, controle_admission, isoler
 
 router = APIRouter()
 
-# Dépendance pour vérifier l'authentification
-def get_current_user_role(token: str = Depends(security.oauth2_scheme)) -> dict:
-    """Récupère le rôle de l'utilisateur depuis le token JWT."""
-    payload = security.verify_token(token)
-    if not payload:
+# Paramètres de réduction des réponses des bornes
+DESCRIPTION_FIELDS = "Champs de la borne à retourner, séparés par des virgules (id_borne toujours inclus)"
+DESCRIPTION_EXPAND = "Données associées à inclure : site, agent, etat (dernière mesure), alertes (nombre actives)"
+
+def _projection(fields: Optional[str], expand: Optional[str]):
+    try:
+        return projection_bornes(fields, expand)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token invalide ou expiré"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-    return {"email": payload.get("sub"), "role": payload.get("role")}
 
-@router.get("/", response_model=List[schemas.BorneAvecDetails])
-async def get_bornes(
+def _bornes_visibles(query, user: dict):
+    """Restreint une requête sur les bornes à celles que le rôle de l'utilisateur permet de voir."""
+    utilisateur = select(models.Utilisateur.id_utilisateur).where(
+        models.Utilisateur.email == user["email"]
+    ).scalar_subquery()
+    if user["role"] == "agent":
+        return query.where(models.Borne.id_agent_affecte == utilisateur)
+    if user["role"] == "responsable_technique":
+        return query.where(models.Borne.id_site.in_(
+            select(models.Site.id_site).where(models.Site.id_responsable_technique == utilisateur)
+        ))
+    return query
+
+@router.get("/", response_model=Union[List[schemas.BorneAvecDetails], List[schemas.BornePartielle]])
+@isoler(LECTURE)
+def get_bornes(
     user: dict = Depends(get_current_user_role),
     site_id: Optional[int] = Query(None, description="Filtrer par site"),
     avec_alertes: bool = Query(False, description="Inclure uniquement les bornes avec alertes actives"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description=DESCRIPTION_FIELDS),
+    expand: Optional[str] = Query(None, description=DESCRIPTION_EXPAND),
+    db: Session = Depends(get_db_lecture)
 ):
     """
     Retourne la liste des bornes.
@@ -39,62 +72,173 @@ async def get_bornes(
     Filtres disponibles:
     - **site_id**: Filtrer par site
     - **avec_alertes**: Retourner uniquement les bornes avec alertes actives
+    
+    Réponses réduites (listes déroulantes, clients légers) :
+    - **fields**: ex. `fields=nom_borne,salle_local`, seuls ces champs sont lus
+    - **expand**: ex. `expand=site,etat`, seules ces jointures sont faites
+    
+    Sans `fields` ni `expand`, la réponse est complète (site, agent et dernière mesure).
     """
-    query = db.query(models.Borne).options(
-        joinedload(models.Borne.site),
-        joinedload(models.Borne.agent_affecte)
-    )
+    champs, expansions = _projection(fields, expand)
     
-    # Filtrer par rôle
-    if user["role"] == "agent":
-        # Un agent ne voit que ses bornes affectées
-        query = query.filter(models.Borne.id_agent_affecte != None)
+    # Mesures hors de la base principale (shards, segments) : dernière mesure complétée après coup
+    query = requete_bornes(champs, expansions, avec_derniere_mesure=depot_mesures.jointure_sql)
+    
+    # Filtrer par rôle (même règle que /changements, pour la synchronisation des clients)
+    query = _bornes_visibles(query, user)
     
     # Filtrer par site
     if site_id:
-        query = query.filter(models.Borne.id_site == site_id)
+        query = query.where(models.Borne.id_site == site_id)
     
     # Filtrer par alertes actives
     if avec_alertes:
-        borne_ids_avec_alertes = [
-            alerte.id_borne for alerte in get_alertes_actives(db)
-        ]
-        if borne_ids_avec_alertes:
-            query = query.filter(models.Borne.id_borne.in_(borne_ids_avec_alertes))
-        else:
-            return []
-    
-    bornes = query.all()
-    
-    # Enrichir les données avec les dernières mesures
-    result = []
-    for borne in bornes:
-        derniere_mesure = db.query(models.Mesure).filter(
-            models.Mesure.id_borne == borne.id_borne
-        ).order_by(models.Mesure.horodatage.desc()).first()
-        
-        borne_dict = {
-            **borne.__dict__,
-            "site_nom": borne.site.nom_site if borne.site else None,
-            "agent_nom": f"{borne.agent_affecte.prenom} {borne.agent_affecte.nom}" if borne.agent_affecte else None,
-            "dernier_niveau_gel": derniere_mesure.niveau_gel if derniere_mesure else None,
-            "dernier_niveau_batterie": derniere_mesure.niveau_batterie if derniere_mesure else None,
-            "derniere_mesure": derniere_mesure.horodatage if derniere_mesure else None
-        }
-        result.append(borne_dict)
-    
-    return result
+        query = query.where(models.Borne.id_borne.in_(
+            select(models.Alerte.id_borne).where(
+                models.Alerte.statut.in_([models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE])
+            )
+        ))
+    
+    # Lignes SQL sérialisées directement, sans objets ORM ni revalidation
+    bornes = [borne_depuis_ligne(ligne) for ligne in db.execute(query)]
+    if "etat" in expansions and not depot_mesures.jointure_sql:
+        completer_dernieres_mesures(bornes)
+    return reponse_json(bornes)
+
+@router.get("/changements", response_model=schemas.ChangementsBornes)
+@isoler(LECTURE)
+def get_changements_bornes(
+    depuis: Optional[int] = Query(None, ge=0, description="curseur de la réponse précédente"),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
+):
+    """
+    Bornes dont l'état (mesure), les seuils, l'affectation ou les alertes ont changé depuis `depuis`.
+    
+    Sans `depuis`, retourne seulement le curseur courant. Synchronisation d'un client :
+    1. `GET /api/bornes/changements` pour obtenir un curseur
+    2. `GET /api/bornes/` pour la liste complète
+    3. puis périodiquement `GET /api/bornes/changements?depuis=<curseur>` ; tant que
+       `reste` est vrai, rappeler aussitôt avec le nouveau curseur
+    
+    Une même borne peut être renvoyée plusieurs fois : le client remplace sa copie.
+    `ids_retires` liste les bornes que l'utilisateur voyait et ne voit plus (réaffectation, changement de site).
+    Un curseur plus ancien que la rétention du journal renvoie 410 : refaire l'étape 2.
+    
+    Les permissions suivent le rôle : un agent ne voit que ses bornes, un
+    responsable technique celles de ses sites.
+    """
+    if depuis is None:
+        return reponse_json({"curseur": curseur_courant(db), "reste": False, "bornes": [], "ids_retires": []})
+    
+    try:
+        ids_bornes, anciennes, curseur, reste = changements(db, depuis, settings.JOURNAL_LIMITE)
+    except CurseurExpire:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Curseur expiré: resynchroniser la liste complète avec GET /api/bornes/"
+        )
+    
+    bornes = []
+    if ids_bornes:
+        query = _bornes_visibles(
+            requete_bornes_details(avec_derniere_mesure=depot_mesures.jointure_sql, ids_bornes=ids_bornes), user
+        )
+        bornes = [borne_depuis_ligne(ligne) for ligne in db.execute(query)]
+        if not depot_mesures.jointure_sql:
+            completer_dernieres_mesures(bornes)
+    
+    if bornes:
+        alertes = dict(db.execute(
+            select(models.Alerte.id_borne, func.count())
+            .where(
+                models.Alerte.id_borne.in_([borne["id_borne"] for borne in bornes]),
+                models.Alerte.statut.in_([models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE])
+            )
+            .group_by(models.Alerte.id_borne)
+        ).all())
+        for borne in bornes:
+            borne["alertes_actives"] = alertes.get(borne["id_borne"], 0)
+    
+    visibles = {borne["id_borne"] for borne in bornes}
+    return reponse_json({
+        "curseur": curseur,
+        "reste": reste,
+        "bornes": bornes,
+        "ids_retires": _ids_retires(db, user, anciennes, visibles),
+    })
+
+def _ids_retires(db: Session, user: dict, anciennes: dict, visibles: set) -> List[int]:
+    """
+    Bornes que l'utilisateur voyait avant une réaffectation ou un changement
+    de site lus dans le journal, et qu'il ne voit plus.
+    """
+    if not anciennes or user["role"] not in ("agent", "responsable_technique"):
+        return []
+    utilisateur = db.scalar(
+        select(models.Utilisateur.id_utilisateur).where(models.Utilisateur.email == user["email"])
+    )
+    if user["role"] == "agent":
+        voyait = lambda agent, site: agent == utilisateur
+    else:
+        sites = set(db.scalars(
+            select(models.Site.id_site).where(models.Site.id_responsable_technique == utilisateur)
+        ))
+        voyait = lambda agent, site: site in sites
+    return sorted(
+        id_borne for id_borne, avant in anciennes.items()
+        if id_borne not in visibles and any(voyait(agent, site) for agent, site in avant)
+    )
+
+def _reponse_heatmap(utilisations, gel, nb_bornes: int, **portee) -> dict:
+    return {
+        "fuseau": settings.HEATMAP_FUSEAU,
+        **portee,
+        "nb_bornes": nb_bornes,
+        "utilisations": heatmaps.en_grille(utilisations),
+        "gel_consomme": heatmaps.en_grille(gel),
+        "total_utilisations": int(utilisations.sum()),
+        "total_gel_consomme": int(gel.sum()),
+    }
+
+@router.get("/heatmap", response_model=schemas.HeatmapUtilisation)
+@isoler(LECTURE)
+def get_heatmap_site(
+    site_id: int,
+    salle_local: Optional[str] = Query(None, description="Limiter à une salle du site"),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
+):
+    """
+    Utilisation des bornes d'un site (ou d'une salle) par jour de la semaine et heure.
+    
+    Somme des heatmaps des bornes visibles par l'utilisateur. Les compteurs
+    sont enregistrés en base avec un léger différé (HEATMAP_ENREGISTREMENT_SECONDES).
+    """
+    query = _bornes_visibles(select(models.Borne.id_borne).where(models.Borne.id_site == site_id), user)
+    if salle_local is not None:
+        query = query.where(models.Borne.salle_local == salle_local)
+    ids_bornes = list(db.scalars(query))
+    
+    utilisations, gel = heatmaps.cumuler(db, ids_bornes)
+    return _reponse_heatmap(utilisations, gel, len(ids_bornes), id_site=site_id, salle_local=salle_local)
 
 # --- ROUTE AJOUTÉE POUR LA CRÉATION ---
-@router.post("/", response_model=schemas.Borne, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=schemas.BorneCreee, status_code=status.HTTP_201_CREATED)
 async def create_borne(
     borne: schemas.BorneCreate,
+    avec_cle: bool = Query(False, description="Générer la clé HMAC de la borne (firmware qui signe ses mesures)"),
     user: dict = Depends(get_current_user_role),
     db: Session = Depends(get_db)
 ):
     """
     Crée une nouvelle borne.
     Permission : Fournisseur ou Responsable Technique uniquement.
+    
+    Avec `avec_cle=true`, la réponse contient `cle_borne`, la clé HMAC qui
+    signe les mesures de la borne (en-têtes `X-Borne-*`). Elle n'est affichée
+    qu'une fois : seul son sel est conservé en base. Sans clé, la borne envoie
+    ses mesures sans signature (mode `si_cle`) ; `POST /{id}/cle` lui en donne une.
     """
     # 1. Vérification des droits
     if user["role"] not in ["fournisseur", "responsable_technique"]:
@@ -112,12 +256,19 @@ async def create_borne(
         )
 
     # 3. Création et Sauvegarde
-    new_borne = models.Borne(**borne.dict())
+    new_borne = models.Borne(**borne.dict(), cle_sel=nouveau_sel() if avec_cle else None)
     db.add(new_borne)
     try:
+        db.flush()
+        journaliser(db, [new_borne.id_borne])
         db.commit()
         db.refresh(new_borne)
-        return new_borne
+        publier(BORNES_MODIFIEES, ids=[new_borne.id_borne])
+        cle = deriver_cle(new_borne.uuid_esp, new_borne.cle_sel) if avec_cle else None
+        authentification_bornes.cles.enregistrer(new_borne.uuid_esp, cle)
+        return schemas.BorneCreee(
+            **schemas.Borne.model_validate(new_borne).dict(), cle_borne=cle.hex() if cle else None
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -126,43 +277,220 @@ async def create_borne(
         )
 # --------------------------------------
 
-@router.get("/{borne_id}", response_model=schemas.BorneAvecDetails)
-async def get_borne(
+@router.post("/bulk", response_model=schemas.RapportImportBornes)
+async def create_bornes_bulk(
+    request: Request,
+    dry_run: bool = Query(False, description="Valider le fichier sans rien enregistrer"),
+    upsert: bool = Query(False, description="Mettre à jour les bornes dont l'UUID existe déjà"),
+    avec_cles: bool = Query(False, description="Générer la clé HMAC de chaque borne créée"),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Crée un lot de bornes à partir d'un fichier CSV ou JSON.
+    Permission : Fournisseur ou Responsable Technique uniquement.
+    
+    - **Content-Type: text/csv** : colonnes `uuid_esp, nom_borne, id_site, salle_local,
+      seuil_alerte_gel, seuil_alerte_batterie, id_agent_affecte`
+    - **Content-Type: application/json** : liste de bornes (même format que `POST /api/bornes/`)
+    
+    Toutes les lignes sont insérées en une seule transaction. Si une ligne est
+    en erreur, rien n'est enregistré et le rapport indique l'erreur ligne par ligne.
+    Avec `avec_cles=true`, le rapport donne la clé (`cle_borne`) de chaque borne créée.
+    """
+    if user["role"] not in ["fournisseur", "responsable_technique"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les fournisseurs et responsables techniques peuvent créer des bornes"
+        )
+    
+    format_fichier = "csv" if "csv" in request.headers.get("content-type", "") else "json"
+    try:
+        contenu = (await request.body()).decode("utf-8-sig")
+        lignes = lire_lignes(contenu, format_fichier)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Fichier {format_fichier.upper()} illisible: {str(e)}"
+        )
+    
+    try:
+        # Import long : classe des rapports, pour ne pas retarder l'ingestion ni les lectures
+        async with controle_admission.admettre(RAPPORTS):
+            rapport = await RAPPORTS.executer(
+                provisionner_bornes, db, lignes, dry_run=dry_run, upsert=upsert, avec_cles=avec_cles
+            )
+    except Saturation:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de l'import : {str(e)}"
+        )
+    
+    if rapport["erreurs"]:
+        return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=rapport)
+    if rapport["applique"]:
+        return JSONResponse(status_code=status.HTTP_201_CREATED, content=rapport)
+    return rapport
+
+def _selection_groupee(
+    db: Session,
+    site_id: Optional[int],
+    salle_local: Optional[str],
+    agent_actuel_id: Optional[int]
+) -> List[int]:
+    """Retourne les IDs des bornes correspondant au filtre (au moins un critère requis)."""
+    conditions = []
+    if site_id is not None:
+        conditions.append(models.Borne.id_site == site_id)
+    if salle_local is not None:
+        conditions.append(models.Borne.salle_local == salle_local)
+    if agent_actuel_id is not None:
+        conditions.append(models.Borne.id_agent_affecte == agent_actuel_id)
+    
+    if not conditions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Au moins un filtre est requis (site_id, salle_local ou agent_actuel_id)"
+        )
+    
+    return list(db.scalars(select(models.Borne.id_borne).where(*conditions)))
+
+def _appliquer_mise_a_jour_groupee(db: Session, ids_bornes: List[int], valeurs: dict) -> dict:
+    """Applique un UPDATE ensembliste et invalide les caches des bornes concernées."""
+    if ids_bornes:
+        # Réaffectation : les utilisateurs qui voyaient ces bornes en sont avertis à la synchronisation
+        anciennes = affectations(db, ids_bornes) if valeurs.keys() & {"id_agent_affecte", "id_site"} else None
+        try:
+            db.execute(
+                update(models.Borne)
+                .where(models.Borne.id_borne.in_(ids_bornes))
+                .values(**valeurs)
+                .execution_options(synchronize_session=False)
+            )
+            journaliser(db, ids_bornes, anciennes)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erreur lors de la mise à jour: {str(e)}"
+            )
+        publier(BORNES_MODIFIEES, ids=ids_bornes)
+    
+    return {"bornes_modifiees": len(ids_bornes), "ids_bornes": ids_bornes}
+
+@router.put("/seuils", response_model=schemas.ResultatMiseAJourGroupee)
+@isoler(RAPPORTS)
+def mettre_a_jour_seuils_groupes(
+    seuil_gel: int = Query(..., ge=1, le=100, description="Nouveau seuil d'alerte pour le gel (1-100%)"),
+    seuil_batterie: int = Query(..., ge=1, le=100, description="Nouveau seuil d'alerte pour la batterie (1-100%)"),
+    site_id: Optional[int] = Query(None, description="Bornes de ce site"),
+    salle_local: Optional[str] = Query(None, description="Bornes de cette salle"),
+    agent_actuel_id: Optional[int] = Query(None, description="Bornes affectées à cet agent"),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Met à jour les seuils d'alerte de toutes les bornes correspondant au filtre.
+    
+    **Permissions**: responsable_technique ou responsable_agent uniquement.
+    
+    Les filtres se combinent (ET). Retourne le nombre et les IDs des bornes modifiées.
+    """
+    if user["role"] not in ["responsable_technique", "responsable_agent"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: seuls les responsables peuvent modifier les seuils"
+        )
+    
+    ids_bornes = _selection_groupee(db, site_id, salle_local, agent_actuel_id)
+    return _appliquer_mise_a_jour_groupee(db, ids_bornes, {
+        "seuil_alerte_gel": seuil_gel,
+        "seuil_alerte_batterie": seuil_batterie
+    })
+
+@router.put("/affecter", response_model=schemas.ResultatMiseAJourGroupee)
+@isoler(RAPPORTS)
+def affecter_bornes_groupees(
+    agent_id: int,
+    site_id: Optional[int] = Query(None, description="Bornes de ce site"),
+    salle_local: Optional[str] = Query(None, description="Bornes de cette salle"),
+    agent_actuel_id: Optional[int] = Query(None, description="Bornes actuellement affectées à cet agent"),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Affecte à un agent toutes les bornes correspondant au filtre.
+    
+    **Permissions**: responsable_technique ou responsable_agent uniquement.
+    
+    Exemple: réaffecter les bornes d'un agent qui part avec `agent_actuel_id`.
+    """
+    if user["role"] not in ["responsable_technique", "responsable_agent"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: seuls les responsables peuvent affecter des bornes"
+        )
+    
+    agent = db.query(models.Utilisateur).filter(
+        models.Utilisateur.id_utilisateur == agent_id,
+        models.Utilisateur.role == "agent"
+    ).first()
+    
+    if not agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Agent ID {agent_id} non trouvé ou n'a pas le rôle 'agent'"
+        )
+    
+    ids_bornes = _selection_groupee(db, site_id, salle_local, agent_actuel_id)
+    return _appliquer_mise_a_jour_groupee(db, ids_bornes, {"id_agent_affecte": agent_id})
+
+@router.get("/{borne_id}", response_model=Union[schemas.BorneAvecDetails, schemas.BornePartielle])
+@isoler(LECTURE)
+def get_borne(
     borne_id: int,
+    fields: Optional[str] = Query(None, description=DESCRIPTION_FIELDS),
+    expand: Optional[str] = Query(None, description=DESCRIPTION_EXPAND),
     user: dict = Depends(get_current_user_role),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lecture)
 ):
     """
     Récupère les détails d'une borne spécifique.
+    
+    `fields` et `expand` réduisent la réponse comme pour `GET /api/bornes/`.
     """
-    borne = db.query(models.Borne).options(
-        joinedload(models.Borne.site),
-        joinedload(models.Borne.agent_affecte)
-    ).filter(models.Borne.id_borne == borne_id).first()
+    champs, expansions = _projection(fields, expand)
     
-    if not borne:
+    # Mesures hors de la base principale : la dernière est lue dans le shard du site de la borne
+    completer_etat = "etat" in expansions and not depot_mesures.jointure_sql
+    colonnes = champs if not completer_etat or "id_site" in champs else champs + ("id_site",)
+    ligne = db.execute(requete_bornes(
+        colonnes, expansions, avec_derniere_mesure=depot_mesures.jointure_sql, ids_bornes=[borne_id]
+    )).first()
+    
+    if not ligne:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Borne ID {borne_id} non trouvée"
         )
     
-    # Récupérer la dernière mesure
-    derniere_mesure = db.query(models.Mesure).filter(
-        models.Mesure.id_borne == borne_id
-    ).order_by(models.Mesure.horodatage.desc()).first()
-    
-    # Récupérer les alertes actives
-    alertes = get_alertes_actives(db, borne_id)
-    
-    return {
-        **borne.__dict__,
-        "site_nom": borne.site.nom_site if borne.site else None,
-        "agent_nom": f"{borne.agent_affecte.prenom} {borne.agent_affecte.nom}" if borne.agent_affecte else None,
-        "dernier_niveau_gel": derniere_mesure.niveau_gel if derniere_mesure else None,
-        "dernier_niveau_batterie": derniere_mesure.niveau_batterie if derniere_mesure else None,
-        "derniere_mesure": derniere_mesure.horodatage if derniere_mesure else None,
-        "alertes_actives": len(alertes)
-    }
+    borne = borne_depuis_ligne(ligne)
+    if completer_etat:
+        db_mesures = carte_shards.ouvrir_site(db, borne["id_site"])
+        try:
+            dernieres = depot_mesures.dernieres(db_mesures, borne_id, 1)
+        finally:
+            carte_shards.fermer(db, db_mesures)
+        if dernieres:
+            borne["dernier_niveau_gel"] = dernieres[0]["niveau_gel"]
+            borne["dernier_niveau_batterie"] = dernieres[0]["niveau_batterie"]
+            borne["derniere_mesure"] = dernieres[0]["horodatage"]
+        if colonnes is not champs:
+            del borne["id_site"]
+    return reponse_json(borne)
 
 @router.put("/{borne_id}/affecter", response_model=schemas.Borne)
 async def affecter_borne(
@@ -203,11 +531,14 @@ async def affecter_borne(
         )
     
     # Affecter la borne
+    anciennes = {borne_id: (borne.id_agent_affecte, borne.id_site)}
     borne.id_agent_affecte = agent_id
     
     try:
+        journaliser(db, [borne_id], anciennes)
         db.commit()
         db.refresh(borne)
+        publier(BORNES_MODIFIEES, ids=[borne_id])
         return borne
     except Exception as e:
         db.rollback()
@@ -247,8 +578,10 @@ async def mettre_a_jour_seuils(
     borne.seuil_alerte_batterie = seuil_batterie
     
     try:
+        journaliser(db, [borne_id])
         db.commit()
         db.refresh(borne)
+        publier(BORNES_MODIFIEES, ids=[borne_id])
         return borne
     except Exception as e:
         db.rollback()
@@ -257,11 +590,125 @@ async def mettre_a_jour_seuils(
             detail=f"Erreur lors de la mise à jour: {str(e)}"
         )
 
-@router.get("/{borne_id}/alertes")
-async def get_alertes_borne(
+@router.put("/{borne_id}/filtre", response_model=schemas.Borne)
+async def mettre_a_jour_filtre(
+    borne_id: int,
+    mode: schemas.FiltreMesuresEnum = Query(..., description="aucun, mediane ou rebond"),
+    fenetre: int = Query(3, ge=1, le=15, description="Nombre de mesures prises en compte"),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db)
+):
+    """
+    Règle le filtre du bruit du capteur de la borne, appliqué avant la décision d'alerte.
+    
+    - **mediane**: les alertes portent sur la médiane des `fenetre` dernières mesures
+    - **rebond**: une alerte n'est créée qu'après `fenetre` mesures consécutives sous le seuil
+    - **aucun**: chaque mesure est évaluée telle quelle
+    
+    Les mesures sont toujours enregistrées brutes.
+    
+    **Permissions**: responsable_technique ou responsable_agent uniquement.
+    """
+    if user["role"] not in ["responsable_technique", "responsable_agent"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: seuls les responsables peuvent modifier le filtre des mesures"
+        )
+    
+    borne = db.query(models.Borne).filter(models.Borne.id_borne == borne_id).first()
+    
+    if not borne:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Borne ID {borne_id} non trouvée"
+        )
+    
+    borne.filtre_mesures = models.FiltreMesuresEnum(mode.value)
+    borne.filtre_fenetre = fenetre
+    
+    try:
+        journaliser(db, [borne_id])
+        db.commit()
+        db.refresh(borne)
+        publier(BORNES_MODIFIEES, ids=[borne_id])
+        return borne
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de la mise à jour: {str(e)}"
+        )
+
+@router.post("/{borne_id}/cle", response_model=schemas.CleBorne)
+async def renouveler_cle(
     borne_id: int,
     user: dict = Depends(get_current_user_role),
     db: Session = Depends(get_db)
+):
+    """
+    Génère une nouvelle clé d'authentification pour la borne (première clé
+    d'une borne existante, ou remplacement d'une clé compromise).
+    
+    L'ancienne clé est aussitôt refusée par ce processus, et par les autres
+    après au plus AUTH_BORNES_CACHE_SECONDES. La clé n'est affichée qu'une fois.
+    
+    **Permissions**: fournisseur ou responsable_technique uniquement.
+    """
+    if user["role"] not in ["fournisseur", "responsable_technique"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les fournisseurs et responsables techniques peuvent gérer les clés des bornes"
+        )
+    
+    borne = db.query(models.Borne).filter(models.Borne.id_borne == borne_id).first()
+    
+    if not borne:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Borne ID {borne_id} non trouvée"
+        )
+    
+    borne.cle_sel = nouveau_sel()
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de la mise à jour: {str(e)}"
+        )
+    cle = deriver_cle(borne.uuid_esp, borne.cle_sel)
+    authentification_bornes.cles.enregistrer(borne.uuid_esp, cle)
+    return {"id_borne": borne.id_borne, "uuid_esp": borne.uuid_esp, "cle_borne": cle.hex()}
+
+@router.get("/{borne_id}/heatmap", response_model=schemas.HeatmapUtilisation)
+@isoler(LECTURE)
+def get_heatmap_borne(
+    borne_id: int,
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
+):
+    """
+    Utilisation d'une borne par jour de la semaine et heure (grilles 7 × 24).
+    
+    - **utilisations**: nombre de mesures reçues (une par utilisation)
+    - **gel_consomme**: baisse cumulée du niveau de gel, en points de pourcentage
+    """
+    if db.get(models.Borne, borne_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Borne ID {borne_id} non trouvée"
+        )
+    
+    utilisations, gel = heatmaps.cumuler(db, [borne_id])
+    return _reponse_heatmap(utilisations, gel, 1, id_borne=borne_id)
+
+@router.get("/{borne_id}/alertes")
+@isoler(LECTURE)
+def get_alertes_borne(
+    borne_id: int,
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
 ):
     """
     Retourne les alertes d'une borne spécifique.
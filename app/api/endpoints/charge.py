@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.deps import get_current_user_role
+from app.core.auth_bornes import authentification_bornes
+from app.core.isolation import controle_admission
+from app.core import requetes_preparees
+from app.database import engine, engine_lecture, engine_rapports
+
+router = APIRouter()
+
+def _etat_pool(moteur) -> dict:
+    pool = moteur.pool
+    return {
+        "taille": pool.size(),
+        "utilisees": pool.checkedout(),
+        "debordement": pool.overflow(),
+    }
+
+@router.get("/")
+async def get_etat_charge(user: dict = Depends(get_current_user_role)):
+    """
+    État des classes de charge : requêtes admises, en cours, en attente et
+    rejetées, temps d'attente, et occupation du pool de connexions de chaque classe.
+    Compteurs de l'authentification des bornes (requêtes acceptées, refus par motif).
+    Exécutions servies par le cache des instructions compilées, par pool et par requête chaude.
+
+    **Permissions**: fournisseur uniquement.
+    """
+    if user["role"] != "fournisseur":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: droits insuffisants"
+        )
+    return {
+        **controle_admission.etat(),
+        "pools": {
+            "ingestion": _etat_pool(engine),
+            "lecture": _etat_pool(engine_lecture),
+            "rapports": _etat_pool(engine_rapports),
+        },
+        "authentification_bornes": authentification_bornes.etat(),
+        "cache_requetes": requetes_preparees.statistiques(),
+    }
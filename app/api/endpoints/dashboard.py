@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.database import get_db_rapports
+from app import schemas
+from app.api.deps import get_current_user_role
+from app.core.dashboard import obtenir_resume
+from app.core.isolation import RAPPORTS, isoler
+
+router = APIRouter()
+
+@router.get("/resume", response_model=schemas.ResumeFlotte)
+@isoler(RAPPORTS)
+def get_resume(
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_rapports)
+):
+    """
+    Retourne les agrégats de la flotte pour la page d'accueil du tableau de bord.
+    
+    - Nombre de bornes, bornes sans mesure
+    - Bornes en gel/batterie bas ou critique (d'après leur dernière mesure)
+    - Alertes ouvertes, niveaux moyens
+    
+    Les chiffres sont donnés au total, par site et par agent. Le résultat est mis
+    en cache quelques secondes et invalidé dès qu'une borne ou une alerte change.
+    
+    **Permissions**: fournisseur, responsable_technique ou responsable_agent.
+    """
+    if user["role"] not in ["fournisseur", "responsable_technique", "responsable_agent"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: droits insuffisants"
+        )
+    
+    return obtenir_resume(db)
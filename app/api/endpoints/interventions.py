@@ -0,0 +1,72 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import get_db_lecture
+from app import models, schemas
+from app.api.deps import get_current_user_role
+from app.core.pagination import TAILLE_PAGE, TAILLE_PAGE_MAX, apres_curseur, decouper_page, entre_jours
+from app.core.isolation import LECTURE, isoler
+
+router = APIRouter()
+
+@router.get("/", response_model=schemas.PageInterventions)
+@isoler(LECTURE)
+def get_interventions(
+    borne_id: Optional[int] = None,
+    site_id: Optional[int] = None,
+    agent_id: Optional[int] = None,
+    type_intervention: Optional[schemas.TypeInterventionEnum] = None,
+    debut: Optional[date] = Query(None, description="Interventions à partir de ce jour"),
+    fin: Optional[date] = Query(None, description="Interventions jusqu'à ce jour inclus"),
+    curseur: Optional[str] = Query(None, description="curseur_suivant de la page précédente"),
+    taille: int = Query(TAILLE_PAGE, ge=1, le=TAILLE_PAGE_MAX),
+    user: dict = Depends(get_current_user_role),
+    db: Session = Depends(get_db_lecture)
+):
+    """
+    Historique des interventions, plus récentes en premier.
+
+    Paginé par curseur (`curseur_suivant`). Un agent ne voit que ses propres interventions.
+    """
+    query = select(models.Intervention)
+
+    if user["role"] == "agent":
+        query = query.join(
+            models.Utilisateur, models.Utilisateur.id_utilisateur == models.Intervention.id_agent
+        ).where(models.Utilisateur.email == user["email"])
+
+    if borne_id is not None:
+        query = query.where(models.Intervention.id_borne == borne_id)
+    if site_id is not None:
+        query = query.join(
+            models.Borne, models.Borne.id_borne == models.Intervention.id_borne
+        ).where(models.Borne.id_site == site_id)
+    if agent_id is not None:
+        query = query.where(models.Intervention.id_agent == agent_id)
+    if type_intervention is not None:
+        query = query.where(
+            models.Intervention.type_intervention == models.TypeInterventionEnum(type_intervention.value)
+        )
+    query = query.where(*entre_jours(models.Intervention.date_intervention, debut, fin))
+
+    if curseur:
+        try:
+            query = query.where(apres_curseur(
+                models.Intervention.date_intervention, models.Intervention.id_intervention, curseur
+            ))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Curseur invalide"
+            )
+
+    lignes = db.scalars(
+        query.order_by(
+            models.Intervention.date_intervention.desc(), models.Intervention.id_intervention.desc()
+        ).limit(taille + 1)
+    ).all()
+    return decouper_page(lignes, taille, "date_intervention", "id_intervention")
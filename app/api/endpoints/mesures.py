@@ -1,18 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, timezone
+import time
 
-from app.database import get_db
+from app.database import get_db, engine
 from app import models, schemas
-from app.core.alerts import verifier_et_creer_alertes
+from app.api.deps import get_current_user_role, get_db_mesures
+from app.core.auth_bornes import SignatureInvalide, authentification_bornes
+from app.core.alerts import detecter_interventions, resoudre_alertes, verifier_et_creer_alertes
+from app.core.deduplication import fenetre_deduplication
+from app.core.depot_mesures import depot_mesures
+from app.core.disjoncteur import FERME, disjoncteur_base, est_panne_base
+from app.core.evenements import ALERTES_MODIFIEES, publier
+from app.core.hors_ligne import suivi_hors_ligne
+from app.core.filtrage import filtre_mesures, parametres as parametres_filtre
+from app.core.heatmaps import accumulateur_heatmaps, consommation
+from app.core.journal import journaliser
+from app.core.isolation import INGESTION, LECTURE, controle_admission, isoler
+from app.core.limitation import delesteur_ingestion, limiteur_bornes, limiteur_ips, retry_after
+from app.core.requetes_preparees import borne_par_uuid
+from app.core.serialisation import reponse_json, reponse_mesures
+from app.core.shards import carte_shards
+from app.core.spool import MesureEnAttente, SpoolPlein, spool_mesures
+from app.core.tampon_mesures import cache_mesures
 
 router = APIRouter()
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+async def admission_ingestion(request: Request):
+    """
+    Contrôle d'admission de l'ingestion.
+    
+    Déleste toutes les requêtes (503) quand la base sature, puis limite
+    le débit par adresse IP (429). Admet la requête dans la classe de
+    charge prioritaire de l'ingestion et compte les requêtes en cours.
+    """
+    motif = delesteur_ingestion.motif_delestage(engine.pool)
+    if motif:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service surchargé: {motif}",
+            headers={"Retry-After": retry_after(1)}
+        )
+    
+    ip = request.client.host if request.client else "inconnue"
+    attente = limiteur_ips.consommer(ip)
+    if attente:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Trop de requêtes depuis {ip}",
+            headers={"Retry-After": retry_after(attente)}
+        )
+    
+    async with controle_admission.admettre(INGESTION):
+        delesteur_ingestion.entrer()
+        try:
+            yield
+        finally:
+            delesteur_ingestion.sortir()
+
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(admission_ingestion)])
 async def recevoir_mesure(
     mesure: schemas.MesureCreate,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
@@ -23,14 +75,114 @@ async def recevoir_mesure(
     - **uuid_esp**: Identifiant unique de la carte ESP32 (ex: "ESP32-001")
     - **niveau_gel**: Pourcentage de gel restant (0-100)
     - **niveau_batterie**: Pourcentage de batterie restante (0-100)
+    - **sequence** (optionnel): Numéro de séquence de la borne, un renvoi avec le même numéro n'est pas réenregistré
+      (même horodatage ; sans horodatage, mêmes niveaux dans les `DEDUP_DUREE_SECONDES` suivant la première réception)
+    - **horodatage** (optionnel): Date de la mesure côté ESP32, pour les mesures envoyées en différé
     
     Retourne la mesure enregistrée avec son ID et horodatage.
+    Un renvoi déjà reçu retourne la même réponse avec le statut 200 et `doublon: true`.
+    
+    Le débit est limité par borne et par adresse IP (429 avec `Retry-After`),
+    et l'ingestion est délestée (503) quand la base de données sature.
+    
+    La mesure est écrite dans le shard du site de la borne.
+    
+    La valeur brute est enregistrée ; les alertes sont décidées sur les niveaux
+    filtrés selon le filtre de la borne (`niveau_gel_filtre` et
+    `niveau_batterie_filtre` dans la réponse quand un filtre est actif).
+    
+    Si la base de données est injoignable, la mesure est écrite dans un spool
+    local (statut 202, `en_attente: true`) puis enregistrée, alertes comprises,
+    à son retour.
+    
+    Une borne qui a une clé (`cle_borne`, donnée à sa création) signe chaque
+    requête : HMAC-SHA256 de `horodatage + "\n" + nonce + "\n" + corps`, en
+    hexadécimal dans `X-Borne-Signature`, avec `X-Borne-Horodatage` (secondes
+    Unix) et `X-Borne-Nonce` (unique, 64 caractères au plus). Requête non
+    signée, signature invalide ou rejouée : 401. Les nonces sont partagés
+    entre les workers (table `nonces_bornes`). Le renvoi à l'identique d'une
+    mesure encore dans la fenêtre de déduplication, même nonce compris, reçoit
+    la réponse du doublon (200) du worker qui l'a traitée ; un autre worker le
+    refuse (401).
     """
+    # Authentification de la borne, avant tout autre traitement. Un renvoi
+    # identique (même nonce) d'une mesure déjà traitée reçoit la réponse du doublon
+    if authentification_bornes.active:
+        await _authentifier_borne(
+            request, mesure.uuid_esp, db, renvoi_connu=lambda: _reponse_deja_envoyee(mesure) is not None
+        )
+    
+    # 0. Renvoi déjà traité : aucune requête en base
+    deja_recue = _reponse_deja_envoyee(mesure)
+    if deja_recue:
+        response.status_code = status.HTTP_200_OK
+        return {**deja_recue, "doublon": True}
+    
+    attente = limiteur_bornes.consommer(mesure.uuid_esp)
+    if attente:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Trop de mesures pour la borne '{mesure.uuid_esp}'",
+            headers={"Retry-After": retry_after(attente)}
+        )
+    
+    # Base en panne (disjoncteur ouvert) : la mesure attend dans le spool
+    if not disjoncteur_base.autoriser():
+        return await _mettre_en_attente(mesure, response)
+    
+    # Accès à la base dans le pool de threads de l'ingestion, hors de la boucle asyncio
+    resultat = await INGESTION.executer(_enregistrer_mesure, mesure, response, db)
+    if resultat is EN_ATTENTE:
+        return await _mettre_en_attente(mesure, response)
+    return resultat
+
+async def _authentifier_borne(request: Request, uuid_esp: str, db: Session, renvoi_connu=None):
+    """Vérifie la signature de la requête ; la clé de la borne n'est lue en base qu'en l'absence du cache."""
+    trouvee, cle = authentification_bornes.cles.obtenir(uuid_esp)
+    if not trouvee:
+        try:
+            cle = await INGESTION.executer(authentification_bornes.cles.lire, db, uuid_esp)
+        except Exception as e:
+            if not est_panne_base(e):
+                raise
+            disjoncteur_base.echec()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Base de données indisponible: clé de la borne non vérifiable",
+                headers={"Retry-After": retry_after(disjoncteur_base.delai)}
+            )
+    corps = await request.body()
     try:
+        if authentification_bornes.partages is not None and disjoncteur_base.etat == FERME:
+            # Nonce noté en base pour tous les workers : appel bloquant, dans le pool de l'ingestion.
+            # Base en panne : la mesure ira au spool, seule la fenêtre du processus protège
+            await INGESTION.executer(
+                authentification_bornes.verifier, uuid_esp, cle, request.headers, corps, renvoi_connu, db
+            )
+        else:
+            authentification_bornes.verifier(uuid_esp, cle, request.headers, corps, renvoi_connu)
+    except SignatureInvalide as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+
+# Retour de _enregistrer_mesure quand la base tombe en panne pendant l'enregistrement
+EN_ATTENTE = object()
+
+def _enregistrer_mesure(mesure: schemas.MesureCreate, response: Response, db: Session):
+    """Enregistre la mesure, détecte interventions et alertes (appel bloquant)."""
+    db_mesures = db
+    enregistree = False
+    panne = False
+    try:
+        # Le temps d'obtention d'une connexion alimente le délestage global
+        debut = time.perf_counter()
+        db.connection()
+        delesteur_ingestion.noter_attente_pool(time.perf_counter() - debut)
+        
         # 1. Trouver la borne correspondante à l'uuid_esp
-        borne = db.query(models.Borne).filter(
-            models.Borne.uuid_esp == mesure.uuid_esp
-        ).first()
+        borne = borne_par_uuid(db, mesure.uuid_esp)
         
         if not borne:
             raise HTTPException(
@@ -38,28 +190,100 @@ async def recevoir_mesure(
                 detail=f"Borne avec uuid_esp '{mesure.uuid_esp}' non trouvée"
             )
         
-        # 2. Créer la nouvelle mesure
-        nouvelle_mesure = models.Mesure(
-            id_borne=borne.id_borne,
-            niveau_gel=mesure.niveau_gel,
-            niveau_batterie=mesure.niveau_batterie
+        # Les mesures vont dans le shard du site ; alertes et interventions restent dans la base principale
+        db_mesures = carte_shards.ouvrir_site(db, borne.id_site)
+        
+        # 2. État précédent de la borne : dernière mesure en base (partagée par tous les workers)
+        precedent = depot_mesures.precedente(db_mesures, borne.id_borne)
+        
+        # Une mesure différée plus ancienne que la dernière connue ne déclenche pas d'alerte
+        en_retard = (
+            mesure.horodatage is not None
+            and precedent is not None
+            and mesure.horodatage < precedent[0]
+        )
+        
+        # 3. Créer la nouvelle mesure (table SQL ou segments selon STOCKAGE_MESURES)
+        nouvelle_mesure, doublon = depot_mesures.ajouter(
+            db_mesures, borne.id_borne, mesure.niveau_gel, mesure.niveau_batterie, mesure.horodatage, mesure.sequence
         )
+        if doublon:
+            # Renvoi non présent dans la fenêtre mémoire (ex: après redémarrage)
+            reponse = _reponse_mesure(nouvelle_mesure)
+            _memoriser_reponse(mesure, reponse)
+            response.status_code = status.HTTP_200_OK
+            return {**reponse, "doublon": True}
+        
+        # 4. Remplissage ou changement de batterie détecté : résolution dans la même transaction
+        resolution = None
+        if not en_retard and precedent is not None:
+            resolution = detecter_interventions(db, borne, precedent[1], precedent[2], nouvelle_mesure)
+        
+        # Dernier contact = heure de réception, noté après la validation. Si la borne était hors ligne,
+        # son alerte est résolue
+        reception = time.time()
+        if suivi_hors_ligne.est_hors_ligne(borne.id_borne):
+            retour = resoudre_alertes(
+                db,
+                borne_id=borne.id_borne,
+                types=[models.TypeAlerteEnum.HORS_LIGNE],
+                tracer_interventions=False
+            )
+            if resolution:
+                resolution["alertes_resolues"] += retour["alertes_resolues"]
+            else:
+                resolution = retour
         
-        db.add(nouvelle_mesure)
+        # La mesure est validée en premier : les alertes en sont dérivées
+        journaliser(db, [borne.id_borne])
+        if db_mesures is not db:
+            db_mesures.commit()
         db.commit()
-        db.refresh(nouvelle_mesure)
+        enregistree = True
+        suivi_hors_ligne.vu(borne.id_borne, reception)
+        depot_mesures.finaliser(db_mesures, nouvelle_mesure)
+        accumulateur_heatmaps.noter(
+            borne.id_borne,
+            nouvelle_mesure.horodatage,
+            consommation(precedent[1], nouvelle_mesure.niveau_gel) if precedent and not en_retard else 0
+        )
+        if resolution and resolution["alertes_resolues"]:
+            publier(ALERTES_MODIFIEES, ids=[borne.id_borne])
+        
+        # Le tampon des dernières mesures suit l'ordre chronologique
+        if en_retard:
+            cache_mesures.invalider(borne.id_borne)
+        else:
+            cache_mesures.ajouter(nouvelle_mesure)
         
-        # 3. Vérifier si des alertes doivent être créées
-        verifier_et_creer_alertes(db, borne, nouvelle_mesure)
+        reponse = _reponse_mesure(nouvelle_mesure)
+        if mesure.sequence is not None:
+            _memoriser_reponse(mesure, reponse)
+        
+        # 5. Vérifier si des alertes doivent être créées (uniquement sur l'état le plus récent),
+        # d'après les niveaux filtrés du bruit des capteurs
+        if not en_retard:
+            filtree = filtre_mesures.filtrer(
+                borne,
+                nouvelle_mesure.niveau_gel,
+                nouvelle_mesure.niveau_batterie,
+                lambda nb: depot_mesures.dernieres(db_mesures, borne.id_borne, nb)
+            )
+            verifier_et_creer_alertes(db, borne, filtree)
+            if parametres_filtre(borne)[0] != models.FiltreMesuresEnum.AUCUN:
+                reponse = {
+                    **reponse,
+                    "niveau_gel_filtre": filtree.niveau_gel,
+                    "niveau_batterie_filtre": filtree.niveau_batterie
+                }
         
-        # 4. Retourner un simple message de succès
-        return {
-            "message": "Mesure enregistrée avec succès",
-            "id_mesure": nouvelle_mesure.id_mesure,
-            "id_borne": nouvelle_mesure.id_borne,
-            "horodatage": nouvelle_mesure.horodatage.isoformat()
-        }
+        # 6. Retourner un simple message de succès
+        if resolution:
+            reponse = {**reponse, "alertes_resolues": resolution["alertes_resolues"]}
+        return {**reponse, "en_retard": en_retard}
         
+    except HTTPException:
+        raise
     except IntegrityError as e:
         db.rollback()
         raise HTTPException(
@@ -67,68 +291,166 @@ async def recevoir_mesure(
             detail="Erreur d'intégrité des données"
         )
     except Exception as e:
-        db.rollback()
+        panne = est_panne_base(e)
+        if panne:
+            disjoncteur_base.echec()
+            try:
+                db.rollback()
+            except Exception:
+                pass  # Connexion déjà perdue
+            if not enregistree:
+                return EN_ATTENTE
+        else:
+            db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur serveur: {str(e)}"
         )
+    finally:
+        if not panne:
+            disjoncteur_base.succes()
+        carte_shards.fermer(db, db_mesures)
+
+async def _mettre_en_attente(mesure: schemas.MesureCreate, response: Response) -> dict:
+    """Écrit la mesure dans le spool local (fsync groupé) et répond 202."""
+    spool = spool_mesures()
+    if spool is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Base de données indisponible",
+            headers={"Retry-After": retry_after(disjoncteur_base.delai)}
+        )
+    
+    reception = datetime.utcnow().replace(microsecond=0)
+    try:
+        rang = spool.ajouter(MesureEnAttente(
+            mesure.uuid_esp, mesure.niveau_gel, mesure.niveau_batterie,
+            mesure.horodatage or reception, reception, mesure.sequence
+        ))
+    except SpoolPlein:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Base de données indisponible et file d'attente locale pleine",
+            headers={"Retry-After": retry_after(disjoncteur_base.delai)}
+        )
+    await spool.attendre_durabilite(rang)
+    
+    reponse = {
+        "message": "Mesure mise en attente, elle sera enregistrée au retour de la base de données",
+        "horodatage": (mesure.horodatage or reception).isoformat(),
+        "en_attente": True
+    }
+    if mesure.sequence is not None:
+        _memoriser_reponse(mesure, reponse)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return reponse
+
+@router.get("/spool", response_model=schemas.EtatSpool)
+async def get_etat_spool(user: dict = Depends(get_current_user_role)):
+    """
+    État du disjoncteur de la base et profondeur du spool d'ingestion de ce processus.
+    
+    **Accès restreint**: fournisseur uniquement.
+    """
+    if user["role"] != "fournisseur":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: droits insuffisants"
+        )
+    spool = spool_mesures()
+    if spool is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Spool désactivé (SPOOL_ACTIF)"
+        )
+    return spool.etat()
+
+def _reponse_mesure(mesure: models.Mesure) -> dict:
+    """Construit la réponse renvoyée à l'ESP32 pour une mesure enregistrée."""
+    return {
+        "message": "Mesure enregistrée avec succès",
+        "id_mesure": mesure.id_mesure,
+        "id_borne": mesure.id_borne,
+        "horodatage": mesure.horodatage.isoformat()
+    }
+
+def _reponse_deja_envoyee(mesure: schemas.MesureCreate) -> Optional[dict]:
+    """Réponse déjà envoyée si la mesure est un renvoi présent dans la fenêtre mémoire, sinon None."""
+    if mesure.sequence is None:
+        return None
+    return fenetre_deduplication.rechercher(
+        mesure.uuid_esp, mesure.sequence, mesure.horodatage, mesure.niveau_gel, mesure.niveau_batterie
+    )
+
+def _memoriser_reponse(mesure: schemas.MesureCreate, reponse: dict):
+    """Retient la réponse envoyée pour répondre à l'identique aux renvois de la mesure."""
+    fenetre_deduplication.enregistrer(
+        mesure.uuid_esp, mesure.sequence, mesure.horodatage, mesure.niveau_gel, mesure.niveau_batterie, reponse
+    )
 
 @router.get("/borne/{borne_id}", response_model=List[schemas.Mesure])
-async def get_mesures_par_borne(
+@isoler(LECTURE)
+def get_mesures_par_borne(
     borne_id: int,
+    request: Request,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    format: Optional[str] = Query(None, pattern="^(json|columnar|msgpack)$", description="Format de réponse (prioritaire sur l'en-tête Accept)"),
+    db: Session = Depends(get_db_mesures)
 ):
     """
     Récupère l'historique des mesures d'une borne spécifique.
     
     - **borne_id**: ID de la borne
     - **limit**: Nombre maximum de mesures à retourner (par défaut: 100)
+    - **format**: `json` (par défaut), `columnar` ou `msgpack`
     
     Retourne la liste des mesures triées par date (plus récentes en premier).
+    
+    Le format en colonnes (`?format=columnar` ou `Accept: application/vnd.bornegel.colonnes+json`)
+    renvoie un tableau par champ, les horodatages en secondes epoch et les IDs en deltas.
+    `Accept: application/x-msgpack` renvoie les mêmes colonnes en MessagePack.
+    La réponse est compressée (brotli ou gzip) selon `Accept-Encoding`.
     """
-    mesures = db.query(models.Mesure).filter(
-        models.Mesure.id_borne == borne_id
-    ).order_by(
-        models.Mesure.horodatage.desc()
-    ).limit(limit).all()
+    # Petites lectures servies par le tampon en mémoire, sinon directement par le stockage
+    lignes = cache_mesures.dernieres(db, borne_id, limit)
+    if lignes is None:
+        lignes = depot_mesures.dernieres(db, borne_id, limit)
     
-    if not mesures:
+    if not lignes:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Aucune mesure trouvée pour la borne ID {borne_id}"
         )
     
-    return mesures
+    # Lignes SQL sérialisées directement, sans objets ORM ni revalidation
+    return reponse_mesures(request, lignes, format)
 
 @router.get("/derniere/borne/{borne_id}", response_model=schemas.Mesure)
-async def get_derniere_mesure(
+@isoler(LECTURE)
+def get_derniere_mesure(
     borne_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_mesures)
 ):
     """
     Récupère la dernière mesure enregistrée pour une borne.
     
     Utile pour afficher l'état actuel d'une borne.
     """
-    mesure = db.query(models.Mesure).filter(
-        models.Mesure.id_borne == borne_id
-    ).order_by(
-        models.Mesure.horodatage.desc()
-    ).first()
+    mesures = cache_mesures.dernieres(db, borne_id, 1)
     
-    if not mesure:
+    if not mesures:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Aucune mesure trouvée pour la borne ID {borne_id}"
         )
     
-    return mesure
+    return mesures[0]
 
 @router.get("/stats/borne/{borne_id}")
-async def get_stats_borne(
+@isoler(LECTURE)
+def get_stats_borne(
     borne_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_mesures)
 ):
     """
     Retourne des statistiques pour une borne.
@@ -138,37 +460,70 @@ async def get_stats_borne(
     - Moyennes des niveaux
     - Nombre total de mesures
     """
-    mesures = db.query(models.Mesure).filter(
-        models.Mesure.id_borne == borne_id
-    ).all()
+    dernieres_mesures = cache_mesures.dernieres(db, borne_id, 10)  # 10 dernières mesures
     
-    if not mesures:
+    if not dernieres_mesures:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Aucune mesure trouvée pour la borne ID {borne_id}"
         )
     
-    dernieres_mesures = mesures[:10]  # 10 dernières mesures
+    # Totaux calculés par le stockage plutôt qu'en chargeant tout l'historique
+    total, moyenne_gel, moyenne_batterie = depot_mesures.statistiques(db, borne_id)
     
+    derniere = dernieres_mesures[0]
     stats = {
         "borne_id": borne_id,
-        "total_mesures": len(mesures),
+        "total_mesures": total,
         "derniere_mesure": {
-            "niveau_gel": mesures[0].niveau_gel if mesures else None,
-            "niveau_batterie": mesures[0].niveau_batterie if mesures else None,
-            "horodatage": mesures[0].horodatage if mesures else None
+            "niveau_gel": derniere["niveau_gel"],
+            "niveau_batterie": derniere["niveau_batterie"],
+            "horodatage": derniere["horodatage"]
         },
         "moyennes": {
-            "gel": sum(m.niveau_gel for m in mesures) / len(mesures) if mesures else 0,
-            "batterie": sum(m.niveau_batterie for m in mesures) / len(mesures) if mesures else 0
+            "gel": float(moyenne_gel or 0),
+            "batterie": float(moyenne_batterie or 0)
         },
         "historique_recent": [
             {
-                "niveau_gel": m.niveau_gel,
-                "niveau_batterie": m.niveau_batterie,
-                "horodatage": m.horodatage
+                "niveau_gel": m["niveau_gel"],
+                "niveau_batterie": m["niveau_batterie"],
+                "horodatage": m["horodatage"]
             } for m in dernieres_mesures
         ]
     }
     
     return stats
+
+def _en_utc_naif(horodatage: datetime) -> datetime:
+    if horodatage.tzinfo is not None:
+        return horodatage.astimezone(timezone.utc).replace(tzinfo=None)
+    return horodatage
+
+@router.get("/agregats/borne/{borne_id}", response_model=List[schemas.AgregatMesures])
+@isoler(LECTURE)
+def get_agregats_borne(
+    borne_id: int,
+    debut: datetime,
+    fin: Optional[datetime] = None,
+    pas: int = Query(3600, ge=60, le=31 * 86400, description="Durée d'un intervalle en secondes"),
+    db: Session = Depends(get_db_mesures)
+):
+    """
+    Historique sous-échantillonné d'une borne, pour les graphiques.
+    
+    - **debut** / **fin**: Période en UTC (par défaut jusqu'à maintenant)
+    - **pas**: Durée d'un intervalle en secondes (par défaut: 1 heure)
+    
+    Retourne, pour chaque intervalle contenant des mesures, leur nombre et
+    les niveaux moyen, minimal et maximal, du plus ancien au plus récent.
+    """
+    debut = _en_utc_naif(debut)
+    fin = _en_utc_naif(fin) if fin else datetime.utcnow()
+    if fin <= debut:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fin de la période doit être postérieure à son début"
+        )
+    
+    return reponse_json(depot_mesures.agregats(db, borne_id, debut, fin, pas))
@@ -0,0 +1,68 @@
+import json
+import os
+import re
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from app.api.deps import get_current_user_role
+from app.core.config import settings
+
+router = APIRouter()
+
+FORMAT_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+def verifier_fournisseur(user: dict = Depends(get_current_user_role)) -> dict:
+    if user["role"] != "fournisseur":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès interdit: droits insuffisants"
+        )
+    return user
+
+def _chemin(id_profil: str, extension: str) -> str:
+    if not FORMAT_ID.match(id_profil):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Identifiant de profil invalide"
+        )
+    return os.path.join(settings.PROFILAGE_DOSSIER, f"{id_profil}.{extension}")
+
+@router.get("/", dependencies=[Depends(verifier_fournisseur)])
+async def lister_profils():
+    """
+    Liste les profils enregistrés (les plus récents en premier).
+    
+    **Accès restreint**: fournisseur uniquement.
+    """
+    fichiers = os.listdir(settings.PROFILAGE_DOSSIER) if os.path.isdir(settings.PROFILAGE_DOSSIER) else []
+    return sorted({f.rsplit(".", 1)[0] for f in fichiers if f.endswith(".json")}, reverse=True)
+
+@router.get("/{id_profil}", dependencies=[Depends(verifier_fournisseur)])
+async def get_profil(id_profil: str):
+    """
+    Retourne le résumé d'un profil : durée totale, part SQL/Python et requêtes SQL.
+    """
+    chemin = _chemin(id_profil, "json")
+    if not os.path.exists(chemin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profil {id_profil} non trouvé"
+        )
+    with open(chemin, encoding="utf-8") as f:
+        return json.load(f)
+
+@router.get("/{id_profil}/fichier", dependencies=[Depends(verifier_fournisseur)])
+async def telecharger_profil(id_profil: str):
+    """
+    Télécharge le profil Python : HTML pyinstrument, ou .pstats cProfile
+    (à ouvrir avec `snakeviz` ou `python -m pstats`).
+    """
+    for extension, media_type in (("html", "text/html"), ("pstats", "application/octet-stream")):
+        chemin = _chemin(id_profil, extension)
+        if os.path.exists(chemin):
+            return FileResponse(chemin, media_type=media_type, filename=os.path.basename(chemin))
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Profil {id_profil} non trouvé"
+    )
@@ -1,6 +1,12 @@
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 from app import models
+from app.core import requetes_preparees
+from app.core.config import settings
+from app.core.evenements import ALERTES_MODIFIEES, publier
+from app.core.journal import journaliser
+from app.core.outbox import notifier
 from datetime import datetime
 
 def verifier_et_creer_alertes(db: Session, borne: models.Borne, mesure: models.Mesure):
@@ -9,6 +15,7 @@ def verifier_et_creer_alertes(db: Session, borne: models.Borne, mesure: models.M
     
     Cette fonction est appelée après chaque enregistrement de mesure.
     Elle vérifie les seuils de gel et batterie et crée des alertes si nécessaire.
+    `mesure` peut porter les niveaux filtrés (cf. app/core/filtrage.py) plutôt que les niveaux bruts.
     """
     alertes_crees = []
     
@@ -55,9 +62,13 @@ def verifier_et_creer_alertes(db: Session, borne: models.Borne, mesure: models.M
         alertes_crees.append(alerte)
     
     if alertes_crees:
+        db.flush()
+        notifier(db, borne, alertes_crees)
+        journaliser(db, [borne.id_borne])
         db.commit()
         for alerte in alertes_crees:
             db.refresh(alerte)
+        publier(ALERTES_MODIFIEES, ids=[borne.id_borne])
     
     return alertes_crees
 
@@ -67,14 +78,133 @@ def get_alertes_actives(db: Session, borne_id: Optional[int] = None):
     
     Si borne_id est spécifié, ne retourne que les alertes de cette borne.
     """
-    query = db.query(models.Alerte).filter(
+    return requetes_preparees.alertes_actives(db, borne_id)
+
+# Type d'intervention correspondant à chaque type d'alerte
+INTERVENTION_PAR_ALERTE = {
+    models.TypeAlerteEnum.GEL_BAS: models.TypeInterventionEnum.REMPLISSAGE_GEL,
+    models.TypeAlerteEnum.GEL_CRITIQUE: models.TypeInterventionEnum.REMPLISSAGE_GEL,
+    models.TypeAlerteEnum.BATTERIE_BASSE: models.TypeInterventionEnum.CHANGEMENT_BATTERIE,
+    models.TypeAlerteEnum.BATTERIE_CRITIQUE: models.TypeInterventionEnum.CHANGEMENT_BATTERIE,
+    models.TypeAlerteEnum.HORS_LIGNE: models.TypeInterventionEnum.MAINTENANCE,
+}
+
+ALERTES_GEL = [models.TypeAlerteEnum.GEL_BAS, models.TypeAlerteEnum.GEL_CRITIQUE]
+ALERTES_BATTERIE = [models.TypeAlerteEnum.BATTERIE_BASSE, models.TypeAlerteEnum.BATTERIE_CRITIQUE]
+
+def resoudre_alertes(
+    db: Session,
+    agent_id: Optional[int] = None,
+    ids_alertes: Optional[List[int]] = None,
+    borne_id: Optional[int] = None,
+    site_id: Optional[int] = None,
+    types: Optional[List[models.TypeAlerteEnum]] = None,
+    agent_restreint_id: Optional[int] = None,
+    commentaire: str = "",
+    tracer_interventions: bool = True
+) -> dict:
+    """
+    Résout en bloc les alertes actives correspondant aux critères.
+    
+    Une seule sélection, un UPDATE ensembliste et une insertion groupée des
+    interventions (une par borne et par type d'intervention). Si `agent_id`
+    n'est pas fourni, l'agent assigné à l'alerte ou affecté à la borne est
+    utilisé ; sans agent connu, aucune intervention n'est tracée.
+    
+    Ne fait pas de commit : l'appelant contrôle la transaction et publie
+    ALERTES_MODIFIEES après le commit.
+    """
+    query = select(
+        models.Alerte.id_alerte,
+        models.Alerte.id_borne,
+        models.Alerte.type_alerte,
+        models.Alerte.id_agent_assignee,
+        models.Borne.id_agent_affecte
+    ).join(models.Borne, models.Borne.id_borne == models.Alerte.id_borne).where(
         models.Alerte.statut.in_([models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE])
     )
     
-    if borne_id:
-        query = query.filter(models.Alerte.id_borne == borne_id)
+    if ids_alertes is not None:
+        query = query.where(models.Alerte.id_alerte.in_(ids_alertes))
+    if borne_id is not None:
+        query = query.where(models.Alerte.id_borne == borne_id)
+    if site_id is not None:
+        query = query.where(models.Borne.id_site == site_id)
+    if types is not None:
+        query = query.where(models.Alerte.type_alerte.in_(types))
+    if agent_restreint_id is not None:
+        query = query.where(models.Borne.id_agent_affecte == agent_restreint_id)
+    
+    lignes = db.execute(query).all()
+    if not lignes:
+        return {"alertes_resolues": 0, "interventions_creees": 0, "ids_alertes": [], "ids_bornes": []}
+    
+    ids = [ligne.id_alerte for ligne in lignes]
+    db.execute(
+        update(models.Alerte)
+        .where(models.Alerte.id_alerte.in_(ids))
+        .values(statut=models.StatutAlerteEnum.RESOLUE, date_resolution=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    
+    # Une intervention par borne et par type d'intervention
+    interventions = {}
+    for ligne in (lignes if tracer_interventions else []):
+        agent = agent_id or ligne.id_agent_assignee or ligne.id_agent_affecte
+        if agent is None:
+            continue
+        type_intervention = INTERVENTION_PAR_ALERTE[ligne.type_alerte]
+        cle = (ligne.id_borne, type_intervention)
+        if cle not in interventions:
+            interventions[cle] = {
+                "id_borne": ligne.id_borne,
+                "id_agent": agent,
+                "type_intervention": type_intervention,
+                "commentaire": commentaire or f"Résolution alerte {ligne.type_alerte.value}"
+            }
+    
+    if interventions:
+        db.execute(insert(models.Intervention), list(interventions.values()))
     
-    return query.order_by(models.Alerte.date_declenchement.desc()).all()
+    ids_bornes = sorted({ligne.id_borne for ligne in lignes})
+    journaliser(db, ids_bornes)
+    
+    return {
+        "alertes_resolues": len(ids),
+        "interventions_creees": len(interventions),
+        "ids_alertes": ids,
+        "ids_bornes": ids_bornes
+    }
+
+def detecter_interventions(
+    db: Session,
+    borne: models.Borne,
+    gel_precedent: int,
+    batterie_precedente: int,
+    mesure: models.Mesure
+) -> Optional[dict]:
+    """
+    Détecte un remplissage de gel ou un changement de batterie dans le flux de mesures.
+    
+    Une forte hausse du niveau par rapport à la mesure précédente résout
+    automatiquement les alertes correspondantes de la borne et trace
+    l'intervention, dans la transaction en cours (pas de commit).
+    """
+    types = []
+    if mesure.niveau_gel - gel_precedent >= settings.SAUT_REMPLISSAGE_GEL:
+        types += ALERTES_GEL
+    if mesure.niveau_batterie - batterie_precedente >= settings.SAUT_CHANGEMENT_BATTERIE:
+        types += ALERTES_BATTERIE
+    
+    if not types:
+        return None
+    
+    return resoudre_alertes(
+        db,
+        borne_id=borne.id_borne,
+        types=types,
+        commentaire="Détection automatique depuis les mesures de la borne"
+    )
 
 def resoudre_alerte(db: Session, alerte_id: int, agent_id: int, commentaire: str = ""):
     """
@@ -82,31 +212,11 @@ def resoudre_alerte(db: Session, alerte_id: int, agent_id: int, commentaire: str
     
     Crée également une intervention pour tracer l'action.
     """
-    alerte = db.query(models.Alerte).filter(models.Alerte.id_alerte == alerte_id).first()
+    resultat = resoudre_alertes(db, agent_id=agent_id, ids_alertes=[alerte_id], commentaire=commentaire)
     
-    if not alerte:
+    if not resultat["alertes_resolues"]:
         return None
     
-    # Mettre à jour l'alerte
-    alerte.statut = models.StatutAlerteEnum.RESOLUE
-    alerte.date_resolution = datetime.utcnow()
-    
-    # Créer une intervention correspondante
-    if alerte.type_alerte in [models.TypeAlerteEnum.GEL_BAS, models.TypeAlerteEnum.GEL_CRITIQUE]:
-        type_intervention = models.TypeInterventionEnum.REMPLISSAGE_GEL
-    else:
-        type_intervention = models.TypeInterventionEnum.CHANGEMENT_BATTERIE
-    
-    intervention = models.Intervention(
-        id_borne=alerte.id_borne,
-        id_agent=agent_id,
-        type_intervention=type_intervention,
-        commentaire=commentaire or f"Résolution alerte {alerte.type_alerte.value}"
-    )
-    
-    db.add(intervention)
     db.commit()
-    db.refresh(alerte)
-    db.refresh(intervention)
-    
-    return alerte
+    publier(ALERTES_MODIFIEES, ids=resultat["ids_bornes"])
+    return db.get(models.Alerte, alerte_id)
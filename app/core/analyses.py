@@ -0,0 +1,313 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import BigInteger, Date, Float, case, cast, delete, desc, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from app import models
+from app.core.cache import CacheTTL
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+Alerte, Intervention, Borne = models.Alerte, models.Intervention, models.Borne
+
+
+# --- Fonctions SQL dépendantes du dialecte (MySQL en production, SQLite en développement)
+
+class duree_secondes(FunctionElement):
+    """Secondes écoulées entre deux DATETIME."""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(duree_secondes)
+def _duree_secondes_sqlite(element, compiler, **kw):
+    debut, fin = [compiler.process(argument, **kw) for argument in element.clauses]
+    return f"CAST(ROUND((julianday({fin}) - julianday({debut})) * 86400) AS INTEGER)"
+
+
+@compiles(duree_secondes, "mysql")
+def _duree_secondes_mysql(element, compiler, **kw):
+    debut, fin = [compiler.process(argument, **kw) for argument in element.clauses]
+    return f"TIMESTAMPDIFF(SECOND, {debut}, {fin})"
+
+
+class debut_semaine(FunctionElement):
+    """Lundi de la semaine d'une date."""
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(debut_semaine)
+def _debut_semaine_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, '-6 days', 'weekday 1')"
+
+
+@compiles(debut_semaine, "mysql")
+def _debut_semaine_mysql(element, compiler, **kw):
+    jour = compiler.process(element.clauses, **kw)
+    return f"DATE_SUB({jour}, INTERVAL WEEKDAY({jour}) DAY)"
+
+
+class debut_mois(FunctionElement):
+    """Premier jour du mois d'une date."""
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(debut_mois)
+def _debut_mois_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, 'start of month')"
+
+
+@compiles(debut_mois, "mysql")
+def _debut_mois_mysql(element, compiler, **kw):
+    jour = compiler.process(element.clauses, **kw)
+    return f"DATE_SUB({jour}, INTERVAL DAYOFMONTH({jour}) - 1 DAY)"
+
+
+PERIODES = {
+    "jour": lambda jour: jour,
+    "semaine": debut_semaine,
+    "mois": debut_mois,
+}
+
+
+# --- Tables de statistiques journalières
+
+def _jour(colonne):
+    return func.date(colonne, type_=Date)
+
+
+def _source_alertes(depuis: Optional[datetime]):
+    jour = _jour(Alerte.date_declenchement)
+    requete = select(
+        jour, Alerte.id_borne, Alerte.type_alerte, func.count()
+    ).where(Alerte.date_declenchement.isnot(None))
+    if depuis is not None:
+        requete = requete.where(Alerte.date_declenchement >= depuis)
+    return requete.group_by(jour, Alerte.id_borne, Alerte.type_alerte)
+
+
+def _source_resolutions(depuis: Optional[datetime]):
+    # L'agent qui a résolu n'est pas enregistré sur l'alerte : celui qui en
+    # était chargé (assigné, sinon affecté à la borne) lui est attribué
+    jour = _jour(Alerte.date_resolution)
+    agent = func.coalesce(Alerte.id_agent_assignee, Borne.id_agent_affecte)
+    duree = duree_secondes(Alerte.date_declenchement, Alerte.date_resolution)
+    requete = select(
+        jour, Alerte.id_borne, agent, Alerte.type_alerte,
+        func.count(), func.sum(duree), func.max(duree)
+    ).join(Borne, Borne.id_borne == Alerte.id_borne).where(
+        Alerte.date_resolution.isnot(None),
+        Alerte.date_declenchement.isnot(None)
+    )
+    if depuis is not None:
+        requete = requete.where(Alerte.date_resolution >= depuis)
+    return requete.group_by(jour, Alerte.id_borne, agent, Alerte.type_alerte)
+
+
+def _source_interventions(depuis: Optional[datetime]):
+    jour = _jour(Intervention.date_intervention)
+    requete = select(
+        jour, Intervention.id_borne, Intervention.id_agent, Intervention.type_intervention, func.count()
+    ).where(Intervention.date_intervention.isnot(None))
+    if depuis is not None:
+        requete = requete.where(Intervention.date_intervention >= depuis)
+    return requete.group_by(jour, Intervention.id_borne, Intervention.id_agent, Intervention.type_intervention)
+
+
+# (table, colonnes alimentées, requête source)
+TABLES_STATISTIQUES = [
+    (models.StatAlertesJour,
+     ["jour", "id_borne", "type_alerte", "nb_declenchees"],
+     _source_alertes),
+    (models.StatResolutionsJour,
+     ["jour", "id_borne", "id_agent", "type_alerte", "nb_resolues", "duree_totale_secondes", "duree_max_secondes"],
+     _source_resolutions),
+    (models.StatInterventionsJour,
+     ["jour", "id_borne", "id_agent", "type_intervention", "nb"],
+     _source_interventions),
+]
+
+
+def rafraichir(db: Session, complet: bool = False) -> None:
+    """
+    Met à jour les tables de statistiques journalières.
+
+    Seuls les derniers jours sont recalculés (depuis le dernier jour présent,
+    moins ANALYSES_JOURS_RECALCULES) : un DELETE puis un INSERT ... SELECT
+    groupé par jour, qui ne lit que les lignes récentes grâce aux index par
+    date. Une table vide, ou `complet=True`, est reconstruite entièrement.
+    """
+    for table, colonnes, source in TABLES_STATISTIQUES:
+        dernier_jour = None if complet else db.scalar(select(func.max(table.jour)))
+        if dernier_jour is None:
+            db.execute(delete(table))
+            depuis = None
+        else:
+            premier_jour = dernier_jour - timedelta(days=settings.ANALYSES_JOURS_RECALCULES)
+            db.execute(delete(table).where(table.jour >= premier_jour))
+            depuis = datetime.combine(premier_jour, time.min)
+        db.execute(insert(table).from_select(colonnes, source(depuis)))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Un autre processus a rafraîchi les mêmes jours en même temps
+        db.rollback()
+        logger.info("Statistiques déjà rafraîchies par un autre processus")
+
+
+_rafraichissement = CacheTTL(settings.ANALYSES_RAFRAICHISSEMENT_SECONDES)
+
+
+def statistiques_a_jour(db: Session) -> None:
+    """Rafraîchit les statistiques au plus une fois par ANALYSES_RAFRAICHISSEMENT_SECONDES."""
+    _rafraichissement.obtenir("statistiques", lambda: rafraichir(db))
+
+
+# --- Rapports (sur les tables de statistiques)
+
+def _entre(table, debut: date, fin: date):
+    return table.jour >= debut, table.jour <= fin
+
+
+def mttr(
+    db: Session,
+    debut: date,
+    fin: date,
+    par: str,
+    site_id: Optional[int] = None,
+    type_alerte: Optional[models.TypeAlerteEnum] = None
+) -> list:
+    """
+    Temps moyen de résolution des alertes résolues entre `debut` et `fin`.
+
+    Regroupé par site, agent ou borne ; le rang 1 est le temps moyen le plus long.
+    """
+    stats = models.StatResolutionsJour
+    if par == "site":
+        cle, libelle = Borne.id_site, models.Site.nom_site
+    elif par == "agent":
+        cle, libelle = stats.id_agent, models.Utilisateur.prenom + " " + models.Utilisateur.nom
+    else:
+        cle, libelle = stats.id_borne, Borne.nom_borne
+
+    nb = func.sum(stats.nb_resolues)
+    moyenne = cast(func.sum(stats.duree_totale_secondes), Float) / nb
+    requete = select(
+        cle.label("id"),
+        libelle.label("libelle"),
+        nb.label("nb_resolues"),
+        moyenne.label("mttr_secondes"),
+        func.max(stats.duree_max_secondes).label("duree_max_secondes"),
+        func.rank().over(order_by=desc(moyenne)).label("rang")
+    ).select_from(stats).join(
+        Borne, Borne.id_borne == stats.id_borne
+    ).where(*_entre(stats, debut, fin))
+
+    if par == "site":
+        requete = requete.join(models.Site, models.Site.id_site == Borne.id_site)
+    elif par == "agent":
+        requete = requete.outerjoin(models.Utilisateur, models.Utilisateur.id_utilisateur == stats.id_agent)
+    if site_id is not None:
+        requete = requete.where(Borne.id_site == site_id)
+    if type_alerte is not None:
+        requete = requete.where(stats.type_alerte == type_alerte)
+
+    requete = requete.group_by(cle, libelle).order_by(desc(moyenne), cle)
+    return [
+        {**ligne._asdict(), "mttr_secondes": round(ligne.mttr_secondes, 1)}
+        for ligne in db.execute(requete)
+    ]
+
+
+def frequence_alertes(
+    db: Session,
+    debut: date,
+    fin: date,
+    page: int,
+    taille: int,
+    site_id: Optional[int] = None,
+    type_alerte: Optional[models.TypeAlerteEnum] = None
+) -> dict:
+    """Nombre d'alertes déclenchées par borne, des plus fréquentes aux moins fréquentes, paginé."""
+    stats = models.StatAlertesJour
+
+    def compter(types):
+        return func.sum(case((stats.type_alerte.in_(types), stats.nb_declenchees), else_=0))
+
+    total = func.sum(stats.nb_declenchees)
+    requete = select(
+        stats.id_borne,
+        Borne.nom_borne,
+        Borne.id_site,
+        Borne.salle_local,
+        total.label("nb_alertes"),
+        compter([models.TypeAlerteEnum.GEL_BAS, models.TypeAlerteEnum.GEL_CRITIQUE]).label("nb_gel"),
+        compter([models.TypeAlerteEnum.BATTERIE_BASSE, models.TypeAlerteEnum.BATTERIE_CRITIQUE]).label("nb_batterie"),
+        compter([models.TypeAlerteEnum.HORS_LIGNE]).label("nb_hors_ligne"),
+        func.rank().over(order_by=desc(total)).label("rang"),
+        # Nombre total de bornes, calculé avant LIMIT
+        func.count().over().label("total_bornes")
+    ).select_from(stats).join(
+        Borne, Borne.id_borne == stats.id_borne
+    ).where(*_entre(stats, debut, fin))
+
+    if site_id is not None:
+        requete = requete.where(Borne.id_site == site_id)
+    if type_alerte is not None:
+        requete = requete.where(stats.type_alerte == type_alerte)
+
+    lignes = db.execute(
+        requete.group_by(stats.id_borne, Borne.nom_borne, Borne.id_site, Borne.salle_local)
+        .order_by(desc(total), stats.id_borne)
+        .limit(taille).offset((page - 1) * taille)
+    ).all()
+
+    return {
+        "page": page,
+        "taille": taille,
+        "total": lignes[0].total_bornes if lignes else 0,
+        "elements": [ligne._asdict() for ligne in lignes],
+    }
+
+
+def interventions_par_periode(
+    db: Session,
+    debut: date,
+    fin: date,
+    periode: str,
+    site_id: Optional[int] = None,
+    agent_id: Optional[int] = None
+) -> list:
+    """Interventions par jour, semaine ou mois, par type et en cumul sur la période."""
+    stats = models.StatInterventionsJour
+    debut_periode = PERIODES[periode](stats.jour)
+
+    def compter(type_intervention):
+        return func.sum(case((stats.type_intervention == type_intervention, stats.nb), else_=0))
+
+    nb = func.sum(stats.nb)
+    requete = select(
+        debut_periode.label("periode"),
+        nb.label("nb_interventions"),
+        compter(models.TypeInterventionEnum.REMPLISSAGE_GEL).label("nb_remplissage_gel"),
+        compter(models.TypeInterventionEnum.CHANGEMENT_BATTERIE).label("nb_changement_batterie"),
+        compter(models.TypeInterventionEnum.MAINTENANCE).label("nb_maintenance"),
+        func.sum(nb).over(order_by=debut_periode).label("cumul")
+    ).where(*_entre(stats, debut, fin))
+
+    if site_id is not None:
+        requete = requete.join(Borne, Borne.id_borne == stats.id_borne).where(Borne.id_site == site_id)
+    if agent_id is not None:
+        requete = requete.where(stats.id_agent == agent_id)
+
+    return [ligne._asdict() for ligne in db.execute(
+        requete.group_by(debut_periode).order_by(debut_periode)
+    )]
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.requetes_preparees import sel_borne_par_uuid
+
+logger = logging.getLogger("uvicorn.error")
+
+# Modes d'authentification des bornes (AUTH_BORNES_MODE)
+DESACTIVE = "desactive"  # Aucune vérification
+SI_CLE = "si_cle"  # Signature exigée des seules bornes qui ont une clé
+OBLIGATOIRE = "obligatoire"  # Signature exigée de toutes les bornes
+
+# En-têtes envoyés par l'ESP32
+EN_TETE_HORODATAGE = "X-Borne-Horodatage"
+EN_TETE_NONCE = "X-Borne-Nonce"
+EN_TETE_SIGNATURE = "X-Borne-Signature"
+
+
+class SignatureInvalide(Exception):
+    """Requête d'une borne refusée ; le message est renvoyé à l'appelant (401)."""
+
+    def __init__(self, motif: str, message: str):
+        super().__init__(message)
+        self.motif = motif
+
+
+# --- Clés ---
+
+def nouveau_sel() -> str:
+    return secrets.token_hex(16)
+
+
+def deriver_cle(uuid_esp: str, sel: str) -> bytes:
+    """
+    Clé HMAC de la borne, dérivée de la clé maîtresse du serveur.
+
+    La base ne conserve que le sel aléatoire : sans AUTH_BORNES_CLE_MAITRE,
+    une copie de la base ne permet pas de signer à la place d'une borne.
+    Changer le sel révoque l'ancienne clé.
+    """
+    return hmac.new(
+        settings.AUTH_BORNES_CLE_MAITRE.encode(), f"{uuid_esp}:{sel}".encode(), hashlib.sha256
+    ).digest()
+
+
+def message_signe(horodatage: str, nonce: str, corps: bytes) -> bytes:
+    return horodatage.encode() + b"\n" + nonce.encode() + b"\n" + corps
+
+
+def signer(cle: bytes, horodatage: str, nonce: str, corps: bytes) -> str:
+    """Signature attendue dans X-Borne-Signature (HMAC-SHA256 en hexadécimal)."""
+    return hmac.new(cle, message_signe(horodatage, nonce, corps), hashlib.sha256).hexdigest()
+
+
+class CacheCles:
+    """
+    Clés des bornes en mémoire, par uuid_esp : la vérification d'une requête
+    ne touche pas la base.
+
+    Chargé au démarrage pour toute la flotte ; une borne absente (créée par un
+    autre processus) est lue une fois en base. Les entrées, y compris « pas de
+    clé », expirent après AUTH_BORNES_CACHE_SECONDES pour suivre les
+    changements de clé faits par les autres processus.
+    """
+
+    def __init__(self, duree_secondes: float):
+        self.duree = duree_secondes
+        self._cles: Dict[str, Tuple[Optional[bytes], float]] = {}
+        self._lock = Lock()
+        self.lectures_base = 0
+
+    def obtenir(self, uuid_esp: str) -> Tuple[bool, Optional[bytes]]:
+        """Retourne (trouvée, clé) ; la clé est None pour une borne sans clé ou inconnue."""
+        entree = self._cles.get(uuid_esp)
+        if entree is None or time.monotonic() - entree[1] > self.duree:
+            return False, None
+        return True, entree[0]
+
+    def enregistrer(self, uuid_esp: str, cle: Optional[bytes]):
+        with self._lock:
+            self._cles[uuid_esp] = (cle, time.monotonic())
+
+    def lire(self, db: Session, uuid_esp: str) -> Optional[bytes]:
+        """Lit le sel de la borne en base, puis garde sa clé en cache."""
+        sel = sel_borne_par_uuid(db, uuid_esp)
+        self.lectures_base += 1
+        cle = deriver_cle(uuid_esp, sel) if sel else None
+        self.enregistrer(uuid_esp, cle)
+        return cle
+
+    def charger(self, db: Session) -> int:
+        """Charge les clés de toute la flotte ; retourne le nombre de bornes qui en ont une."""
+        lignes = db.execute(select(models.Borne.uuid_esp, models.Borne.cle_sel)).all()
+        maintenant = time.monotonic()
+        cles = {uuid_esp: (deriver_cle(uuid_esp, sel) if sel else None, maintenant) for uuid_esp, sel in lignes}
+        with self._lock:
+            self._cles.update(cles)
+        return sum(1 for cle, _ in cles.values() if cle)
+
+
+class FenetreRejeu:
+    """
+    Nonces reçus par borne pendant la fenêtre de validité des horodatages.
+
+    Une requête rejouée dans la fenêtre a un nonce déjà vu ; au-delà, son
+    horodatage est refusé. Le nombre de nonces par borne est borné : une
+    borne qui en envoie davantage pendant la fenêtre est refusée, jamais
+    l'inverse (oublier un nonce encore valide permettrait un rejeu).
+    """
+
+    def __init__(self, fenetre_secondes: int, max_par_borne: int):
+        self.fenetre = fenetre_secondes
+        self.max_par_borne = max_par_borne
+        self._nonces: Dict[str, "OrderedDict[str, float]"] = {}
+        self._lock = Lock()
+
+    def noter(self, uuid_esp: str, nonce: str, horodatage: float, maintenant: float) -> bool:
+        """Retient le nonce ; faux s'il a déjà été vu (rejeu) ou si la borne en a trop d'actifs."""
+        with self._lock:
+            nonces = self._nonces.get(uuid_esp)
+            if nonces is None:
+                nonces = self._nonces[uuid_esp] = OrderedDict()
+            # Les plus anciens en tête : nonces expirés retirés au passage
+            while nonces and next(iter(nonces.values())) < maintenant:
+                nonces.popitem(last=False)
+            if nonce in nonces or len(nonces) >= self.max_par_borne:
+                return False
+            nonces[nonce] = horodatage + self.fenetre
+            return True
+
+    def taille(self) -> int:
+        return sum(len(nonces) for nonces in self._nonces.values())
+
+
+class NoncesPartages:
+    """
+    Nonces des bornes en base (table nonces_bornes), communs à tous les processus.
+
+    La fenêtre locale (FenetreRejeu) ne voit que les requêtes reçues par son
+    processus : un rejeu envoyé à un autre worker n'y figure pas. La clé
+    (uuid_esp, nonce) de la table le fait refuser quel que soit le worker.
+    Base injoignable (mesures mises dans le spool) : seule la fenêtre locale
+    protège, ces acceptations sont comptées dans `non_partages`.
+    """
+
+    def __init__(self):
+        self.non_partages = 0
+
+    def noter(self, db: Session, uuid_esp: str, nonce: str, expiration: float) -> bool:
+        """Enregistre le nonce ; faux s'il a déjà été reçu par un processus."""
+        try:
+            db.execute(insert(models.NonceBorne).values(uuid_esp=uuid_esp, nonce=nonce, expiration=expiration))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        except SQLAlchemyError as e:
+            db.rollback()
+            self.non_partages += 1
+            logger.warning(f"Nonce de la borne '{uuid_esp}' non partagé (base indisponible): {str(e)}")
+        return True
+
+    @staticmethod
+    def purger(db: Session) -> int:
+        """Supprime les nonces dont l'horodatage est sorti de la fenêtre."""
+        resultat = db.execute(delete(models.NonceBorne).where(models.NonceBorne.expiration < time.time()))
+        db.commit()
+        return resultat.rowcount
+
+
+class AuthentificationBornes:
+    """
+    Vérification des requêtes signées des bornes (HMAC-SHA256).
+
+    La borne signe `horodatage \\n nonce \\n corps` avec sa clé et envoie les
+    en-têtes X-Borne-Horodatage (secondes Unix), X-Borne-Nonce et
+    X-Borne-Signature. Le coût est constant : un accès au cache des clés,
+    un HMAC et un accès à la fenêtre des nonces, plus une insertion dans
+    `partages` quand plusieurs processus reçoivent les mesures.
+    """
+
+    def __init__(self, mode: str, cles: CacheCles, rejeu: FenetreRejeu,
+                 partages: Optional[NoncesPartages] = None):
+        if mode not in (DESACTIVE, SI_CLE, OBLIGATOIRE):
+            raise ValueError(f"AUTH_BORNES_MODE inconnu: {mode}")
+        self.mode = mode
+        self.cles = cles
+        self.rejeu = rejeu
+        self.partages = partages
+        self.acceptees = 0
+        self.renvois = 0
+        self.refus: Counter = Counter()
+
+    @property
+    def active(self) -> bool:
+        return self.mode != DESACTIVE
+
+    def _refuser(self, motif: str, message: str):
+        self.refus[motif] += 1
+        raise SignatureInvalide(motif, message)
+
+    def verifier(self, uuid_esp: str, cle: Optional[bytes], en_tetes, corps: bytes,
+                 renvoi_connu: Optional[Callable[[], bool]] = None, db: Optional[Session] = None):
+        """
+        Lève SignatureInvalide si la requête n'est pas correctement signée par cette borne.
+
+        Une requête signée dont le nonce est déjà vu est acceptée si
+        `renvoi_connu()` est vrai : renvoi à l'identique (même corps signé)
+        d'une mesure déjà traitée, auquel l'appelant répond sans rien
+        réenregistrer. Avec `db`, le nonce est aussi noté dans `partages`
+        (appel bloquant) ; sans, seule la fenêtre du processus est consultée.
+        """
+        signature = en_tetes.get(EN_TETE_SIGNATURE)
+        if cle is None:
+            if self.mode == OBLIGATOIRE:
+                self._refuser("sans_cle", f"Aucune clé configurée pour la borne '{uuid_esp}'")
+            if signature is None:
+                return
+            self._refuser("sans_cle", f"Requête signée mais aucune clé configurée pour la borne '{uuid_esp}'")
+        if signature is None:
+            self._refuser("non_signee", "Requête non signée")
+
+        horodatage = en_tetes.get(EN_TETE_HORODATAGE, "")
+        nonce = en_tetes.get(EN_TETE_NONCE, "")
+        if not nonce or len(nonce) > 64:
+            self._refuser("nonce", "Nonce absent ou trop long")
+        try:
+            instant = float(horodatage)
+        except ValueError:
+            self._refuser("horodatage", "Horodatage invalide")
+        maintenant = time.time()
+        if not abs(maintenant - instant) <= self.rejeu.fenetre:  # Rejette aussi nan
+            self._refuser("horodatage", "Horodatage hors de la fenêtre acceptée (horloge de la borne ?)")
+
+        if not hmac.compare_digest(signer(cle, horodatage, nonce, corps), signature.lower()):
+            self._refuser("signature", "Signature invalide")
+        # Nonce retenu seulement pour une signature valide : pas de remplissage par un tiers
+        nouveau = self.rejeu.noter(uuid_esp, nonce, instant, maintenant)
+        if nouveau and self.partages is not None and db is not None:
+            nouveau = self.partages.noter(db, uuid_esp, nonce, instant + self.rejeu.fenetre)
+        if not nouveau:
+            if renvoi_connu is not None and renvoi_connu():
+                self.renvois += 1
+                return
+            self._refuser("rejeu", "Requête déjà reçue (nonce réutilisé)")
+        self.acceptees += 1
+
+    def etat(self) -> dict:
+        return {
+            "mode": self.mode,
+            "acceptees": self.acceptees,
+            "renvois": self.renvois,
+            "refusees": dict(self.refus),
+            "lectures_base": self.cles.lectures_base,
+            "nonces_retenus": self.rejeu.taille(),
+            "nonces_non_partages": self.partages.non_partages if self.partages else None,
+        }
+
+
+async def precharger_cles(session_factory, authentification: AuthentificationBornes):
+    """Charge les clés de la flotte au démarrage ; en cas d'échec, elles seront lues à la demande."""
+    def charger():
+        db = session_factory()
+        try:
+            return authentification.cles.charger(db)
+        finally:
+            db.close()
+
+    try:
+        nb = await asyncio.to_thread(charger)
+        logger.info(f"Authentification des bornes : {nb} clé(s) chargée(s)")
+    except Exception as e:
+        logger.error(f"Clés des bornes non préchargées: {str(e)}")
+
+
+def _purger_nonces(session_factory) -> int:
+    db = session_factory()
+    try:
+        return NoncesPartages.purger(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def boucle_purge_nonces(session_factory):
+    """Tâche de fond : purge périodique des nonces partagés expirés."""
+    while True:
+        try:
+            nb = await asyncio.to_thread(_purger_nonces, session_factory)
+            if nb:
+                logger.info(f"Authentification des bornes : {nb} nonce(s) expiré(s) purgé(s)")
+        except Exception as e:
+            logger.error(f"Erreur de purge des nonces des bornes: {str(e)}")
+        await asyncio.sleep(settings.AUTH_BORNES_FENETRE_SECONDES)
+
+
+# Instance partagée par le processus
+authentification_bornes = AuthentificationBornes(
+    settings.AUTH_BORNES_MODE,
+    CacheCles(settings.AUTH_BORNES_CACHE_SECONDES),
+    FenetreRejeu(settings.AUTH_BORNES_FENETRE_SECONDES, settings.AUTH_BORNES_NONCES_MAX_PAR_BORNE),
+    NoncesPartages() if settings.AUTH_BORNES_NONCES_PARTAGES else None,
+)
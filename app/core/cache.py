@@ -0,0 +1,45 @@
+import time
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+
+class CacheTTL:
+    """
+    Cache en mémoire avec durée de vie courte.
+
+    Les calculs concurrents d'une même clé sont regroupés : un seul appel
+    à la fonction de calcul, les autres requêtes attendent son résultat.
+    """
+
+    def __init__(self, ttl_secondes: float):
+        self.ttl = ttl_secondes
+        self._valeurs = {}
+        self._verrous = {}
+        self._lock = Lock()
+        self.succes = 0
+        self.echecs = 0
+
+    def obtenir(self, cle: Hashable, calcul: Callable[[], Any]) -> Any:
+        """Retourne la valeur en cache, ou la calcule si elle est absente ou expirée."""
+        entree = self._valeurs.get(cle)
+        if entree is not None and entree[0] > time.monotonic():
+            self.succes += 1
+            return entree[1]
+
+        with self._lock:
+            verrou = self._verrous.setdefault(cle, Lock())
+
+        with verrou:
+            # Une autre requête a pu calculer la valeur pendant l'attente
+            entree = self._valeurs.get(cle)
+            if entree is not None and entree[0] > time.monotonic():
+                self.succes += 1
+                return entree[1]
+            self.echecs += 1
+            valeur = calcul()
+            self._valeurs[cle] = (time.monotonic() + self.ttl, valeur)
+            return valeur
+
+    def invalider(self, **_):
+        """Vide le cache (utilisable directement comme abonné à un événement)."""
+        self._valeurs.clear()
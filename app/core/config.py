@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -12,6 +14,127 @@ class Settings(BaseSettings):
     # Application
     DEBUG: bool = True
     
+    # Ingestion des mesures
+    DEDUP_TAILLE_FENETRE: int = 256  # Nombre de séquences mémorisées par borne
+    DEDUP_DUREE_SECONDES: int = 600  # Délai de reconnaissance d'un renvoi sans horodatage ESP32
+    DECALAGE_HORLOGE_MAX_SECONDES: int = 300  # Avance tolérée sur l'horloge de l'ESP32
+    
+    # Détection des interventions dans le flux de mesures (hausse en points de pourcentage)
+    SAUT_REMPLISSAGE_GEL: int = 30
+    SAUT_CHANGEMENT_BATTERIE: int = 40
+    
+    # Cache des dernières mesures par borne (tampons circulaires)
+    TAMPON_CAPACITE: int = 128  # Mesures conservées par borne
+    TAMPON_BUDGET_OCTETS: int = 32 * 1024 * 1024  # Budget mémoire pour toute la flotte
+    TAMPON_DUREE_SECONDES: int = 10  # Au-delà, rechargé depuis la base (autres workers, import d'historique)
+    
+    # Détection des bornes hors ligne
+    HORS_LIGNE_ACTIF: bool = True
+    HORS_LIGNE_DELAI_SECONDES: int = 6 * 3600  # Silence toléré avant l'alerte
+    HORS_LIGNE_TIC_SECONDES: int = 60  # Fréquence de vérification
+    
+    # Profilage à la demande (désactivé : aucun coût)
+    PROFILAGE_ACTIF: bool = False
+    PROFILAGE_TAUX_ECHANTILLONNAGE: float = 0.0  # Fraction des requêtes profilées d'office
+    PROFILAGE_DOSSIER: str = "profils"
+    
+    # Tableau de bord
+    DASHBOARD_CACHE_TTL_SECONDES: float = 10
+    
+    # Limitation de débit de l'ingestion (seaux à jetons)
+    LIMITE_BORNE_CAPACITE: int = 10  # Rafale maximale par borne
+    LIMITE_BORNE_DEBIT: float = 1.0  # Mesures par seconde et par borne
+    LIMITE_IP_CAPACITE: int = 200  # Rafale maximale par adresse IP
+    LIMITE_IP_DEBIT: float = 50.0  # Requêtes par seconde et par adresse IP
+    
+    # Délestage global lorsque la base sature
+    DELESTAGE_FILE_MAX: int = 64  # Requêtes d'ingestion simultanées
+    DELESTAGE_ATTENTE_POOL_MAX_MS: float = 500  # Attente moyenne d'une connexion
+    DELESTAGE_OCCUPATION_POOL_MAX: float = 0.9  # Part du pool en cours d'utilisation
+    
+    # Répartition des mesures par site (JSON dans .env). Vide : tout reste dans DATABASE_URL
+    SHARDS_MESURES: Dict[str, str] = {}  # Nom du shard -> URL de sa base de données
+    SHARDS_SITES: Dict[int, str] = {}  # id_site -> nom du shard (défaut : base principale)
+    SHARDS_PARALLELISME: int = 8  # Shards interrogés simultanément par les requêtes de flotte
+    
+    # Stockage des mesures brutes : "sql" (table mesures) ou "segments" (fichiers colonnaires NumPy)
+    STOCKAGE_MESURES: str = "sql"
+    SEGMENTS_DOSSIER: str = "segments"
+    SEGMENTS_COMPACTAGE_SECONDES: int = 300  # Fusion des journaux dans les segments triés
+    
+    # Disjoncteur de la base et spool local de l'ingestion pendant une panne
+    DISJONCTEUR_SEUIL_ECHECS: int = 3  # Pannes consécutives avant ouverture
+    DISJONCTEUR_DELAI_SECONDES: float = 5  # Durée d'ouverture avant un nouvel essai
+    SPOOL_ACTIF: bool = True
+    SPOOL_DOSSIER: str = "spool"
+    SPOOL_TAILLE_FICHIER_OCTETS: int = 4 * 1024 * 1024
+    SPOOL_TAILLE_MAX_OCTETS: int = 256 * 1024 * 1024  # Au-delà, l'ingestion répond 503
+    SPOOL_FSYNC_DELAI_MS: float = 5  # Regroupement des écritures avant fsync
+    SPOOL_LOT: int = 1000  # Mesures rejouées par transaction
+    SPOOL_REJEU_SECONDES: float = 1
+    
+    # Isolation des classes de charge (ingestion, lectures interactives, rapports)
+    ISOLATION_CAPACITE: int = 96  # Requêtes admises simultanément, toutes classes
+    ISOLATION_RESERVE_INGESTION: int = 32  # Places de la capacité réservées à l'ingestion
+    ISOLATION_INGESTION_LIMITE: int = 64
+    ISOLATION_LECTURE_LIMITE: int = 16
+    ISOLATION_RAPPORTS_LIMITE: int = 4
+    ISOLATION_INGESTION_ATTENTE_MAX_SECONDES: float = 2
+    ISOLATION_LECTURE_ATTENTE_MAX_SECONDES: float = 10
+    ISOLATION_RAPPORTS_ATTENTE_MAX_SECONDES: float = 30
+    # Pools de connexions par classe (taille, débordement)
+    POOL_INGESTION_TAILLE: int = 10
+    POOL_INGESTION_DEBORDEMENT: int = 10
+    POOL_LECTURE_TAILLE: int = 5
+    POOL_LECTURE_DEBORDEMENT: int = 5
+    POOL_RAPPORTS_TAILLE: int = 2
+    POOL_RAPPORTS_DEBORDEMENT: int = 2
+    
+    # Filtre du bruit des capteurs avant décision d'alerte (aucun, mediane ou rebond),
+    # pour les bornes sans réglage propre
+    FILTRE_MESURES_DEFAUT: str = "aucun"
+    FILTRE_FENETRE_DEFAUT: int = 3  # Nombre de mesures de la fenêtre du filtre
+    
+    # Notifications des alertes (outbox envoyée par une tâche de fond)
+    OUTBOX_ACTIF: bool = True
+    OUTBOX_SINKS: List[str] = ["journal"]  # journal, webhook
+    OUTBOX_WEBHOOK_URL: str = "http://127.0.0.1:8099/notifications"
+    OUTBOX_WEBHOOK_DELAI_SECONDES: float = 5
+    OUTBOX_INTERVALLE_SECONDES: float = 2
+    OUTBOX_REGROUPEMENT_SECONDES: float = 5  # Attente pour grouper les alertes d'un même agent
+    OUTBOX_LOT: int = 200  # Notifications traitées par tour
+    OUTBOX_BAIL_SECONDES: float = 60  # Réservation d'un lot le temps de l'envoyer
+    OUTBOX_TENTATIVES_MAX: int = 8
+    OUTBOX_DELAI_INITIAL_SECONDES: float = 5  # Délai avant la 2e tentative, doublé ensuite
+    OUTBOX_DELAI_MAX_SECONDES: float = 900
+    OUTBOX_RETENTION_HEURES: float = 72  # Notifications envoyées ou abandonnées conservées
+    
+    # Authentification des bornes par signature HMAC de leurs requêtes d'ingestion.
+    # Une borne n'a de clé que si elle est demandée (création avec_cle, POST /bornes/{id}/cle) :
+    # en mode "si_cle", les bornes sans clé (firmware qui ne signe pas) restent acceptées.
+    AUTH_BORNES_MODE: str = "si_cle"  # "desactive", "si_cle" (bornes ayant une clé) ou "obligatoire"
+    AUTH_BORNES_CLE_MAITRE: str = "changez_moi_cle_maitre_des_bornes"  # Dérivation des clés des bornes
+    AUTH_BORNES_FENETRE_SECONDES: int = 300  # Écart toléré entre l'horodatage signé et l'horloge du serveur
+    AUTH_BORNES_NONCES_MAX_PAR_BORNE: int = 1024  # Nonces retenus par borne pendant la fenêtre
+    # Nonces aussi notés en base (table nonces_bornes) : rejeu refusé quel que soit le worker.
+    # À désactiver seulement pour un déploiement à un seul processus.
+    AUTH_BORNES_NONCES_PARTAGES: bool = True
+    AUTH_BORNES_CACHE_SECONDES: float = 300  # Durée de vie d'une clé en cache
+    
+    # Heatmaps d'utilisation des bornes (jour de la semaine × heure)
+    HEATMAP_FUSEAU: str = "Europe/Paris"  # Fuseau des créneaux (horodatages stockés en UTC)
+    HEATMAP_ENREGISTREMENT_SECONDES: float = 30  # Report en base des compteurs accumulés en mémoire
+    
+    # Journal des changements de bornes (synchronisation incrémentale des clients)
+    JOURNAL_RETENTION_HEURES: float = 48  # Au-delà, le client doit refaire une synchronisation complète
+    JOURNAL_MARGE_SECONDES: float = 5  # Changements récents relus au prochain appel (transactions en cours)
+    JOURNAL_LIMITE: int = 5000  # Changements lus par appel
+    JOURNAL_PURGE_SECONDES: float = 3600
+    
+    # Analyses des alertes et interventions (tables de statistiques journalières)
+    ANALYSES_RAFRAICHISSEMENT_SECONDES: float = 60  # Fraîcheur maximale des rapports
+    ANALYSES_JOURS_RECALCULES: int = 1  # Jours recalculés avant le dernier jour présent
+    
     class Config:
         env_file = ".env"
 
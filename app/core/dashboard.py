@@ -0,0 +1,191 @@
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.cache import CacheTTL
+from app.core.config import settings
+from app.core.evenements import ALERTES_MODIFIEES, BORNES_MODIFIEES, abonner
+from app.core.requetes import sous_requete_derniere_mesure
+from app.core.depot_mesures import depot_mesures
+
+# Seuil en dessous duquel un niveau est considéré comme critique (cf. verifier_et_creer_alertes)
+NIVEAU_CRITIQUE = 5
+
+STATUTS_ACTIFS = [models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE]
+
+
+def _ligne_vide() -> dict:
+    return {
+        "nb_bornes": 0, "nb_sans_mesure": 0,
+        "nb_gel_bas": 0, "nb_gel_critique": 0,
+        "nb_batterie_basse": 0, "nb_batterie_critique": 0,
+        "alertes_ouvertes": 0,
+        "_somme_gel": 0, "_somme_batterie": 0, "_nb_mesurees": 0,
+    }
+
+
+def _cumuler(cible: dict, ligne) -> None:
+    for cle in ("nb_bornes", "nb_sans_mesure", "nb_gel_bas", "nb_gel_critique",
+                "nb_batterie_basse", "nb_batterie_critique", "alertes_ouvertes"):
+        cible[cle] += int(ligne[cle] or 0)
+    cible["_somme_gel"] += int(ligne["somme_gel"] or 0)
+    cible["_somme_batterie"] += int(ligne["somme_batterie"] or 0)
+    cible["_nb_mesurees"] += int(ligne["nb_bornes"] or 0) - int(ligne["nb_sans_mesure"] or 0)
+
+
+def _finaliser(entree: dict) -> dict:
+    nb = entree.pop("_nb_mesurees")
+    somme_gel = entree.pop("_somme_gel")
+    somme_batterie = entree.pop("_somme_batterie")
+    entree["moyenne_gel"] = round(somme_gel / nb, 1) if nb else None
+    entree["moyenne_batterie"] = round(somme_batterie / nb, 1) if nb else None
+    return entree
+
+
+def _sous_requete_alertes_ouvertes():
+    return select(
+        models.Alerte.id_borne,
+        func.count().label("nb")
+    ).where(models.Alerte.statut.in_(STATUTS_ACTIFS)).group_by(models.Alerte.id_borne).subquery()
+
+
+def _lignes_groupees(db: Session):
+    """Agrégats par (site, agent) en une seule requête, mesures dans la base principale."""
+    alertes = _sous_requete_alertes_ouvertes()
+
+    gel = models.Mesure.niveau_gel
+    batterie = models.Mesure.niveau_batterie
+
+    def compter(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    requete = select(
+        models.Borne.id_site,
+        models.Site.nom_site,
+        models.Borne.id_agent_affecte,
+        models.Utilisateur.prenom,
+        models.Utilisateur.nom,
+        func.count(models.Borne.id_borne).label("nb_bornes"),
+        compter(models.Mesure.id_mesure.is_(None)).label("nb_sans_mesure"),
+        compter(and_(gel > NIVEAU_CRITIQUE, gel <= models.Borne.seuil_alerte_gel)).label("nb_gel_bas"),
+        compter(gel <= NIVEAU_CRITIQUE).label("nb_gel_critique"),
+        compter(and_(batterie > NIVEAU_CRITIQUE, batterie <= models.Borne.seuil_alerte_batterie)).label("nb_batterie_basse"),
+        compter(batterie <= NIVEAU_CRITIQUE).label("nb_batterie_critique"),
+        func.sum(gel).label("somme_gel"),
+        func.sum(batterie).label("somme_batterie"),
+        func.coalesce(func.sum(alertes.c.nb), 0).label("alertes_ouvertes"),
+    ).select_from(models.Borne).join(
+        models.Site, models.Site.id_site == models.Borne.id_site
+    ).outerjoin(
+        models.Utilisateur, models.Utilisateur.id_utilisateur == models.Borne.id_agent_affecte
+    ).outerjoin(
+        models.Mesure, models.Mesure.id_mesure == sous_requete_derniere_mesure()
+    ).outerjoin(
+        alertes, alertes.c.id_borne == models.Borne.id_borne
+    ).where(
+        models.Borne.est_active.is_not(False)
+    ).group_by(
+        models.Borne.id_site, models.Site.nom_site,
+        models.Borne.id_agent_affecte, models.Utilisateur.prenom, models.Utilisateur.nom
+    )
+    return [ligne._mapping for ligne in db.execute(requete)]
+
+
+def _lignes_reparties(db: Session):
+    """
+    Agrégats par (site, agent) quand les mesures sont hors de la base principale.
+
+    Les bornes et leurs alertes viennent de la base principale, les dernières
+    mesures du stockage des mesures (shards en parallèle, ou segments) ;
+    le regroupement se fait en mémoire.
+    """
+    alertes = _sous_requete_alertes_ouvertes()
+    bornes = db.execute(
+        select(
+            models.Borne.id_borne,
+            models.Borne.id_site,
+            models.Site.nom_site,
+            models.Borne.id_agent_affecte,
+            models.Utilisateur.prenom,
+            models.Utilisateur.nom,
+            models.Borne.seuil_alerte_gel,
+            models.Borne.seuil_alerte_batterie,
+            func.coalesce(alertes.c.nb, 0).label("alertes_ouvertes"),
+        ).select_from(models.Borne).join(
+            models.Site, models.Site.id_site == models.Borne.id_site
+        ).outerjoin(
+            models.Utilisateur, models.Utilisateur.id_utilisateur == models.Borne.id_agent_affecte
+        ).outerjoin(
+            alertes, alertes.c.id_borne == models.Borne.id_borne
+        ).where(models.Borne.est_active.is_not(False))
+    ).all()
+    dernieres = depot_mesures.dernieres_flotte()
+
+    groupes = {}
+    for borne in bornes:
+        ligne = groupes.setdefault((borne.id_site, borne.id_agent_affecte), {
+            "id_site": borne.id_site, "nom_site": borne.nom_site,
+            "id_agent_affecte": borne.id_agent_affecte, "prenom": borne.prenom, "nom": borne.nom,
+            "nb_bornes": 0, "nb_sans_mesure": 0,
+            "nb_gel_bas": 0, "nb_gel_critique": 0, "nb_batterie_basse": 0, "nb_batterie_critique": 0,
+            "somme_gel": 0, "somme_batterie": 0, "alertes_ouvertes": 0,
+        })
+        ligne["nb_bornes"] += 1
+        ligne["alertes_ouvertes"] += borne.alertes_ouvertes
+        derniere = dernieres.get(borne.id_borne)
+        if derniere is None:
+            ligne["nb_sans_mesure"] += 1
+            continue
+        gel, batterie = derniere.niveau_gel, derniere.niveau_batterie
+        # Seuil absent : comme en SQL, la comparaison avec NULL est fausse
+        seuil_gel = -1 if borne.seuil_alerte_gel is None else borne.seuil_alerte_gel
+        seuil_batterie = -1 if borne.seuil_alerte_batterie is None else borne.seuil_alerte_batterie
+        ligne["nb_gel_critique"] += gel <= NIVEAU_CRITIQUE
+        ligne["nb_gel_bas"] += NIVEAU_CRITIQUE < gel <= seuil_gel
+        ligne["nb_batterie_critique"] += batterie <= NIVEAU_CRITIQUE
+        ligne["nb_batterie_basse"] += NIVEAU_CRITIQUE < batterie <= seuil_batterie
+        ligne["somme_gel"] += gel
+        ligne["somme_batterie"] += batterie
+    return list(groupes.values())
+
+
+def calculer_resume(db: Session) -> dict:
+    """
+    Calcule les agrégats de la flotte par site et par agent.
+
+    Une seule requête groupée par (site, agent) sur les bornes, leur dernière
+    mesure et leurs alertes ouvertes ; les totaux par site, par agent et
+    global sont ensuite cumulés en mémoire (quelques dizaines de lignes).
+    Si les mesures ne sont pas dans la base principale (shards, segments),
+    les dernières mesures sont lues à part et regroupées en mémoire.
+    """
+    lignes = _lignes_groupees(db) if depot_mesures.jointure_sql else _lignes_reparties(db)
+
+    total = _ligne_vide()
+    par_site, par_agent = {}, {}
+    for ligne in lignes:
+        site = par_site.setdefault(ligne["id_site"], {"id_site": ligne["id_site"], "nom_site": ligne["nom_site"], **_ligne_vide()})
+        agent = par_agent.setdefault(ligne["id_agent_affecte"], {
+            "id_agent": ligne["id_agent_affecte"],
+            "agent_nom": f"{ligne['prenom']} {ligne['nom']}" if ligne["id_agent_affecte"] else None,
+            **_ligne_vide()
+        })
+        for cible in (total, site, agent):
+            _cumuler(cible, ligne)
+
+    return {
+        "total": _finaliser(total),
+        "par_site": [_finaliser(site) for site in par_site.values()],
+        "par_agent": [_finaliser(agent) for agent in par_agent.values()],
+    }
+
+
+# Cache partagé : une seule requête pour tous les tableaux de bord ouverts
+cache_resume = CacheTTL(settings.DASHBOARD_CACHE_TTL_SECONDES)
+abonner(BORNES_MODIFIEES, cache_resume.invalider)
+abonner(ALERTES_MODIFIEES, cache_resume.invalider)
+
+
+def obtenir_resume(db: Session) -> dict:
+    """Retourne le résumé de la flotte depuis le cache, ou le recalcule."""
+    return cache_resume.obtenir("resume", lambda: calculer_resume(db))
@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Optional
+
+from app.core.config import settings
+
+
+class FenetreDeduplication:
+    """
+    Fenêtre bornée en mémoire des derniers numéros de séquence reçus par borne.
+
+    Permet de répondre aux renvois de l'ESP32 (Wi-Fi instable) sans toucher
+    à la base de données. La contrainte unique (id_borne, sequence, horodatage)
+    en base reste le filet de sécurité après un redémarrage du serveur.
+
+    Le compteur de séquence repart de zéro quand l'ESP32 redémarre : une
+    séquence connue n'est un renvoi que si l'horodatage envoyé est le même,
+    ou, sans horodatage, si les niveaux sont les mêmes et la première
+    réception date de moins de `duree_secondes`.
+    """
+
+    def __init__(self, taille_par_borne: int = 256, max_bornes: int = 10000, duree_secondes: int = 600):
+        self.taille_par_borne = taille_par_borne
+        self.max_bornes = max_bornes
+        self.duree_secondes = duree_secondes
+        self._sequences: "OrderedDict[str, OrderedDict[int, tuple]]" = OrderedDict()
+        self._lock = Lock()
+
+    def rechercher(self, uuid_esp: str, sequence: int, horodatage: Optional[datetime],
+                   niveau_gel: int, niveau_batterie: int) -> Optional[dict]:
+        """Retourne la réponse déjà envoyée si la mesure est un renvoi, sinon None."""
+        with self._lock:
+            fenetre = self._sequences.get(uuid_esp)
+            if fenetre is None:
+                return None
+            self._sequences.move_to_end(uuid_esp)
+            entree = fenetre.get(sequence)
+        if entree is None:
+            return None
+        reponse, empreinte, instant = entree
+        if empreinte != (horodatage, niveau_gel, niveau_batterie):
+            return None
+        if horodatage is None and time.monotonic() - instant > self.duree_secondes:
+            return None
+        return reponse
+
+    def enregistrer(self, uuid_esp: str, sequence: int, horodatage: Optional[datetime],
+                    niveau_gel: int, niveau_batterie: int, reponse: dict):
+        """Mémorise la réponse envoyée pour une mesure, en évinçant les plus anciennes."""
+        with self._lock:
+            fenetre = self._sequences.get(uuid_esp)
+            if fenetre is None:
+                fenetre = OrderedDict()
+                self._sequences[uuid_esp] = fenetre
+                if len(self._sequences) > self.max_bornes:
+                    self._sequences.popitem(last=False)
+            else:
+                self._sequences.move_to_end(uuid_esp)
+
+            fenetre[sequence] = (reponse, (horodatage, niveau_gel, niveau_batterie), time.monotonic())
+            fenetre.move_to_end(sequence)
+            if len(fenetre) > self.taille_par_borne:
+                fenetre.popitem(last=False)
+
+
+# Instance partagée par le processus
+fenetre_deduplication = FenetreDeduplication(
+    taille_par_borne=settings.DEDUP_TAILLE_FENETRE, duree_secondes=settings.DEDUP_DUREE_SECONDES
+)
@@ -0,0 +1,294 @@
+from abc import ABC, abstractmethod
+from calendar import timegm
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import requetes_preparees
+from app.core.config import settings
+from app.core.shards import carte_shards, dernieres_mesures_flotte
+
+
+def _en_secondes(horodatage: datetime) -> int:
+    return timegm(horodatage.utctimetuple())
+
+
+def agreger_par_intervalle(lignes, debut: datetime, pas_secondes: int) -> List[dict]:
+    """
+    Sous-échantillonne des mesures (horodatage, gel, batterie) par intervalles de `pas_secondes`.
+
+    Retourne, pour chaque intervalle non vide, le nombre de mesures et les
+    niveaux moyen, minimal et maximal.
+    """
+    origine = _en_secondes(debut)
+    intervalles = {}
+    for horodatage, gel, batterie in lignes:
+        rang = (_en_secondes(horodatage) - origine) // pas_secondes
+        entree = intervalles.get(rang)
+        if entree is None:
+            intervalles[rang] = [1, gel, gel, gel, batterie, batterie, batterie]
+        else:
+            entree[0] += 1
+            entree[1] += gel
+            entree[2] = min(entree[2], gel)
+            entree[3] = max(entree[3], gel)
+            entree[4] += batterie
+            entree[5] = min(entree[5], batterie)
+            entree[6] = max(entree[6], batterie)
+    return [
+        resume_intervalle(origine + rang * pas_secondes, *entree)
+        for rang, entree in sorted(intervalles.items())
+    ]
+
+
+def resume_intervalle(debut_secondes: int, nb, somme_gel, gel_min, gel_max, somme_batterie, batterie_min, batterie_max) -> dict:
+    return {
+        "debut": datetime.utcfromtimestamp(debut_secondes),
+        "nb_mesures": int(nb),
+        "gel_moyen": round(float(somme_gel) / nb, 1),
+        "gel_min": int(gel_min),
+        "gel_max": int(gel_max),
+        "batterie_moyenne": round(float(somme_batterie) / nb, 1),
+        "batterie_min": int(batterie_min),
+        "batterie_max": int(batterie_max),
+    }
+
+
+class DepotMesures(ABC):
+    """
+    Interface du stockage des mesures brutes.
+
+    `db` est la session de la base qui stocke les mesures de la borne
+    (shard de son site) ; un dépôt hors SQL l'ignore. Les lignes retournées
+    sont des dictionnaires au format du schéma `Mesure`.
+    """
+
+    # Vrai si les mesures sont dans la base principale et peuvent être jointes aux bornes en SQL
+    jointure_sql = False
+
+    @abstractmethod
+    def precedente(self, db: Session, id_borne: int) -> Optional[Tuple[datetime, int, int]]:
+        """(horodatage, gel, batterie) de la mesure la plus récente, ou None."""
+
+    @abstractmethod
+    def ajouter(self, db: Session, id_borne: int, niveau_gel: int, niveau_batterie: int,
+                horodatage: Optional[datetime], sequence: Optional[int]):
+        """
+        Enregistre une mesure et retourne (mesure, doublon).
+
+        Si la mesure est un renvoi (même séquence et même horodatage ; sans
+        horodatage, mêmes niveaux reçus depuis moins de DEDUP_DUREE_SECONDES),
+        la mesure existante est retournée avec doublon=True. Lève IntegrityError
+        sinon en cas de conflit.
+        """
+
+    def ajouter_lot(self, db: Session, lignes: List[dict]) -> List[dict]:
+        """
+        Enregistre un lot de mesures (clés id_borne, niveau_gel, niveau_batterie, horodatage, sequence).
+
+        Retourne les lignes effectivement enregistrées : celles dont la
+        séquence est déjà connue au même horodatage sont écartées.
+        """
+        nouvelles = []
+        for ligne in lignes:
+            _, doublon = self.ajouter(
+                db, ligne["id_borne"], ligne["niveau_gel"], ligne["niveau_batterie"], ligne["horodatage"], ligne["sequence"]
+            )
+            if not doublon:
+                nouvelles.append(ligne)
+        return nouvelles
+
+    def finaliser(self, db: Session, mesure):
+        """Appelé après la validation de la transaction (ex: relire les valeurs par défaut)."""
+
+    @abstractmethod
+    def dernieres(self, db: Session, id_borne: int, limite: int) -> List[dict]:
+        """Les `limite` mesures les plus récentes, plus récente en premier."""
+
+    @abstractmethod
+    def statistiques(self, db: Session, id_borne: int) -> Tuple[int, Optional[float], Optional[float]]:
+        """(nombre de mesures, gel moyen, batterie moyenne)."""
+
+    @abstractmethod
+    def agregats(self, db: Session, id_borne: int, debut: datetime, fin: datetime, pas_secondes: int) -> List[dict]:
+        """Mesures de [debut, fin) sous-échantillonnées par intervalles de `pas_secondes`."""
+
+    @abstractmethod
+    def dernieres_flotte(self) -> Dict[int, object]:
+        """Dernière mesure de chaque borne (attributs niveau_gel, niveau_batterie, horodatage)."""
+
+
+class DepotMesuresSQL(DepotMesures):
+    """
+    Mesures dans la table `mesures` (base principale ou shard du site).
+
+    Une borne changée de site garde son historique dans l'ancien shard :
+    les lectures par borne le complètent avec les autres shards, en
+    parallèle, comme `dernieres_mesures_flotte`.
+    """
+
+    @property
+    def jointure_sql(self) -> bool:
+        return not carte_shards.active
+
+    @staticmethod
+    def _autres_shards(db, requete) -> list:
+        """Résultats de `requete` sur les shards autres que celui de `db` (vide sans shard)."""
+        if not carte_shards.active:
+            return []
+        courant = carte_shards.shard_de_session(db)
+        return list(carte_shards.repartir(requete, [nom for nom in carte_shards.noms if nom != courant]).values())
+
+    def precedente(self, db, id_borne):
+        # Les mesures du shard du site sont les plus récentes ; sans mesure, celles d'avant un changement de site
+        precedente = requetes_preparees.precedente_mesure(db, id_borne)
+        if precedente is None:
+            anciennes = self._autres_shards(db, lambda session: requetes_preparees.precedente_mesure(session, id_borne))
+            precedente = max(filter(None, anciennes), key=lambda mesure: mesure[0], default=None)
+        return precedente
+
+    def _renvoi(self, db, id_borne, niveau_gel, niveau_batterie, horodatage, sequence) -> Optional[models.Mesure]:
+        """Mesure déjà enregistrée dont celle-ci est un renvoi, sinon None."""
+        requete = select(models.Mesure).where(
+            models.Mesure.id_borne == id_borne,
+            models.Mesure.sequence == sequence
+        )
+        if horodatage is not None:
+            requete = requete.where(models.Mesure.horodatage == horodatage)
+        else:
+            limite = datetime.utcnow() - timedelta(seconds=settings.DEDUP_DUREE_SECONDES)
+            requete = requete.where(
+                models.Mesure.niveau_gel == niveau_gel,
+                models.Mesure.niveau_batterie == niveau_batterie,
+                models.Mesure.horodatage >= limite
+            )
+        return db.scalars(requete.order_by(models.Mesure.id_mesure.desc()).limit(1)).first()
+
+    def ajouter(self, db, id_borne, niveau_gel, niveau_batterie, horodatage, sequence):
+        if sequence is not None and horodatage is None:
+            # Horodatage de réception : la contrainte unique ne reconnaît pas le renvoi
+            existante = self._renvoi(db, id_borne, niveau_gel, niveau_batterie, horodatage, sequence)
+            if existante:
+                return existante, True
+
+        mesure = models.Mesure(
+            id_borne=id_borne,
+            niveau_gel=niveau_gel,
+            niveau_batterie=niveau_batterie,
+            sequence=sequence
+        )
+        if horodatage is not None:
+            mesure.horodatage = horodatage
+
+        db.add(mesure)
+        try:
+            db.flush()
+        except IntegrityError:
+            # Renvoi non présent dans la fenêtre mémoire (ex: après redémarrage)
+            db.rollback()
+            if sequence is None:
+                raise
+            existante = self._renvoi(db, id_borne, niveau_gel, niveau_batterie, horodatage, sequence)
+            if not existante:
+                raise
+            return existante, True
+        return mesure, False
+
+    def ajouter_lot(self, db, lignes):
+        # Séquences déjà enregistrées lues en une requête, puis un seul INSERT multi-lignes
+        sequences = {(l["id_borne"], l["sequence"]) for l in lignes if l["sequence"] is not None}
+        existantes = set()
+        if sequences:
+            existantes = set(db.execute(
+                select(models.Mesure.id_borne, models.Mesure.sequence, models.Mesure.horodatage).where(
+                    models.Mesure.id_borne.in_({id_borne for id_borne, _ in sequences}),
+                    models.Mesure.sequence.in_({sequence for _, sequence in sequences})
+                )
+            ).tuples())
+
+        nouvelles = []
+        for ligne in lignes:
+            if ligne["sequence"] is not None:
+                cle = (ligne["id_borne"], ligne["sequence"], ligne["horodatage"])
+                if cle in existantes:
+                    continue
+                existantes.add(cle)
+            nouvelles.append(ligne)
+        if nouvelles:
+            db.execute(insert(models.Mesure), nouvelles)
+        return nouvelles
+
+    def finaliser(self, db, mesure):
+        db.refresh(mesure)
+
+    def dernieres(self, db, id_borne, limite):
+        lignes = requetes_preparees.dernieres_mesures(db, id_borne, limite)
+        if len(lignes) < limite:
+            for anciennes in self._autres_shards(
+                db, lambda session: requetes_preparees.dernieres_mesures(session, id_borne, limite)
+            ):
+                lignes += anciennes
+            lignes.sort(key=lambda ligne: (ligne["horodatage"], ligne["id_mesure"]), reverse=True)
+            del lignes[limite:]
+        return lignes
+
+    def statistiques(self, db, id_borne):
+        # Totaux calculés par la base plutôt qu'en chargeant tout l'historique, puis sommés entre shards
+        def totaux(session):
+            return tuple(session.execute(
+                select(
+                    func.count(models.Mesure.id_mesure),
+                    func.sum(models.Mesure.niveau_gel),
+                    func.sum(models.Mesure.niveau_batterie)
+                ).where(models.Mesure.id_borne == id_borne)
+            ).one())
+
+        parts = [totaux(db)] + self._autres_shards(db, totaux)
+        total = sum(part[0] for part in parts)
+        if not total:
+            return 0, None, None
+        return (
+            total,
+            sum(float(part[1] or 0) for part in parts) / total,
+            sum(float(part[2] or 0) for part in parts) / total,
+        )
+
+    def agregats(self, db, id_borne, debut, fin, pas_secondes):
+        def lire(session):
+            return session.execute(
+                select(
+                    models.Mesure.horodatage,
+                    models.Mesure.niveau_gel,
+                    models.Mesure.niveau_batterie
+                ).where(
+                    models.Mesure.id_borne == id_borne,
+                    models.Mesure.horodatage >= debut,
+                    models.Mesure.horodatage < fin
+                )
+            ).all()
+
+        lignes = lire(db)
+        for anciennes in self._autres_shards(db, lire):
+            lignes += anciennes
+        return agreger_par_intervalle(lignes, debut, pas_secondes)
+
+    def dernieres_flotte(self):
+        return dernieres_mesures_flotte()
+
+
+def _creer_depot() -> DepotMesures:
+    if settings.STOCKAGE_MESURES == "segments":
+        # NumPy n'est requis que pour ce stockage
+        from app.core.segments import DepotMesuresSegments
+        return DepotMesuresSegments(settings.SEGMENTS_DOSSIER)
+    if settings.STOCKAGE_MESURES != "sql":
+        raise ValueError(f"STOCKAGE_MESURES inconnu: {settings.STOCKAGE_MESURES}")
+    return DepotMesuresSQL()
+
+
+# Instance partagée par le processus
+depot_mesures = _creer_depot()
@@ -0,0 +1,71 @@
+import logging
+import time
+from threading import Lock
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as TimeoutPool
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+FERME = "ferme"
+OUVERT = "ouvert"
+SEMI_OUVERT = "semi_ouvert"
+
+
+def est_panne_base(erreur: Exception) -> bool:
+    """Vrai si l'erreur indique une base injoignable (et non une requête invalide)."""
+    if isinstance(erreur, (OperationalError, InterfaceError, TimeoutPool)):
+        return True
+    return isinstance(erreur, DBAPIError) and erreur.connection_invalidated
+
+
+class Disjoncteur:
+    """
+    Disjoncteur (circuit breaker) devant la base de données.
+
+    Après `seuil_echecs` pannes consécutives, il s'ouvre : les appelants
+    n'essaient plus la base pendant `delai_secondes`. Il passe ensuite en
+    semi-ouvert et laisse passer un seul essai : un succès le referme, un
+    échec le rouvre pour un nouveau délai.
+    """
+
+    def __init__(self, seuil_echecs: int, delai_secondes: float):
+        self.seuil_echecs = seuil_echecs
+        self.delai = delai_secondes
+        self.etat = FERME
+        self.echecs_consecutifs = 0
+        self.ouvertures = 0
+        self._reouverture = 0.0
+        self._lock = Lock()
+
+    def autoriser(self) -> bool:
+        """Vrai si l'appelant peut utiliser la base ; il doit ensuite signaler succes() ou echec()."""
+        with self._lock:
+            if self.etat == FERME:
+                return True
+            if self.etat == OUVERT and time.monotonic() >= self._reouverture:
+                self.etat = SEMI_OUVERT
+                return True
+            return False
+
+    def succes(self):
+        with self._lock:
+            if self.etat != FERME:
+                logger.info("Disjoncteur refermé : base de données de nouveau disponible")
+            self.etat = FERME
+            self.echecs_consecutifs = 0
+
+    def echec(self):
+        with self._lock:
+            self.echecs_consecutifs += 1
+            if self.etat == SEMI_OUVERT or (self.etat == FERME and self.echecs_consecutifs >= self.seuil_echecs):
+                if self.etat == FERME:
+                    logger.warning("Disjoncteur ouvert : base de données indisponible")
+                    self.ouvertures += 1
+                self.etat = OUVERT
+                self._reouverture = time.monotonic() + self.delai
+
+
+# Instance partagée par le processus
+disjoncteur_base = Disjoncteur(settings.DISJONCTEUR_SEUIL_ECHECS, settings.DISJONCTEUR_DELAI_SECONDES)
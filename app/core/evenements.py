@@ -0,0 +1,29 @@
+from collections import defaultdict
+from typing import Callable
+import logging
+
+logger = logging.getLogger("uvicorn.error")
+
+# Événements publiés par l'API
+BORNES_MODIFIEES = "bornes_modifiees"  # ids: liste des id_borne dont la configuration a changé
+ALERTES_MODIFIEES = "alertes_modifiees"  # ids: liste des id_borne dont les alertes ont été créées ou résolues
+
+_abonnes = defaultdict(list)
+
+
+def abonner(evenement: str, callback: Callable):
+    """Enregistre une fonction appelée à chaque publication de l'événement."""
+    _abonnes[evenement].append(callback)
+
+
+def publier(evenement: str, **donnees):
+    """
+    Notifie les abonnés (caches en mémoire du processus) d'un événement.
+
+    Une erreur dans un abonné est journalisée sans interrompre la requête.
+    """
+    for callback in _abonnes[evenement]:
+        try:
+            callback(**donnees)
+        except Exception as e:
+            logger.error(f"Erreur dans l'abonné {callback.__name__} à '{evenement}': {str(e)}")
@@ -0,0 +1,115 @@
+from collections import namedtuple
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app import models
+from app.core.config import settings
+
+AUCUN = models.FiltreMesuresEnum.AUCUN
+MEDIANE = models.FiltreMesuresEnum.MEDIANE
+REBOND = models.FiltreMesuresEnum.REBOND
+
+FENETRE_MAX = 15
+
+# Niveaux sur lesquels les alertes sont décidées (mêmes attributs qu'une mesure)
+MesureFiltree = namedtuple("MesureFiltree", "niveau_gel niveau_batterie")
+
+
+class EtatFiltre:
+    """
+    Dernières mesures d'une borne, en deux anneaux d'octets (niveaux 0-100).
+
+    Quelques dizaines d'octets par borne, quel que soit le nombre de bornes suivies.
+    """
+
+    __slots__ = ("mode", "fenetre", "gel", "batterie", "nb", "position")
+
+    def __init__(self, mode: models.FiltreMesuresEnum, fenetre: int):
+        self.mode = mode
+        self.fenetre = fenetre
+        self.gel = bytearray(fenetre)
+        self.batterie = bytearray(fenetre)
+        self.nb = 0
+        self.position = 0
+
+    def ajouter(self, niveau_gel: int, niveau_batterie: int):
+        self.gel[self.position] = niveau_gel
+        self.batterie[self.position] = niveau_batterie
+        self.position = (self.position + 1) % self.fenetre
+        self.nb = min(self.nb + 1, self.fenetre)
+
+    def _filtrer(self, anneau: bytearray) -> int:
+        valeurs = anneau[:self.nb] if self.nb < self.fenetre else anneau
+        if self.mode == REBOND:
+            # Sous le seuil seulement si les k dernières mesures le sont toutes
+            return max(valeurs)
+        return sorted(valeurs)[(len(valeurs) - 1) // 2]  # Médiane basse : reste une mesure réelle
+
+    def valeur(self) -> MesureFiltree:
+        return MesureFiltree(self._filtrer(self.gel), self._filtrer(self.batterie))
+
+
+def parametres(borne: models.Borne) -> Tuple[models.FiltreMesuresEnum, int]:
+    """Filtre de la borne, sinon celui de la configuration."""
+    mode = borne.filtre_mesures or models.FiltreMesuresEnum(settings.FILTRE_MESURES_DEFAUT)
+    fenetre = borne.filtre_fenetre or settings.FILTRE_FENETRE_DEFAUT
+    return mode, max(1, min(fenetre, FENETRE_MAX))
+
+
+class FiltreMesures:
+    """
+    Étape de filtrage du bruit des capteurs dans l'ingestion.
+
+    La mesure brute est enregistrée telle quelle ; seules les alertes sont
+    décidées sur la valeur filtrée (médiane des k dernières mesures, ou
+    maximum des k dernières pour n'alerter qu'après k dépassements consécutifs).
+
+    L'état de chaque borne est gardé en mémoire. Au premier passage (démarrage,
+    changement de réglage, relu sur la borne à chaque mesure), il est rechargé
+    depuis les dernières mesures en base.
+    Partagé par les threads de l'ingestion.
+    """
+
+    def __init__(self):
+        self._etats: Dict[int, EtatFiltre] = {}
+        self._lock = Lock()
+
+    def filtrer(
+        self,
+        borne: models.Borne,
+        niveau_gel: int,
+        niveau_batterie: int,
+        charger: Optional[Callable[[int], List[dict]]] = None
+    ) -> MesureFiltree:
+        """
+        Ajoute la mesure à l'état de la borne et retourne les niveaux filtrés.
+
+        `charger(k)` retourne les k dernières mesures enregistrées, plus récente
+        en premier, mesure courante comprise ; sans `charger`, l'état démarre vide.
+        """
+        mode, fenetre = parametres(borne)
+        if mode == AUCUN:
+            with self._lock:
+                self._etats.pop(borne.id_borne, None)
+            return MesureFiltree(niveau_gel, niveau_batterie)
+
+        with self._lock:
+            etat = self._etats.get(borne.id_borne)
+            if etat is not None and (etat.mode, etat.fenetre) == (mode, fenetre):
+                etat.ajouter(niveau_gel, niveau_batterie)
+                return etat.valeur()
+
+        # Lecture en base hors du verrou
+        etat = EtatFiltre(mode, fenetre)
+        historique = charger(fenetre) if charger else []
+        for mesure in reversed(historique):
+            etat.ajouter(mesure["niveau_gel"], mesure["niveau_batterie"])
+        if not historique:
+            etat.ajouter(niveau_gel, niveau_batterie)
+        with self._lock:
+            self._etats[borne.id_borne] = etat
+            return etat.valeur()
+
+
+# Instance partagée par le processus
+filtre_mesures = FiltreMesures()
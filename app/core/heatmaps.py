@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import sys
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.depot_mesures import depot_mesures
+from app.core.shards import carte_shards
+
+logger = logging.getLogger("uvicorn.error")
+
+# Une heatmap = 7 jours (lundi = 0) × 24 heures de compteurs uint32, soit 672 octets
+JOURS = 7
+HEURES = 24
+CRENEAUX = JOURS * HEURES
+COMPTEUR = np.dtype("<u4")
+
+FUSEAU = ZoneInfo(settings.HEATMAP_FUSEAU)
+
+Deltas = Dict[int, Tuple[np.ndarray, np.ndarray]]
+
+
+def creneau(horodatage: datetime) -> int:
+    """Créneau (jour × 24 + heure) d'un horodatage UTC naïf, dans le fuseau des heatmaps."""
+    local = horodatage.replace(tzinfo=timezone.utc).astimezone(FUSEAU)
+    return local.weekday() * HEURES + local.hour
+
+
+def vide() -> np.ndarray:
+    return np.zeros(CRENEAUX, dtype=COMPTEUR)
+
+
+def en_grille(compteurs: np.ndarray) -> List[List[int]]:
+    """Tableau de 168 compteurs vers la grille 7 × 24 (lignes = jours)."""
+    return compteurs.reshape(JOURS, HEURES).tolist()
+
+
+class AccumulateurHeatmaps:
+    """
+    Compteurs des mesures reçues depuis le dernier enregistrement en base.
+
+    L'ingestion n'ajoute que deux incréments en mémoire ; la tâche de fond
+    reporte l'ensemble en base en une transaction toutes les
+    HEATMAP_ENREGISTREMENT_SECONDES. Un arrêt brutal perd au plus ce
+    délai de compteurs (cf. `reconstruire`). Partagé par les threads de l'ingestion.
+    """
+
+    def __init__(self):
+        self._deltas: Deltas = {}
+        self._lock = Lock()
+
+    def noter(self, id_borne: int, horodatage: datetime, gel_consomme: int = 0):
+        """Compte une utilisation de la borne et le gel consommé depuis la mesure précédente."""
+        i = creneau(horodatage)
+        with self._lock:
+            if id_borne not in self._deltas:
+                self._deltas[id_borne] = (vide(), vide())
+            utilisations, gel = self._deltas[id_borne]
+            utilisations[i] += 1
+            gel[i] += gel_consomme
+
+    def prendre(self) -> Deltas:
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+        return deltas
+
+    def remettre(self, deltas: Deltas):
+        """Réintègre des compteurs dont l'enregistrement a échoué."""
+        with self._lock:
+            for id_borne, (utilisations, gel) in deltas.items():
+                if id_borne in self._deltas:
+                    self._deltas[id_borne][0][:] += utilisations
+                    self._deltas[id_borne][1][:] += gel
+                else:
+                    self._deltas[id_borne] = (utilisations, gel)
+
+    @property
+    def en_attente(self) -> int:
+        return len(self._deltas)
+
+
+def consommation(gel_precedent, gel: int) -> int:
+    """Gel consommé entre deux mesures consécutives (un remplissage ne compte pas)."""
+    return max(0, gel_precedent - gel) if gel_precedent is not None else 0
+
+
+def enregistrer(db: Session, deltas: Deltas) -> int:
+    """Ajoute les compteurs aux heatmaps en base, lignes verrouillées, en une transaction."""
+    if not deltas:
+        return 0
+    ids = sorted(deltas)
+    existantes = {
+        heatmap.id_borne: heatmap
+        for heatmap in db.scalars(
+            select(models.HeatmapBorne).where(models.HeatmapBorne.id_borne.in_(ids)).with_for_update()
+        )
+    }
+    for id_borne in ids:
+        utilisations, gel = deltas[id_borne]
+        heatmap = existantes.get(id_borne)
+        if heatmap is None:
+            db.add(models.HeatmapBorne(
+                id_borne=id_borne, utilisations=utilisations.tobytes(), gel_consomme=gel.tobytes()
+            ))
+        else:
+            heatmap.utilisations = (np.frombuffer(heatmap.utilisations, dtype=COMPTEUR) + utilisations).tobytes()
+            heatmap.gel_consomme = (np.frombuffer(heatmap.gel_consomme, dtype=COMPTEUR) + gel).tobytes()
+    db.commit()
+    return len(ids)
+
+
+def lire(db: Session, ids_bornes: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Heatmaps des bornes, en deux matrices (nb bornes avec heatmap × 168).
+
+    Une ligne de taille fixe par borne : le coût ne dépend pas de l'historique.
+    """
+    lignes = db.execute(
+        select(models.HeatmapBorne.utilisations, models.HeatmapBorne.gel_consomme)
+        .where(models.HeatmapBorne.id_borne.in_(ids_bornes))
+    ).all()
+    utilisations = np.frombuffer(b"".join(ligne.utilisations for ligne in lignes), dtype=COMPTEUR)
+    gel = np.frombuffer(b"".join(ligne.gel_consomme for ligne in lignes), dtype=COMPTEUR)
+    return utilisations.reshape(-1, CRENEAUX), gel.reshape(-1, CRENEAUX)
+
+
+def cumuler(db: Session, ids_bornes: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Somme des heatmaps des bornes (compteurs sur 64 bits)."""
+    utilisations, gel = lire(db, ids_bornes)
+    return utilisations.sum(axis=0, dtype=np.uint64), gel.sum(axis=0, dtype=np.uint64)
+
+
+def calculer(mesures: Iterable[Tuple[datetime, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Heatmap d'une borne depuis son historique (horodatage, niveau_gel) trié par date."""
+    utilisations, gel = vide(), vide()
+    precedent = None
+    for horodatage, niveau_gel in mesures:
+        i = creneau(horodatage)
+        utilisations[i] += 1
+        gel[i] += consommation(precedent, niveau_gel)
+        precedent = niveau_gel
+    return utilisations, gel
+
+
+def reconstruire(db: Session, id_borne: int, mesures: Iterable[Tuple[datetime, int]]):
+    """Remplace la heatmap d'une borne par celle recalculée depuis son historique (pas de commit)."""
+    utilisations, gel = calculer(mesures)
+    heatmap = db.get(models.HeatmapBorne, id_borne, with_for_update=True)
+    if heatmap is None:
+        db.add(models.HeatmapBorne(id_borne=id_borne, utilisations=utilisations.tobytes(), gel_consomme=gel.tobytes()))
+    else:
+        heatmap.utilisations = utilisations.tobytes()
+        heatmap.gel_consomme = gel.tobytes()
+
+
+def reconstruire_borne(db: Session, id_borne: int) -> int:
+    """Recalcule la heatmap d'une borne depuis tout son historique (pas de commit) ; retourne le nombre de mesures."""
+    with carte_shards.session_borne(db, id_borne) as db_mesures:
+        # Plus récentes en premier : remises dans l'ordre chronologique
+        mesures = depot_mesures.dernieres(db_mesures, id_borne, sys.maxsize)
+    reconstruire(db, id_borne, ((m["horodatage"], m["niveau_gel"]) for m in reversed(mesures)))
+    return len(mesures)
+
+
+def _enregistrer(session_factory) -> int:
+    deltas = accumulateur_heatmaps.prendre()
+    if not deltas:
+        return 0
+    try:
+        db = session_factory()
+    except Exception:
+        accumulateur_heatmaps.remettre(deltas)
+        raise
+    try:
+        return enregistrer(db, deltas)
+    except Exception:
+        db.rollback()
+        accumulateur_heatmaps.remettre(deltas)
+        raise
+    finally:
+        db.close()
+
+
+async def boucle_heatmaps(session_factory):
+    """Tâche de fond : report périodique des compteurs en base, et une dernière fois à l'arrêt."""
+    try:
+        while True:
+            await asyncio.sleep(settings.HEATMAP_ENREGISTREMENT_SECONDES)
+            try:
+                await asyncio.to_thread(_enregistrer, session_factory)
+            except Exception as e:
+                logger.error(f"Erreur d'enregistrement des heatmaps: {str(e)}")
+    except asyncio.CancelledError:
+        _enregistrer(session_factory)
+        raise
+
+
+# Instance partagée par le processus
+accumulateur_heatmaps = AccumulateurHeatmaps()
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import math
+import time
+from calendar import timegm
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional
+
+from sqlalchemy import insert, select
+
+from app import models
+from app.core.alerts import resoudre_alertes
+from app.core.config import settings
+from app.core.evenements import ALERTES_MODIFIEES, publier
+from app.core.journal import journaliser
+from app.core.outbox import notifier_nouvelles
+from app.core.depot_mesures import depot_mesures
+from app.core.shards import carte_shards
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SuiviHorsLigne:
+    """
+    Roue temporelle (timing wheel) des échéances de silence des bornes.
+
+    Chaque borne est rangée dans la case de sa date limite (dernière mesure
+    + délai). Une mesure déplace la borne de case en O(1) ; un tic ne
+    parcourt que les cases écoulées, donc un coût proportionnel aux
+    expirations et non à la taille de la flotte.
+
+    La roue est propre au processus et ne voit que les mesures qu'il reçoit :
+    avec plusieurs workers, la dernière mesure en base est relue avant de
+    créer une alerte, et les bornes revenues auprès d'un autre worker sont
+    détectées à chaque tic (`resoudre_revenues`).
+    """
+
+    def __init__(self, delai_secondes: float, tic_secondes: float):
+        self.delai = delai_secondes
+        self.tic = tic_secondes
+        self.nb_cases = math.ceil(delai_secondes / tic_secondes) + 1
+        self._cases = [set() for _ in range(self.nb_cases)]
+        self._echeances = {}  # id_borne -> (date limite en secondes epoch, index de case)
+        self._hors_ligne = set()
+        self._dernier_tic = int(time.time() // tic_secondes)
+        self._lock = Lock()
+
+    def _index_case(self, echeance: float) -> int:
+        # Case du premier tic postérieur à l'échéance ; une échéance déjà
+        # dépassée (reconstruction) est traitée au prochain tic
+        tic = max(math.ceil(echeance / self.tic), self._dernier_tic + 1)
+        return tic % self.nb_cases
+
+    def vu(self, id_borne: int, horodatage: float) -> bool:
+        """
+        Enregistre une mesure de la borne (horodatage en secondes epoch).
+
+        Retourne True si la borne était signalée hors ligne et revient.
+        """
+        echeance = horodatage + self.delai
+        with self._lock:
+            ancienne = self._echeances.get(id_borne)
+            if ancienne is not None:
+                if echeance <= ancienne[0]:
+                    return False
+                self._cases[ancienne[1]].discard(id_borne)
+            index = self._index_case(echeance)
+            self._echeances[id_borne] = (echeance, index)
+            self._cases[index].add(id_borne)
+            if id_borne in self._hors_ligne:
+                self._hors_ligne.discard(id_borne)
+                return True
+            return False
+
+    def est_hors_ligne(self, id_borne: int) -> bool:
+        """Vrai si la borne est signalée hors ligne par ce processus."""
+        with self._lock:
+            return id_borne in self._hors_ligne
+
+    def reprendre(self, ids_bornes: List[int], echeance: float):
+        """
+        Remet dans la roue des bornes expirées dont l'alerte n'a pas été créée.
+
+        Elles expirent de nouveau au premier tic après `echeance` ; une borne
+        revenue entre-temps garde sa nouvelle échéance.
+        """
+        with self._lock:
+            for id_borne in ids_bornes:
+                if id_borne in self._echeances:
+                    continue
+                self._hors_ligne.discard(id_borne)
+                index = self._index_case(echeance)
+                self._echeances[id_borne] = (echeance, index)
+                self._cases[index].add(id_borne)
+
+    def oublier(self, id_borne: int):
+        """Retire une borne du suivi (ex: borne désactivée)."""
+        with self._lock:
+            ancienne = self._echeances.pop(id_borne, None)
+            if ancienne is not None:
+                self._cases[ancienne[1]].discard(id_borne)
+            self._hors_ligne.discard(id_borne)
+
+    def expirer(self, maintenant: float) -> List[int]:
+        """Retourne les bornes dont l'échéance est dépassée depuis le dernier tic."""
+        expirees = []
+        tic_courant = int(maintenant // self.tic)
+        with self._lock:
+            # Après une longue pause, un seul tour de roue suffit
+            premier = max(self._dernier_tic + 1, tic_courant - self.nb_cases + 1)
+            for tic in range(premier, tic_courant + 1):
+                case = self._cases[tic % self.nb_cases]
+                for id_borne in list(case):
+                    # La case peut contenir des échéances d'un tour de roue ultérieur
+                    if self._echeances[id_borne][0] <= maintenant:
+                        case.discard(id_borne)
+                        del self._echeances[id_borne]
+                        self._hors_ligne.add(id_borne)
+                        expirees.append(id_borne)
+            self._dernier_tic = tic_courant
+        return expirees
+
+
+def en_secondes_epoch(horodatage: datetime) -> float:
+    """Convertit un horodatage UTC naïf en secondes epoch."""
+    return timegm(horodatage.utctimetuple()) + horodatage.microsecond / 1_000_000
+
+
+def reconstruire(db) -> int:
+    """Recharge la roue au démarrage depuis la dernière mesure de chaque borne active."""
+    actives = set(db.scalars(select(models.Borne.id_borne).where(models.Borne.est_active.is_not(False))))
+
+    # Les mesures peuvent être hors de la base principale (shards, segments)
+    nb = 0
+    for id_borne, derniere in depot_mesures.dernieres_flotte().items():
+        if id_borne in actives:
+            suivi_hors_ligne.vu(id_borne, en_secondes_epoch(derniere.horodatage))
+            nb += 1
+    return nb
+
+
+def _derniere_mesure(db, id_borne: int) -> Optional[datetime]:
+    """Horodatage de la dernière mesure enregistrée de la borne, quel que soit le worker qui l'a reçue."""
+    with carte_shards.session_borne(db, id_borne) as session:
+        derniere = depot_mesures.precedente(session, id_borne)
+    return derniere[0] if derniere else None
+
+
+def encore_silencieuses(db, ids_bornes: List[int]) -> List[int]:
+    """
+    Bornes expirées dont la base n'a pas non plus de mesure récente.
+
+    Une borne qui a une mesure récente en base (reçue par un autre worker)
+    reprend sa place dans la roue au lieu d'être signalée.
+    """
+    limite = time.time() - suivi_hors_ligne.delai
+    silencieuses = []
+    for id_borne in ids_bornes:
+        derniere = _derniere_mesure(db, id_borne)
+        if derniere is not None and en_secondes_epoch(derniere) > limite:
+            suivi_hors_ligne.vu(id_borne, en_secondes_epoch(derniere))
+        else:
+            silencieuses.append(id_borne)
+    return silencieuses
+
+
+def creer_alertes_hors_ligne(db, ids_bornes: List[int]) -> int:
+    """Crée une alerte `hors_ligne` pour chaque borne silencieuse qui n'en a pas déjà une ouverte."""
+    deja_signalees = set(db.scalars(
+        select(models.Alerte.id_borne).where(
+            models.Alerte.id_borne.in_(ids_bornes),
+            models.Alerte.type_alerte == models.TypeAlerteEnum.HORS_LIGNE,
+            models.Alerte.statut.in_([models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE])
+        )
+    ))
+    a_creer = [id_borne for id_borne in ids_bornes if id_borne not in deja_signalees]
+    if not a_creer:
+        return 0
+
+    # niveau_valeur : durée de silence en minutes au moment de la détection
+    minutes = int(suivi_hors_ligne.delai // 60)
+    db.execute(insert(models.Alerte), [{
+        "id_borne": id_borne,
+        "type_alerte": models.TypeAlerteEnum.HORS_LIGNE,
+        "niveau_valeur": minutes,
+        "statut": models.StatutAlerteEnum.NOUVELLE,
+    } for id_borne in a_creer])
+    notifier_nouvelles(db, a_creer, models.TypeAlerteEnum.HORS_LIGNE)
+    journaliser(db, a_creer)
+    db.commit()
+    publier(ALERTES_MODIFIEES, ids=a_creer)
+    return len(a_creer)
+
+
+def resoudre_revenues(db) -> int:
+    """
+    Résout les alertes `hors_ligne` des bornes qui ont de nouveau une mesure récente en base.
+
+    Complète la roue : la borne a pu revenir auprès d'un autre worker que
+    celui qui l'a signalée. Ne porte que sur les bornes signalées.
+    """
+    signalees = set(db.scalars(
+        select(models.Alerte.id_borne).where(
+            models.Alerte.type_alerte == models.TypeAlerteEnum.HORS_LIGNE,
+            models.Alerte.statut.in_([models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE])
+        )
+    ))
+    limite = time.time() - suivi_hors_ligne.delai
+    revenues = []
+    for id_borne in sorted(signalees):
+        derniere = _derniere_mesure(db, id_borne)
+        if derniere is not None and en_secondes_epoch(derniere) > limite:
+            revenues.append((id_borne, en_secondes_epoch(derniere)))
+    if not revenues:
+        return 0
+
+    ids = [id_borne for id_borne, _ in revenues]
+    for id_borne in ids:
+        resoudre_alertes(db, borne_id=id_borne, types=[models.TypeAlerteEnum.HORS_LIGNE], tracer_interventions=False)
+    db.commit()
+    for id_borne, horodatage in revenues:
+        suivi_hors_ligne.vu(id_borne, horodatage)
+    publier(ALERTES_MODIFIEES, ids=ids)
+    return len(ids)
+
+
+def _verifier(session_factory) -> int:
+    maintenant = time.time()
+    expirees = suivi_hors_ligne.expirer(maintenant)
+    db = session_factory()
+    try:
+        resoudre_revenues(db)
+        if not expirees:
+            return 0
+        try:
+            silencieuses = encore_silencieuses(db, expirees)
+            return creer_alertes_hors_ligne(db, silencieuses) if silencieuses else 0
+        except Exception:
+            # Nouvel essai au prochain tic
+            suivi_hors_ligne.reprendre(expirees, maintenant)
+            raise
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def boucle_surveillance(session_factory):
+    """Tâche de fond : reconstruit la roue puis vérifie les échéances à chaque tic."""
+    db = session_factory()
+    try:
+        nb = await asyncio.to_thread(reconstruire, db)
+        logger.info(f"Suivi hors ligne : {nb} bornes chargées")
+    finally:
+        db.close()
+
+    while True:
+        await asyncio.sleep(suivi_hors_ligne.tic)
+        try:
+            nb = await asyncio.to_thread(_verifier, session_factory)
+            if nb:
+                logger.warning(f"{nb} borne(s) hors ligne détectée(s)")
+        except Exception as e:
+            logger.error(f"Erreur du suivi hors ligne: {str(e)}")
+
+
+# Instance partagée par le processus
+suivi_hors_ligne = SuiviHorsLigne(settings.HORS_LIGNE_DELAI_SECONDES, settings.HORS_LIGNE_TIC_SECONDES)
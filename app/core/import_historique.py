@@ -0,0 +1,486 @@
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.core import heatmaps
+from app.core.alerts import verifier_et_creer_alertes
+from app.core.config import settings
+from app.core.depot_mesures import depot_mesures
+from app.core.filtrage import filtre_mesures
+from app.core.journal import journaliser
+from app.core.shards import carte_shards
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger("uvicorn.error")
+
+# Formats d'entrée
+CSV = "csv"
+JSONL = "jsonl"  # Un objet JSON par ligne
+JSON = "json"  # Liste JSON, chargée en entier
+
+# Chargement des lots
+INSERT = "insert"  # INSERT multi-lignes (tous stockages et bases)
+LOAD_DATA = "load_data"  # LOAD DATA LOCAL INFILE (MySQL, stockage SQL)
+
+# Alertes sur l'historique importé
+AUCUNE = "aucune"
+ETAT_FINAL = "etat_final"  # Évaluées une fois par borne, sur sa dernière mesure
+
+COLONNES_REJETS = ["ligne", "motif", "donnees"]
+
+
+# --- Lecture et validation ---
+
+def _horodatage(valeur) -> datetime:
+    """ISO 8601 (avec ou sans fuseau, UTC par défaut) ou secondes Unix, vers UTC naïf à la seconde."""
+    if isinstance(valeur, (int, float)) or (isinstance(valeur, str) and valeur.replace(".", "", 1).isdigit()):
+        return datetime.fromtimestamp(float(valeur), timezone.utc).replace(tzinfo=None, microsecond=0)
+    if not isinstance(valeur, str):
+        raise ValueError("horodatage absent")
+    horodatage = datetime.fromisoformat(valeur.strip())
+    if horodatage.tzinfo is not None:
+        horodatage = horodatage.astimezone(timezone.utc).replace(tzinfo=None)
+    return horodatage.replace(microsecond=0)
+
+
+def _pourcentage(valeur, nom: str) -> int:
+    niveau = int(valeur)
+    if not 0 <= niveau <= 100:
+        raise ValueError(f"{nom} hors de 0-100")
+    return niveau
+
+
+def valider_ligne(brute: dict, bornes: Dict[str, Tuple[int, int]], limite_futur: datetime) -> dict:
+    """
+    Ligne d'entrée vers ligne de la table des mesures (ValueError avec le motif sinon).
+
+    Mêmes contrôles que `MesureCreate`, sans pydantic (coût par ligne), et
+    l'horodatage est obligatoire : c'est la date historique de la mesure.
+    """
+    borne = bornes.get(brute.get("uuid_esp"))
+    if borne is None:
+        raise ValueError(f"borne inconnue '{brute.get('uuid_esp')}'")
+    try:
+        horodatage = _horodatage(brute.get("horodatage"))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError("horodatage invalide")
+    if horodatage > limite_futur:
+        raise ValueError("horodatage dans le futur")
+    try:
+        niveau_gel = _pourcentage(brute.get("niveau_gel"), "niveau_gel")
+        niveau_batterie = _pourcentage(brute.get("niveau_batterie"), "niveau_batterie")
+        sequence = brute.get("sequence")
+        sequence = int(sequence) if sequence not in (None, "") else None
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e) if "hors de" in str(e) else "valeur numérique invalide")
+    if sequence is not None and sequence < 0:
+        raise ValueError("sequence négative")
+    return {
+        "id_borne": borne[0],
+        "niveau_gel": niveau_gel,
+        "niveau_batterie": niveau_batterie,
+        "horodatage": horodatage,
+        "sequence": sequence,
+    }
+
+
+def lire_lots(chemin: str, format_fichier: str, taille_lot: int, octet: int = 0, ligne: int = 0) -> Iterator[Tuple[List[Tuple[int, dict]], Optional[int], int]]:
+    """
+    Lit le fichier par lots de `taille_lot` lignes, sans le charger en entier (sauf liste JSON).
+
+    Produit (lignes numérotées, position en octets après le lot, numéro de la
+    dernière ligne lue). La reprise repart de `octet` (CSV, JSONL) ou saute
+    `ligne` lignes (liste JSON, pas de position en octets).
+    """
+    if format_fichier == JSON:
+        with open(chemin, "rb") as fichier:
+            donnees = json.load(fichier)
+        if isinstance(donnees, dict):
+            donnees = donnees.get("mesures", [])
+        for debut in range(ligne, len(donnees), taille_lot):
+            lot = [(numero + 1, brute) for numero, brute in enumerate(donnees[debut:debut + taille_lot], start=debut)]
+            yield lot, None, lot[-1][0]
+        return
+
+    with open(chemin, "rb") as fichier:
+        entetes = None
+        if format_fichier == CSV:
+            entetes = [nom.strip() for nom in next(csv.reader([fichier.readline().decode("utf-8-sig")]))]
+        if octet:
+            fichier.seek(octet)
+        lot = []
+        numero = ligne
+        for brut in iter(fichier.readline, b""):
+            numero += 1
+            texte = brut.decode("utf-8").strip()
+            if not texte:
+                continue
+            if format_fichier == CSV:
+                valeurs = next(csv.reader([texte]))
+                lot.append((numero, {nom: valeur.strip() for nom, valeur in zip(entetes, valeurs)}))
+            else:
+                try:
+                    lot.append((numero, json.loads(texte)))
+                except ValueError:
+                    lot.append((numero, {"_illisible": texte}))
+            if len(lot) >= taille_lot:
+                yield lot, fichier.tell(), numero
+                lot = []
+        if lot:
+            yield lot, fichier.tell(), numero
+
+
+# --- Travail des voies (processus fils) ---
+
+def sans_echo():
+    """Coupe l'affichage des requêtes SQL : à chaque lot, il coûterait plus que l'insertion."""
+    engine.echo = False
+
+# Moteurs LOAD DATA du processus, par shard (connexions avec local_infile)
+_moteurs_load_data: Dict[str, object] = {}
+
+
+def _session_load_data(nom_shard: str) -> Session:
+    if nom_shard not in _moteurs_load_data:
+        _moteurs_load_data[nom_shard] = create_engine(carte_shards.url(nom_shard), connect_args={"local_infile": True})
+    return sessionmaker(bind=_moteurs_load_data[nom_shard])()
+
+
+def _load_data(session: Session, lignes: List[dict]) -> int:
+    """Charge le lot par LOAD DATA LOCAL INFILE ; IGNORE écarte les mesures déjà enregistrées (séquence et horodatage)."""
+    descripteur, chemin = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(descripteur, "w", newline="") as fichier:
+            ecrivain = csv.writer(fichier, lineterminator="\n")
+            for ligne in lignes:
+                ecrivain.writerow([
+                    ligne["id_borne"], ligne["niveau_gel"], ligne["niveau_batterie"],
+                    ligne["horodatage"].isoformat(sep=" "), "" if ligne["sequence"] is None else ligne["sequence"]
+                ])
+        return session.connection().exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE '{chemin}' IGNORE INTO TABLE {models.Mesure.__tablename__} "
+            "FIELDS TERMINATED BY ',' LINES TERMINATED BY '\\n' "
+            "(id_borne, niveau_gel, niveau_batterie, horodatage, @sequence) "
+            "SET sequence = NULLIF(@sequence, '')"
+        ).rowcount
+    finally:
+        os.remove(chemin)
+
+
+def inserer_lot(nom_shard: str, lignes: List[dict], methode: str) -> int:
+    """Enregistre un lot de mesures dans un shard ; retourne le nombre de mesures nouvelles."""
+    if methode == LOAD_DATA:
+        session = _session_load_data(nom_shard)
+        try:
+            nb = _load_data(session, lignes)
+            session.commit()
+            return nb
+        finally:
+            session.close()
+
+    db = SessionLocal()
+    session = carte_shards.ouvrir(db, nom_shard)
+    try:
+        nb = len(depot_mesures.ajouter_lot(session, lignes))
+        session.commit()
+        return nb
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        carte_shards.fermer(db, session)
+        db.close()
+
+
+def reconstruire_heatmaps(ids_bornes: List[int]) -> int:
+    """Recalcule les heatmaps de ces bornes depuis leur historique complet."""
+    db = SessionLocal()
+    try:
+        for id_borne in ids_bornes:
+            heatmaps.reconstruire_borne(db, id_borne)
+            db.commit()
+        return len(ids_bornes)
+    finally:
+        db.close()
+
+
+# --- Orchestration ---
+
+class ImportHistorique:
+    """
+    Import hors ligne d'un historique de mesures (reprise d'un autre système).
+
+    Le fichier est lu et validé par lots dans le processus principal, avec
+    une table uuid_esp -> borne chargée en une requête. Les lignes valides
+    sont réparties sur `voies` processus : une borne est toujours traitée
+    par la même voie (ses lots s'enregistrent dans l'ordre, sans conflit
+    entre processus), et chaque tâche ne touche qu'un shard. Au plus deux
+    tâches par voie sont en attente : la lecture suit le débit de la base.
+
+    Aucune alerte n'est créée pendant l'import ; en mode ETAT_FINAL, elles
+    sont évaluées une fois par borne sur sa dernière mesure, comme à
+    l'ingestion. Les heatmaps des bornes importées sont ensuite recalculées.
+
+    Le point de reprise (JSON, écrit atomiquement) retient la position après
+    le dernier lot entièrement enregistré, et les parties déjà enregistrées
+    des lots suivants : un import interrompu reprend sans doublon, sauf
+    arrêt entre la validation d'une tâche et l'écriture du point de reprise
+    (les mesures avec séquence ne sont de toute façon jamais dupliquées).
+    """
+
+    def __init__(
+        self,
+        chemin: str,
+        format_fichier: str,
+        voies: int = 4,
+        taille_lot: int = 5000,
+        methode: str = INSERT,
+        alertes: str = AUCUNE,
+        rollups: bool = True,
+        chemin_reprise: Optional[str] = None,
+        chemin_rejets: Optional[str] = None,
+    ):
+        if methode == LOAD_DATA and (settings.STOCKAGE_MESURES != "sql" or not all(
+            carte_shards.url(nom).get_backend_name() == "mysql" for nom in carte_shards.noms
+        )):
+            raise ValueError("LOAD DATA n'est possible qu'avec le stockage SQL sur MySQL")
+        self.chemin = os.path.abspath(chemin)
+        self.format = format_fichier
+        self.voies = voies
+        self.taille_lot = taille_lot
+        self.methode = methode
+        self.alertes = alertes
+        self.rollups = rollups
+        self.chemin_reprise = chemin_reprise or self.chemin + ".reprise.json"
+        self.chemin_rejets = chemin_rejets or self.chemin + ".rejets.csv"
+        self.reprise = self._nouvelle_reprise()
+
+    # Point de reprise
+
+    def _nouvelle_reprise(self) -> dict:
+        return {
+            "fichier": self.chemin,
+            "taille": os.path.getsize(self.chemin),
+            "format": self.format,
+            "taille_lot": self.taille_lot,
+            "etape": "import",
+            "lot": 0,
+            "octet": 0,
+            "ligne": 0,
+            "parties_faites": {},
+            "bornes": {},
+            "alertes_evaluees": [],
+            "compteurs": {"lues": 0, "valides": 0, "nouvelles": 0, "rejetees": 0},
+        }
+
+    def charger_reprise(self) -> bool:
+        """Reprend l'import précédent du même fichier s'il existe ; faux sinon."""
+        if not os.path.exists(self.chemin_reprise):
+            return False
+        with open(self.chemin_reprise, encoding="utf-8") as fichier:
+            reprise = json.load(fichier)
+        attendu = self._nouvelle_reprise()
+        for cle in ("fichier", "taille", "format", "taille_lot"):
+            if reprise.get(cle) != attendu[cle]:
+                raise ValueError(
+                    f"Point de reprise {self.chemin_reprise} d'un autre import ({cle} ne correspond pas) : "
+                    "le supprimer ou reprendre avec les mêmes options"
+                )
+        self.reprise = reprise
+        return True
+
+    def _ecrire_reprise(self):
+        temporaire = self.chemin_reprise + ".tmp"
+        with open(temporaire, "w", encoding="utf-8") as fichier:
+            json.dump(self.reprise, fichier)
+        os.replace(temporaire, self.chemin_reprise)
+
+    # Import
+
+    def _table_bornes(self) -> Dict[str, Tuple[int, int]]:
+        db = SessionLocal()
+        try:
+            return {
+                uuid_esp: (id_borne, id_site)
+                for uuid_esp, id_borne, id_site in db.execute(
+                    select(models.Borne.uuid_esp, models.Borne.id_borne, models.Borne.id_site)
+                )
+            }
+        finally:
+            db.close()
+
+    def _repartir(self, lot, bornes, limite_futur, rejets) -> Tuple[Dict[Tuple[int, str], List[dict]], int]:
+        """
+        Valide un lot et le répartit par (voie, shard).
+
+        Les lignes refusées vont au fichier des rejets ; retourne aussi leur nombre.
+        """
+        parties: Dict[Tuple[int, str], List[dict]] = {}
+        sites = {id_borne: id_site for id_borne, id_site in bornes.values()}
+        dernieres = self.reprise["bornes"]
+        nb_rejetees = 0
+        for numero, brute in lot:
+            try:
+                if not isinstance(brute, dict) or "_illisible" in brute:
+                    raise ValueError("ligne illisible")
+                ligne = valider_ligne(brute, bornes, limite_futur)
+            except ValueError as e:
+                rejets.writerow([numero, str(e), json.dumps(brute, default=str)[:500]])
+                nb_rejetees += 1
+                continue
+            id_borne = ligne["id_borne"]
+            cle = (id_borne % self.voies, carte_shards.shard_du_site(sites[id_borne]))
+            parties.setdefault(cle, []).append(ligne)
+            horodatage = ligne["horodatage"].isoformat()
+            if dernieres.get(str(id_borne), "") < horodatage:
+                dernieres[str(id_borne)] = horodatage
+        return parties, nb_rejetees
+
+    def _importer(self, executeurs: List[ProcessPoolExecutor], afficher):
+        bornes = self._table_bornes()
+        limite_futur = datetime.utcnow() + timedelta(seconds=settings.DECALAGE_HORLOGE_MAX_SECONDES)
+        reprise = self.reprise
+        compteurs = reprise["compteurs"]
+
+        # Lots lus mais pas encore entièrement enregistrés : parties restantes, position de fin, compteurs
+        en_cours: Dict[int, dict] = {}
+        futurs = {}
+
+        def avancer():
+            # Position de reprise : après le dernier lot dont toutes les parties sont enregistrées
+            while reprise["lot"] in en_cours and not en_cours[reprise["lot"]]["restantes"]:
+                termine = en_cours.pop(reprise["lot"])
+                reprise["parties_faites"].pop(str(reprise["lot"]), None)
+                reprise["lot"] += 1
+                reprise["octet"], reprise["ligne"] = termine["octet"], termine["ligne"]
+                reprise["octet_rejets"] = termine["octet_rejets"]
+                compteurs["lues"] += termine["lues"]
+                compteurs["valides"] += termine["lues"] - termine["rejetees"]
+                compteurs["rejetees"] += termine["rejetees"]
+            self._ecrire_reprise()
+
+        def recolter(attendre_tout: bool):
+            while futurs and (attendre_tout or len(futurs) >= 2 * self.voies):
+                faits, _ = wait(list(futurs), return_when=FIRST_COMPLETED)
+                for futur in faits:
+                    index, partie = futurs.pop(futur)
+                    compteurs["nouvelles"] += futur.result()
+                    en_cours[index]["restantes"].discard(partie)
+                    reprise["parties_faites"].setdefault(str(index), []).append(list(partie))
+                avancer()
+                afficher(compteurs)
+
+        # Rejets des lots relus après une reprise retirés : ils seront écrits à nouveau
+        nouveau = "octet_rejets" not in reprise
+        with open(self.chemin_rejets, "w" if nouveau else "r+", newline="", encoding="utf-8") as fichier_rejets:
+            rejets = csv.writer(fichier_rejets)
+            if nouveau:
+                rejets.writerow(COLONNES_REJETS)
+                fichier_rejets.flush()
+                reprise["octet_rejets"] = fichier_rejets.tell()
+            else:
+                fichier_rejets.seek(reprise["octet_rejets"])
+                fichier_rejets.truncate()
+            lots = lire_lots(self.chemin, self.format, self.taille_lot, reprise["octet"], reprise["ligne"])
+            for index, (lot, octet, ligne) in enumerate(lots, start=reprise["lot"]):
+                parties, nb_rejetees = self._repartir(lot, bornes, limite_futur, rejets)
+                fichier_rejets.flush()
+                deja_faites = {tuple(partie) for partie in reprise["parties_faites"].get(str(index), [])}
+                restantes = {partie for partie in parties if partie not in deja_faites}
+                en_cours[index] = {
+                    "restantes": set(restantes), "octet": octet, "ligne": ligne,
+                    "octet_rejets": fichier_rejets.tell(), "lues": len(lot), "rejetees": nb_rejetees,
+                }
+                for partie in restantes:
+                    voie, nom_shard = partie
+                    futur = executeurs[voie].submit(inserer_lot, nom_shard, parties[partie], self.methode)
+                    futurs[futur] = (index, partie)
+                if not restantes:
+                    avancer()
+                recolter(attendre_tout=False)
+            recolter(attendre_tout=True)
+            avancer()
+
+    # Finalisation
+
+    def _finaliser(self, executeurs: List[ProcessPoolExecutor], afficher):
+        reprise = self.reprise
+        ids_bornes = sorted(int(id_borne) for id_borne in reprise["bornes"])
+
+        if self.rollups and reprise["etape"] == "import":
+            # Heatmaps recalculées dans les voies, une borne toujours dans la même
+            par_voie: Dict[int, List[int]] = {}
+            for id_borne in ids_bornes:
+                par_voie.setdefault(id_borne % self.voies, []).append(id_borne)
+            for futur in [executeurs[voie].submit(reconstruire_heatmaps, ids) for voie, ids in par_voie.items()]:
+                futur.result()
+            afficher({"heatmaps_reconstruites": len(ids_bornes)})
+
+        db = SessionLocal()
+        try:
+            if reprise["etape"] == "import":
+                # Les clients en synchronisation incrémentale relisent les bornes importées
+                journaliser(db, ids_bornes)
+                db.commit()
+                reprise["etape"] = "alertes"
+                self._ecrire_reprise()
+
+            if self.alertes == ETAT_FINAL:
+                self._evaluer_alertes(db, ids_bornes, afficher)
+        finally:
+            db.close()
+        reprise["etape"] = "termine"
+        self._ecrire_reprise()
+
+    def _evaluer_alertes(self, db: Session, ids_bornes: List[int], afficher):
+        """Évalue les alertes des bornes dont la mesure la plus récente vient de l'import."""
+        reprise = self.reprise
+        evaluees: Set[int] = set(reprise["alertes_evaluees"])
+        creees = 0
+        for id_borne in ids_bornes:
+            if id_borne in evaluees:
+                continue
+            borne = db.get(models.Borne, id_borne)
+            with carte_shards.session_borne(db, id_borne) as db_mesures:
+                dernieres = depot_mesures.dernieres(db_mesures, id_borne, 1)
+                if dernieres and dernieres[0]["horodatage"].isoformat() <= reprise["bornes"][str(id_borne)]:
+                    filtree = filtre_mesures.filtrer(
+                        borne, dernieres[0]["niveau_gel"], dernieres[0]["niveau_batterie"],
+                        lambda nb: depot_mesures.dernieres(db_mesures, id_borne, nb)
+                    )
+                    creees += len(verifier_et_creer_alertes(db, borne, filtree))
+            evaluees.add(id_borne)
+            if len(evaluees) % 200 == 0:
+                reprise["alertes_evaluees"] = sorted(evaluees)
+                self._ecrire_reprise()
+        reprise["alertes_evaluees"] = sorted(evaluees)
+        afficher({"alertes_creees": creees})
+
+    def executer(self, afficher=lambda etat: None) -> dict:
+        """Importe le fichier (ou termine l'import repris) ; retourne les compteurs."""
+        if self.reprise["etape"] == "termine":
+            return self.reprise["compteurs"]
+        # Processus neufs (spawn) : aucune connexion héritée du processus principal
+        contexte = multiprocessing.get_context("spawn")
+        sans_echo()
+        executeurs = [
+            ProcessPoolExecutor(max_workers=1, mp_context=contexte, initializer=sans_echo) for _ in range(self.voies)
+        ]
+        try:
+            if self.reprise["etape"] == "import":
+                self._importer(executeurs, afficher)
+            self._finaliser(executeurs, afficher)
+        finally:
+            for executeur in executeurs:
+                executeur.shutdown(cancel_futures=True)
+        return self.reprise["compteurs"]
@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import functools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from app.core.config import settings
+from app.core.profilage import profiler_appel
+
+
+class Saturation(Exception):
+    """Aucune place libérée pour la classe de charge dans le délai d'attente maximal."""
+
+
+class ClasseCharge:
+    """
+    Classe de routes isolée des autres : limite de concurrence, pool de
+    threads et pool de connexions (cf. app/database.py) qui lui sont propres.
+
+    Les statistiques d'attente (file d'admission puis pool de threads) sont
+    suivies par une moyenne glissante et un maximum.
+    """
+
+    def __init__(self, nom: str, limite: int, prioritaire: bool, attente_max_secondes: float):
+        self.nom = nom
+        self.limite = limite
+        self.prioritaire = prioritaire
+        self.attente_max_autorisee = attente_max_secondes
+        self.en_cours = 0
+        self.admises = 0
+        self.rejetees = 0
+        self.attente_moyenne = 0.0
+        self.attente_max = 0.0
+        self.attente_pool_moyenne = 0.0
+        self._file = deque()
+        self._pool = ThreadPoolExecutor(max_workers=limite, thread_name_prefix=f"charge-{nom}")
+
+    def _noter_attente(self, secondes: float, alpha: float = 0.1):
+        self.attente_moyenne += alpha * (secondes - self.attente_moyenne)
+        self.attente_max = max(self.attente_max, secondes)
+
+    async def executer(self, fonction, *args, **kwargs):
+        """Exécute une fonction bloquante dans le pool de threads de la classe (contexte et profilage conservés)."""
+        contexte = contextvars.copy_context()
+        soumission = time.perf_counter()
+
+        def appel():
+            self.attente_pool_moyenne += 0.1 * (time.perf_counter() - soumission - self.attente_pool_moyenne)
+            return contexte.run(profiler_appel, fonction, *args, **kwargs)
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, appel)
+
+    def etat(self) -> dict:
+        return {
+            "classe": self.nom,
+            "limite": self.limite,
+            "prioritaire": self.prioritaire,
+            "en_cours": self.en_cours,
+            "en_attente": len(self._file),
+            "admises": self.admises,
+            "rejetees": self.rejetees,
+            "attente_moyenne_ms": round(self.attente_moyenne * 1000, 2),
+            "attente_max_ms": round(self.attente_max * 1000, 2),
+            "attente_pool_moyenne_ms": round(self.attente_pool_moyenne * 1000, 2),
+        }
+
+
+class ControleAdmission:
+    """
+    Admission prioritaire des requêtes dans leurs classes de charge.
+
+    Chaque classe a sa propre limite ; au-delà, les requêtes attendent dans
+    sa file. La capacité globale garde `reserve` places que seules les classes
+    prioritaires (l'ingestion) peuvent occuper, et les places libérées sont
+    attribuées d'abord aux files prioritaires. Une requête qui attend plus
+    que le délai de sa classe est refusée (Saturation).
+
+    Utilisé uniquement depuis la boucle asyncio : pas de verrou nécessaire.
+    """
+
+    def __init__(self, capacite: int, reserve: int, *classes: ClasseCharge):
+        self.capacite = capacite
+        self.reserve = reserve
+        self.en_cours = 0
+        # Files prioritaires servies en premier
+        self.classes = sorted(classes, key=lambda classe: not classe.prioritaire)
+
+    def _peut_entrer(self, classe: ClasseCharge) -> bool:
+        limite_globale = self.capacite if classe.prioritaire else self.capacite - self.reserve
+        return classe.en_cours < classe.limite and self.en_cours < limite_globale
+
+    def _occuper(self, classe: ClasseCharge):
+        classe.en_cours += 1
+        classe.admises += 1
+        self.en_cours += 1
+
+    async def entrer(self, classe: ClasseCharge):
+        debut = time.perf_counter()
+        if not classe._file and self._peut_entrer(classe):
+            self._occuper(classe)
+            classe._noter_attente(0.0)
+            return
+
+        futur = asyncio.get_running_loop().create_future()
+        classe._file.append(futur)
+        try:
+            await asyncio.wait_for(asyncio.shield(futur), classe.attente_max_autorisee)
+        except asyncio.TimeoutError:
+            if futur.done():
+                # Place attribuée au moment de l'expiration : elle est rendue
+                self.sortir(classe)
+            else:
+                futur.cancel()
+                classe._file.remove(futur)
+            classe.rejetees += 1
+            raise Saturation()
+        except asyncio.CancelledError:
+            # Client parti pendant l'attente
+            if futur.done() and not futur.cancelled():
+                self.sortir(classe)
+            elif futur in classe._file:
+                classe._file.remove(futur)
+            raise
+        classe._noter_attente(time.perf_counter() - debut)
+
+    def sortir(self, classe: ClasseCharge):
+        classe.en_cours -= 1
+        self.en_cours -= 1
+        self._attribuer()
+
+    def _attribuer(self):
+        for classe in self.classes:
+            while classe._file and self._peut_entrer(classe):
+                self._occuper(classe)
+                classe._file.popleft().set_result(None)
+
+    @asynccontextmanager
+    async def admettre(self, classe: ClasseCharge):
+        await self.entrer(classe)
+        try:
+            yield
+        finally:
+            self.sortir(classe)
+
+    def etat(self) -> dict:
+        return {
+            "capacite": self.capacite,
+            "reserve_prioritaire": self.reserve,
+            "en_cours": self.en_cours,
+            "classes": [classe.etat() for classe in self.classes],
+        }
+
+
+# Classes de charge du processus
+INGESTION = ClasseCharge(
+    "ingestion", settings.ISOLATION_INGESTION_LIMITE, True, settings.ISOLATION_INGESTION_ATTENTE_MAX_SECONDES
+)
+LECTURE = ClasseCharge(
+    "lecture", settings.ISOLATION_LECTURE_LIMITE, False, settings.ISOLATION_LECTURE_ATTENTE_MAX_SECONDES
+)
+RAPPORTS = ClasseCharge(
+    "rapports", settings.ISOLATION_RAPPORTS_LIMITE, False, settings.ISOLATION_RAPPORTS_ATTENTE_MAX_SECONDES
+)
+controle_admission = ControleAdmission(
+    settings.ISOLATION_CAPACITE, settings.ISOLATION_RESERVE_INGESTION, INGESTION, LECTURE, RAPPORTS
+)
+
+
+def isoler(classe: ClasseCharge):
+    """
+    Décorateur de route : admission dans la classe de charge, puis exécution
+    du corps (synchrone) de la route dans le pool de threads de la classe.
+
+    La boucle asyncio reste libre pour les autres classes, quelle que soit la
+    durée des requêtes SQL de la route. La signature est conservée pour FastAPI.
+    """
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        async def route(*args, **kwargs):
+            async with controle_admission.admettre(classe):
+                return await classe.executer(fonction, *args, **kwargs)
+        return route
+    return decorateur
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import DateTime, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+Changement = models.ChangementBorne
+
+
+class CurseurExpire(Exception):
+    """Des changements postérieurs au curseur ont été purgés : synchronisation complète nécessaire."""
+
+
+def journaliser(db: Session, ids_bornes: Iterable[int], anciennes: Optional[Dict[int, Tuple]] = None):
+    """
+    Note dans le journal les bornes modifiées par la transaction en cours.
+
+    Pas de commit : la ligne du journal est validée avec le changement
+    lui-même, un client ne peut donc pas voir l'une sans l'autre.
+    `anciennes` donne, pour une réaffectation ou un changement de site,
+    (agent, site) de chaque borne avant la modification (cf. `affectations`) :
+    la synchronisation signale la borne aux utilisateurs qui ne la voient plus.
+    """
+    anciennes = anciennes or {}
+    ids = sorted(set(ids_bornes) | set(anciennes))
+    if ids:
+        db.execute(insert(Changement), [{
+            "id_borne": id_borne,
+            "ancien_id_agent": anciennes[id_borne][0] if id_borne in anciennes else None,
+            "ancien_id_site": anciennes[id_borne][1] if id_borne in anciennes else None,
+        } for id_borne in ids])
+
+
+def affectations(db: Session, ids_bornes: Iterable[int]) -> Dict[int, Tuple]:
+    """(agent, site) actuels des bornes, à lire avant de les modifier."""
+    ids = list(ids_bornes)
+    if not ids:
+        return {}
+    return {
+        ligne.id_borne: (ligne.id_agent_affecte, ligne.id_site)
+        for ligne in db.execute(
+            select(models.Borne.id_borne, models.Borne.id_agent_affecte, models.Borne.id_site)
+            .where(models.Borne.id_borne.in_(ids))
+        )
+    }
+
+
+def _maintenant(db: Session):
+    # Horloge de la base : c'est elle qui date les lignes du journal
+    return db.scalar(select(func.now(type_=DateTime)))
+
+
+def _curseur_sur(db: Session, dernier: int, depuis: int) -> int:
+    """
+    Recule le curseur avant les changements de moins de JOURNAL_MARGE_SECONDES.
+
+    Les id sont attribués à l'insertion, pas au commit : une transaction
+    encore en cours peut valider un id inférieur à un id déjà visible. Les
+    changements récents sont donc relus au prochain appel (un client
+    applique les bornes reçues de façon idempotente).
+    """
+    seuil = _maintenant(db) - timedelta(seconds=settings.JOURNAL_MARGE_SECONDES)
+    premier_recent = db.scalar(
+        select(func.min(Changement.id_changement)).where(Changement.date_changement > seuil)
+    )
+    if premier_recent is not None:
+        dernier = min(dernier, premier_recent - 1)
+    return max(dernier, depuis)
+
+
+def curseur_courant(db: Session) -> int:
+    """Curseur à partir duquel suivre les changements après une synchronisation complète."""
+    dernier = db.scalar(select(func.max(Changement.id_changement))) or 0
+    return _curseur_sur(db, dernier, 0)
+
+
+def changements(db: Session, depuis: int, limite: int) -> Tuple[List[int], Dict[int, Set[Tuple]], int, bool]:
+    """
+    Bornes modifiées depuis le curseur `depuis`.
+
+    Lit au plus `limite` lignes du journal, par ordre d'id (index primaire) :
+    le coût suit le volume de changements, pas la taille de la flotte.
+    Retourne (ids des bornes, anciennes affectations (agent, site) des bornes
+    réaffectées ou changées de site, nouveau curseur, vrai s'il reste des
+    changements à lire tout de suite).
+    """
+    premier = db.scalar(select(func.min(Changement.id_changement)))
+    if premier is not None and depuis < premier - 1:
+        raise CurseurExpire()
+
+    lignes = db.execute(
+        select(Changement.id_changement, Changement.id_borne, Changement.ancien_id_agent, Changement.ancien_id_site)
+        .where(Changement.id_changement > depuis)
+        .order_by(Changement.id_changement)
+        .limit(limite + 1)
+    ).all()
+    reste = len(lignes) > limite
+    lignes = lignes[:limite]
+    if not lignes:
+        return [], {}, depuis, False
+
+    ids_bornes = sorted({ligne.id_borne for ligne in lignes})
+    anciennes: Dict[int, Set[Tuple]] = {}
+    for ligne in lignes:
+        if ligne.ancien_id_site is not None:
+            anciennes.setdefault(ligne.id_borne, set()).add((ligne.ancien_id_agent, ligne.ancien_id_site))
+    curseur = _curseur_sur(db, lignes[-1].id_changement, depuis)
+    # Curseur retenu avant des changements récents : les suivants sont plus
+    # récents encore, les relire tout de suite ne le ferait pas avancer
+    return ids_bornes, anciennes, curseur, reste and curseur == lignes[-1].id_changement
+
+
+def purger(db: Session) -> int:
+    """
+    Supprime les changements plus anciens que la rétention.
+
+    Le plus récent est toujours conservé : un curseur antérieur à la purge
+    est ainsi reconnu comme expiré même quand plus rien n'a changé depuis.
+    """
+    dernier = db.scalar(select(func.max(Changement.id_changement)))
+    if dernier is None:
+        return 0
+    limite = _maintenant(db) - timedelta(hours=settings.JOURNAL_RETENTION_HEURES)
+    resultat = db.execute(
+        delete(Changement).where(
+            Changement.date_changement < limite,
+            Changement.id_changement < dernier
+        )
+    )
+    db.commit()
+    return resultat.rowcount
+
+
+def _purger(session_factory) -> int:
+    db = session_factory()
+    try:
+        return purger(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def boucle_purge(session_factory):
+    """Tâche de fond : purge périodique du journal des changements."""
+    while True:
+        try:
+            nb = await asyncio.to_thread(_purger, session_factory)
+            if nb:
+                logger.info(f"Journal des bornes : {nb} changement(s) purgé(s)")
+        except Exception as e:
+            logger.error(f"Erreur de purge du journal des bornes: {str(e)}")
+        await asyncio.sleep(settings.JOURNAL_PURGE_SECONDES)
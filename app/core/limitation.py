@@ -0,0 +1,112 @@
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from app.core.config import settings
+
+
+class SeauxJetons:
+    """
+    Limiteur de débit par clé (algorithme du seau à jetons).
+
+    Chaque clé (uuid_esp, adresse IP...) occupe une simple liste
+    [jetons, date_dernier_remplissage]. Les clés les moins récemment
+    utilisées sont évincées au-delà de `max_cles`.
+    """
+
+    def __init__(self, capacite: int, debit_par_seconde: float, max_cles: int = 50000):
+        self.capacite = float(capacite)
+        self.debit = float(debit_par_seconde)
+        self.max_cles = max_cles
+        self._seaux: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = Lock()
+
+    def consommer(self, cle: str) -> float:
+        """
+        Consomme un jeton pour la clé.
+
+        Retourne 0 si la requête est autorisée, sinon le nombre de secondes
+        à attendre avant qu'un jeton soit disponible.
+        """
+        maintenant = time.monotonic()
+        with self._lock:
+            seau = self._seaux.get(cle)
+            if seau is None:
+                seau = [self.capacite, maintenant]
+                self._seaux[cle] = seau
+                if len(self._seaux) > self.max_cles:
+                    self._seaux.popitem(last=False)
+            else:
+                self._seaux.move_to_end(cle)
+                seau[0] = min(self.capacite, seau[0] + (maintenant - seau[1]) * self.debit)
+                seau[1] = maintenant
+
+            if seau[0] >= 1:
+                seau[0] -= 1
+                return 0.0
+            return (1 - seau[0]) / self.debit
+
+
+class DelesteurGlobal:
+    """
+    Délestage global de l'ingestion lorsque la base sature.
+
+    Surveille le nombre de requêtes d'ingestion en cours, l'occupation du pool
+    de connexions et le temps d'attente moyen (EWMA) pour obtenir une connexion.
+    """
+
+    def __init__(self, file_max: int, attente_pool_max_ms: float, occupation_pool_max: float):
+        self.file_max = file_max
+        self.attente_pool_max = attente_pool_max_ms / 1000
+        self.occupation_pool_max = occupation_pool_max
+        self.en_cours = 0
+        self.attente_pool_moyenne = 0.0
+        self._derniere_attente = 0.0
+        self._lock = Lock()
+
+    def entrer(self):
+        with self._lock:
+            self.en_cours += 1
+
+    def sortir(self):
+        with self._lock:
+            self.en_cours -= 1
+
+    def noter_attente_pool(self, secondes: float, alpha: float = 0.2):
+        """Met à jour la moyenne glissante du temps d'attente d'une connexion."""
+        with self._lock:
+            self.attente_pool_moyenne += alpha * (secondes - self.attente_pool_moyenne)
+            self._derniere_attente = time.monotonic()
+
+    def motif_delestage(self, pool, validite_attente_s: float = 5.0) -> Optional[str]:
+        """Retourne la raison du délestage, ou None si la requête peut passer."""
+        if self.en_cours >= self.file_max:
+            return "file d'attente d'ingestion pleine"
+        # Sans mesure récente (tout est délesté), la moyenne est considérée comme périmée
+        if time.monotonic() - self._derniere_attente > validite_attente_s:
+            self.attente_pool_moyenne = 0.0
+        if self.attente_pool_moyenne > self.attente_pool_max:
+            return "attente du pool de connexions trop longue"
+        taille = getattr(pool, "size", None)
+        if callable(taille) and hasattr(pool, "checkedout"):
+            capacite = taille() + max(getattr(pool, "_max_overflow", 0), 0)
+            if capacite and pool.checkedout() / capacite >= self.occupation_pool_max:
+                return "pool de connexions saturé"
+        return None
+
+
+def retry_after(secondes: float) -> str:
+    """Valeur de l'en-tête Retry-After (en secondes entières, au moins 1)."""
+    return str(max(1, math.ceil(secondes)))
+
+
+# Instances partagées par le processus
+limiteur_bornes = SeauxJetons(settings.LIMITE_BORNE_CAPACITE, settings.LIMITE_BORNE_DEBIT)
+limiteur_ips = SeauxJetons(settings.LIMITE_IP_CAPACITE, settings.LIMITE_IP_DEBIT)
+delesteur_ingestion = DelesteurGlobal(
+    settings.DELESTAGE_FILE_MAX,
+    settings.DELESTAGE_ATTENTE_POOL_MAX_MS,
+    settings.DELESTAGE_OCCUPATION_POOL_MAX,
+)
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import random
+import time
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.serialisation import encoder_json
+
+logger = logging.getLogger("uvicorn.error")
+
+Notification = models.Notification
+EN_ATTENTE = models.StatutNotificationEnum.EN_ATTENTE
+ENVOYEE = models.StatutNotificationEnum.ENVOYEE
+ABANDONNEE = models.StatutNotificationEnum.ABANDONNEE
+
+
+# --- Écriture, dans la transaction de l'alerte ---
+
+def notifier(db: Session, borne: models.Borne, alertes: List[models.Alerte]):
+    """
+    Ajoute une notification par alerte à l'outbox (alertes déjà insérées, pas de commit).
+
+    Validée ou annulée avec les alertes : aucune notification perdue ni
+    envoyée pour une alerte qui n'existe pas, et aucun appel réseau pendant l'ingestion.
+    """
+    if not settings.OUTBOX_ACTIF or not alertes:
+        return
+    db.execute(insert(Notification), [{
+        "id_alerte": alerte.id_alerte,
+        "id_borne": borne.id_borne,
+        "id_agent": borne.id_agent_affecte,
+        "type_alerte": alerte.type_alerte,
+        "niveau_valeur": alerte.niveau_valeur,
+    } for alerte in alertes])
+
+
+def notifier_nouvelles(db: Session, ids_bornes: List[int], type_alerte: models.TypeAlerteEnum):
+    """Notifie les alertes `nouvelle` de ce type sur ces bornes, en un INSERT ... SELECT (pas de commit)."""
+    if not settings.OUTBOX_ACTIF or not ids_bornes:
+        return
+    db.execute(insert(Notification).from_select(
+        ["id_alerte", "id_borne", "id_agent", "type_alerte", "niveau_valeur", "statut", "tentatives"],
+        select(
+            models.Alerte.id_alerte,
+            models.Alerte.id_borne,
+            models.Borne.id_agent_affecte,
+            models.Alerte.type_alerte,
+            models.Alerte.niveau_valeur,
+            literal(EN_ATTENTE.value),
+            literal(0),
+        ).join(models.Borne, models.Borne.id_borne == models.Alerte.id_borne).where(
+            models.Alerte.id_borne.in_(ids_bornes),
+            models.Alerte.type_alerte == type_alerte,
+            models.Alerte.statut == models.StatutAlerteEnum.NOUVELLE
+        )
+    ))
+
+
+# --- Destinations des notifications ---
+
+class Sink(ABC):
+    """Destination des notifications."""
+
+    nom = "sink"
+
+    @abstractmethod
+    def envoyer(self, message: dict):
+        """Envoie le message ; lève une exception en cas d'échec."""
+
+
+class SinkJournal(Sink):
+    """Écrit les notifications dans le journal de l'application (développement)."""
+
+    nom = "journal"
+
+    def envoyer(self, message: dict):
+        agent = message["agent"]["email"] if message["agent"] else "sans agent"
+        logger.info(f"Notification pour {agent} : {message['nb_alertes']} alerte(s)")
+
+
+class SinkWebhook(Sink):
+    """
+    POST JSON du message vers une URL (passerelle e-mail ou SMS, outil de messagerie).
+
+    Tout statut hors 2xx est un échec. L'envoi est « au moins une fois » : le
+    destinataire dédoublonne avec `id_notification`.
+    """
+
+    nom = "webhook"
+
+    def __init__(self, url: str, delai_secondes: float):
+        self.url = url
+        self.delai = delai_secondes
+
+    def envoyer(self, message: dict):
+        requete = urllib.request.Request(
+            self.url, data=encoder_json(message), method="POST",
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(requete, timeout=self.delai) as reponse:
+            if not 200 <= reponse.status < 300:
+                raise urllib.error.HTTPError(self.url, reponse.status, reponse.reason, reponse.headers, None)
+
+
+# Fabriques des destinations, par nom (OUTBOX_SINKS)
+SINKS: Dict[str, Callable[[], Sink]] = {
+    "journal": SinkJournal,
+    "webhook": lambda: SinkWebhook(settings.OUTBOX_WEBHOOK_URL, settings.OUTBOX_WEBHOOK_DELAI_SECONDES),
+}
+
+
+def enregistrer_sink(nom: str, fabrique: Callable[[], Sink]):
+    """Ajoute un type de destination utilisable dans OUTBOX_SINKS."""
+    SINKS[nom] = fabrique
+
+
+def creer_sinks(noms: List[str]) -> List[Sink]:
+    inconnus = [nom for nom in noms if nom not in SINKS]
+    if inconnus:
+        raise ValueError(f"OUTBOX_SINKS inconnu(s): {', '.join(inconnus)}")
+    return [SINKS[nom]() for nom in noms]
+
+
+# --- Répartiteur ---
+
+def _maintenant(db: Session):
+    # Horloge de la base : c'est elle qui date les notifications
+    return db.scalar(select(func.now(type_=DateTime)))
+
+
+def delai_nouvel_essai(tentatives: int) -> float:
+    """Délai exponentiel avant la tentative suivante, plafonné, avec ±20 % d'aléa."""
+    delai = min(settings.OUTBOX_DELAI_INITIAL_SECONDES * 2 ** (tentatives - 1), settings.OUTBOX_DELAI_MAX_SECONDES)
+    return delai * random.uniform(0.8, 1.2)
+
+
+def _messages(lignes) -> List[dict]:
+    """Regroupe les notifications par agent : un message par destinataire."""
+    messages: Dict[object, dict] = {}
+    for ligne in lignes:
+        message = messages.get(ligne.id_agent)
+        if message is None:
+            agent = None
+            if ligne.id_agent is not None and ligne.email:
+                agent = {"id_utilisateur": ligne.id_agent, "email": ligne.email, "nom": f"{ligne.prenom} {ligne.nom}"}
+            message = messages[ligne.id_agent] = {"id_agent": ligne.id_agent, "agent": agent, "alertes": []}
+        message["alertes"].append({
+            "id_notification": ligne.id_notification,
+            "id_alerte": ligne.id_alerte,
+            "id_borne": ligne.id_borne,
+            "nom_borne": ligne.nom_borne,
+            "salle_local": ligne.salle_local,
+            "type_alerte": ligne.type_alerte.value,
+            "niveau_valeur": ligne.niveau_valeur,
+            "date": ligne.date_creation,
+        })
+    for message in messages.values():
+        message["nb_alertes"] = len(message["alertes"])
+    return list(messages.values())
+
+
+class Repartiteur:
+    """
+    Envoi des notifications de l'outbox, hors du chemin de l'ingestion.
+
+    À chaque tour : réservation d'un lot de notifications échues (bail
+    OUTBOX_BAIL_SECONDES, lignes verrouillées SKIP LOCKED : plusieurs
+    processus se partagent l'outbox), un message par agent vers chaque
+    destination, puis marquage. Un message en échec est retenté avec un
+    délai exponentiel, puis abandonné après OUTBOX_TENTATIVES_MAX tentatives.
+    """
+
+    def __init__(self, sinks: List[Sink]):
+        self.sinks = sinks
+        self.envoyees = 0
+        self.echecs = 0
+        self.abandonnees = 0
+        self.derniere_erreur = None
+        self._derniere_purge = 0.0
+
+    def _reserver(self, db: Session, maintenant):
+        echeance = maintenant - timedelta(seconds=settings.OUTBOX_REGROUPEMENT_SECONDES)
+        lignes = db.execute(
+            select(
+                Notification.id_notification, Notification.id_alerte, Notification.id_borne,
+                Notification.id_agent, Notification.type_alerte, Notification.niveau_valeur,
+                Notification.date_creation, Notification.tentatives,
+                models.Utilisateur.email, models.Utilisateur.prenom, models.Utilisateur.nom,
+                models.Borne.nom_borne, models.Borne.salle_local,
+            )
+            .outerjoin(models.Utilisateur, models.Utilisateur.id_utilisateur == Notification.id_agent)
+            .outerjoin(models.Borne, models.Borne.id_borne == Notification.id_borne)
+            .where(Notification.statut == EN_ATTENTE, Notification.prochain_essai <= echeance)
+            .order_by(Notification.prochain_essai, Notification.id_notification)
+            .limit(settings.OUTBOX_LOT)
+            .with_for_update(skip_locked=True, of=Notification)
+        ).all()
+        if lignes:
+            db.execute(
+                update(Notification)
+                .where(Notification.id_notification.in_([ligne.id_notification for ligne in lignes]))
+                .values(
+                    prochain_essai=maintenant + timedelta(seconds=settings.OUTBOX_BAIL_SECONDES),
+                    tentatives=Notification.tentatives + 1
+                )
+            )
+        db.commit()
+        return lignes
+
+    def _envoyer(self, message: dict):
+        for sink in self.sinks:
+            sink.envoyer(message)
+
+    def traiter_lot(self, db: Session) -> int:
+        """Envoie un lot de notifications échues ; retourne le nombre de notifications traitées."""
+        lignes = self._reserver(db, _maintenant(db))
+        if not lignes:
+            return 0
+        tentatives = {ligne.id_notification: ligne.tentatives + 1 for ligne in lignes}
+
+        envoyees, echecs = [], {}
+        for message in _messages(lignes):
+            ids = [alerte["id_notification"] for alerte in message["alertes"]]
+            try:
+                self._envoyer(message)
+                envoyees += ids
+            except Exception as e:
+                self.derniere_erreur = f"{type(e).__name__}: {e}"[:255]
+                for id_notification in ids:
+                    echecs[id_notification] = self.derniere_erreur
+
+        maintenant = _maintenant(db)
+        if envoyees:
+            # prochain_essai devient la date du dernier essai (purge par l'index de l'outbox)
+            db.execute(
+                update(Notification)
+                .where(Notification.id_notification.in_(envoyees))
+                .values(statut=ENVOYEE, date_envoi=maintenant, prochain_essai=maintenant, erreur=None)
+            )
+        # Une mise à jour par nombre de tentatives (même délai)
+        par_tentatives: Dict[int, List[int]] = {}
+        for id_notification in echecs:
+            par_tentatives.setdefault(tentatives[id_notification], []).append(id_notification)
+        for nb, ids in par_tentatives.items():
+            abandon = nb >= settings.OUTBOX_TENTATIVES_MAX
+            db.execute(
+                update(Notification)
+                .where(Notification.id_notification.in_(ids))
+                .values(
+                    statut=ABANDONNEE if abandon else EN_ATTENTE,
+                    prochain_essai=maintenant if abandon else maintenant + timedelta(seconds=delai_nouvel_essai(nb)),
+                    erreur=self.derniere_erreur
+                )
+            )
+            if abandon:
+                self.abandonnees += len(ids)
+                logger.error(f"{len(ids)} notification(s) abandonnée(s) après {nb} tentatives: {self.derniere_erreur}")
+        db.commit()
+
+        self.envoyees += len(envoyees)
+        self.echecs += len(echecs)
+        return len(lignes)
+
+    def purger(self, db: Session) -> int:
+        """Supprime les notifications envoyées ou abandonnées depuis plus que la rétention."""
+        limite = _maintenant(db) - timedelta(hours=settings.OUTBOX_RETENTION_HEURES)
+        nb = 0
+        for statut in (ENVOYEE, ABANDONNEE):
+            nb += db.execute(
+                delete(Notification).where(Notification.statut == statut, Notification.prochain_essai < limite)
+            ).rowcount
+        db.commit()
+        return nb
+
+    def tour(self, session_factory) -> int:
+        db = session_factory()
+        try:
+            nb = self.traiter_lot(db)
+            if time.monotonic() - self._derniere_purge > 3600:
+                self._derniere_purge = time.monotonic()
+                self.purger(db)
+            return nb
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def etat(self, db: Session) -> dict:
+        par_statut = Counter(dict(db.execute(
+            select(Notification.statut, func.count()).group_by(Notification.statut)
+        ).all()))
+        return {
+            "sinks": [sink.nom for sink in self.sinks],
+            "en_attente": par_statut[EN_ATTENTE],
+            "envoyees_en_base": par_statut[ENVOYEE],
+            "abandonnees_en_base": par_statut[ABANDONNEE],
+            "envoyees": self.envoyees,
+            "echecs": self.echecs,
+            "abandonnees": self.abandonnees,
+            "derniere_erreur": self.derniere_erreur,
+        }
+
+
+async def boucle_outbox(session_factory, repartiteur: "Repartiteur"):
+    """Tâche de fond : envoie les notifications ; enchaîne les lots tant que l'outbox en contient."""
+    while True:
+        try:
+            nb = await asyncio.to_thread(repartiteur.tour, session_factory)
+            if nb >= settings.OUTBOX_LOT:
+                continue
+        except Exception as e:
+            logger.error(f"Erreur du répartiteur de notifications: {str(e)}")
+        await asyncio.sleep(settings.OUTBOX_INTERVALLE_SECONDES)
+
+
+# Instance partagée par le processus
+repartiteur_notifications = Repartiteur(creer_sinks(settings.OUTBOX_SINKS))
@@ -0,0 +1,52 @@
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+# Taille de page par défaut et maximale de l'historique
+TAILLE_PAGE = 100
+TAILLE_PAGE_MAX = 500
+
+
+def encoder_curseur(horodatage: datetime, identifiant: int) -> str:
+    return f"{horodatage.isoformat()}_{identifiant}"
+
+
+def decoder_curseur(curseur: str) -> Tuple[datetime, int]:
+    """(horodatage, identifiant) du dernier élément de la page précédente. Lève ValueError."""
+    horodatage, _, identifiant = curseur.rpartition("_")
+    return datetime.fromisoformat(horodatage), int(identifiant)
+
+
+def apres_curseur(colonne_date, colonne_id, curseur: str):
+    """
+    Condition des lignes situées après le curseur, dans l'ordre (date DESC, id DESC).
+
+    La page suivante reprend l'index là où la précédente s'est arrêtée
+    (pagination par clé), au lieu de relire et sauter les lignes comme OFFSET.
+    """
+    horodatage, identifiant = decoder_curseur(curseur)
+    return or_(
+        colonne_date < horodatage,
+        and_(colonne_date == horodatage, colonne_id < identifiant)
+    )
+
+
+def entre_jours(colonne_date, debut: Optional[date], fin: Optional[date]) -> list:
+    """Conditions sur une colonne DATETIME pour les jours `debut` à `fin` inclus."""
+    conditions = []
+    if debut is not None:
+        conditions.append(colonne_date >= datetime.combine(debut, time.min))
+    if fin is not None:
+        conditions.append(colonne_date < datetime.combine(fin + timedelta(days=1), time.min))
+    return conditions
+
+
+def decouper_page(lignes: List, taille: int, attribut_date: str, attribut_id: str) -> dict:
+    """Page de `taille` éléments à partir de `taille + 1` lignes lues, avec le curseur suivant."""
+    elements = lignes[:taille]
+    curseur = None
+    if len(lignes) > taille:
+        dernier = elements[-1]
+        curseur = encoder_curseur(getattr(dernier, attribut_date), getattr(dernier, attribut_id))
+    return {"elements": elements, "curseur_suivant": curseur}
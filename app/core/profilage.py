@@ -0,0 +1,189 @@
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import time
+import uuid
+from collections import defaultdict
+from threading import Lock
+
+from sqlalchemy import event
+
+from app.core import security
+from app.core.config import settings
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import HTMLRenderer
+    from pyinstrument.session import Session
+except ImportError:  # pyinstrument est optionnel, cProfile sert de repli
+    Profiler = None
+
+logger = logging.getLogger("uvicorn.error")
+
+# Requêtes SQL de la requête HTTP profilée en cours (None hors profilage)
+_requetes_sql = contextvars.ContextVar("requetes_sql", default=None)
+
+# Profils des appels exécutés dans les pools de threads pendant la requête profilée (None hors profilage)
+_profils_threads = contextvars.ContextVar("profils_threads", default=None)
+
+# cProfile ne supporte qu'un profileur actif à la fois
+_verrou_profileur = Lock()
+
+
+def _demarrer(profileur):
+    if Profiler:
+        profileur.start()
+    else:
+        profileur.enable()
+
+
+def _arreter(profileur):
+    if Profiler:
+        profileur.stop()
+    else:
+        profileur.disable()
+
+
+def profiler_appel(fonction, *args, **kwargs):
+    """
+    Exécute `fonction`, profilée si la requête HTTP en cours l'est.
+
+    Appelé dans les threads des classes de charge (ClasseCharge.executer) :
+    le profileur du middleware ne suit que le thread de la boucle asyncio,
+    pas le corps des routes. Le profil du thread est fusionné au sien.
+    """
+    profils = _profils_threads.get()
+    if profils is None:
+        return fonction(*args, **kwargs)
+    profileur = Profiler(async_mode="disabled") if Profiler else cProfile.Profile()
+    try:
+        _demarrer(profileur)
+    except (RuntimeError, ValueError):
+        # cProfile sous Python 3.12+ : profileur unique du processus, celui du middleware suit déjà ce thread
+        return fonction(*args, **kwargs)
+    try:
+        return fonction(*args, **kwargs)
+    finally:
+        _arreter(profileur)
+        profils.append(profileur)
+
+
+def activer_suivi_sql(engine):
+    """Chronomètre les requêtes SQL exécutées pendant une requête HTTP profilée."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _avant(conn, cursor, statement, parameters, context, executemany):
+        if _requetes_sql.get() is not None:
+            conn.info.setdefault("debut_requete", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _apres(conn, cursor, statement, parameters, context, executemany):
+        requetes = _requetes_sql.get()
+        if requetes is not None and conn.info.get("debut_requete"):
+            duree = time.perf_counter() - conn.info["debut_requete"].pop()
+            requetes[statement][0] += 1
+            requetes[statement][1] += duree
+
+
+def _est_administrateur(scope) -> bool:
+    for nom, valeur in scope["headers"]:
+        if nom == b"authorization":
+            schema, _, token = valeur.decode("latin-1").partition(" ")
+            payload = security.verify_token(token) if schema.lower() == "bearer" else None
+            return bool(payload) and payload.get("role") == "fournisseur"
+    return False
+
+
+def _doit_profiler(scope) -> bool:
+    for nom, valeur in scope["headers"]:
+        if nom == b"x-profile" and valeur == b"1":
+            return _est_administrateur(scope)
+    return settings.PROFILAGE_TAUX_ECHANTILLONNAGE > 0 and random.random() < settings.PROFILAGE_TAUX_ECHANTILLONNAGE
+
+
+class MiddlewareProfilage:
+    """
+    Middleware ASGI de profilage à la demande.
+
+    Profile une requête si un fournisseur envoie `X-Profile: 1`, ou pour une
+    fraction échantillonnée des requêtes, y compris le corps des routes
+    exécuté dans les pools de threads (`profiler_appel`). Le profil Python (HTML pyinstrument
+    ou .pstats cProfile) et le détail des requêtes SQL sont écrits dans
+    PROFILAGE_DOSSIER ; l'en-tête `X-Profile-Id` de la réponse donne leur nom.
+
+    N'est installé que si PROFILAGE_ACTIF est vrai : aucun coût sinon.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        os.makedirs(settings.PROFILAGE_DOSSIER, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _doit_profiler(scope):
+            return await self.app(scope, receive, send)
+
+        if not _verrou_profileur.acquire(blocking=False):
+            # Un profil est déjà en cours dans ce processus
+            return await self.app(scope, receive, send)
+
+        id_profil = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+        async def send_avec_entete(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", id_profil.encode())]
+            await send(message)
+
+        requetes = defaultdict(lambda: [0, 0.0])
+        profils_threads = []
+        jeton = _requetes_sql.set(requetes)
+        jeton_threads = _profils_threads.set(profils_threads)
+        profileur = Profiler(async_mode="enabled") if Profiler else cProfile.Profile()
+        debut = time.perf_counter()
+        try:
+            _demarrer(profileur)
+            await self.app(scope, receive, send_avec_entete)
+        finally:
+            _arreter(profileur)
+            duree = time.perf_counter() - debut
+            _profils_threads.reset(jeton_threads)
+            _requetes_sql.reset(jeton)
+            _verrou_profileur.release()
+            try:
+                self._enregistrer(id_profil, scope, profileur, profils_threads, requetes, duree)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'écriture du profil {id_profil}: {str(e)}")
+
+    def _enregistrer(self, id_profil: str, scope, profileur, profils_threads: list, requetes: dict, duree: float):
+        base = os.path.join(settings.PROFILAGE_DOSSIER, id_profil)
+        # Boucle asyncio et threads des classes de charge dans un seul profil
+        if Profiler:
+            session = profileur.last_session
+            for profil in profils_threads:
+                session = Session.combine(session, profil.last_session)
+            with open(f"{base}.html", "w", encoding="utf-8") as f:
+                f.write(HTMLRenderer().render(session))
+        else:
+            statistiques = pstats.Stats(profileur)
+            for profil in profils_threads:
+                statistiques.add(profil)
+            statistiques.dump_stats(f"{base}.pstats")
+
+        temps_sql = sum(total for _, total in requetes.values())
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "methode": scope["method"],
+                "chemin": scope["path"],
+                "duree_totale_ms": round(duree * 1000, 2),
+                "duree_sql_ms": round(temps_sql * 1000, 2),
+                "duree_python_ms": round((duree - temps_sql) * 1000, 2),
+                "requetes_sql": sorted(
+                    [{"sql": sql, "nombre": nombre, "duree_ms": round(total * 1000, 2)}
+                     for sql, (nombre, total) in requetes.items()],
+                    key=lambda r: r["duree_ms"], reverse=True
+                ),
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"Profil {id_profil} enregistré ({scope['method']} {scope['path']}, {duree * 1000:.1f} ms)")
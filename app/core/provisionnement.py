@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+from typing import List
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.core.auth_bornes import authentification_bornes, deriver_cle, nouveau_sel
+from app.core.evenements import BORNES_MODIFIEES, publier
+from app.core.journal import affectations, journaliser
+
+
+def lire_lignes(contenu: str, format_fichier: str) -> List[dict]:
+    """
+    Convertit le contenu d'un fichier CSV ou JSON en liste de dictionnaires.
+
+    Les cellules CSV vides sont ignorées pour que les valeurs par défaut s'appliquent.
+    """
+    if format_fichier == "json":
+        donnees = json.loads(contenu)
+        if isinstance(donnees, dict):
+            donnees = donnees.get("bornes", [])
+        if not isinstance(donnees, list):
+            raise ValueError("Le JSON doit être une liste de bornes")
+        return donnees
+
+    if format_fichier == "csv":
+        lecteur = csv.DictReader(io.StringIO(contenu))
+        return [
+            {cle.strip(): valeur.strip() for cle, valeur in ligne.items() if cle and valeur and valeur.strip()}
+            for ligne in lecteur
+        ]
+
+    raise ValueError(f"Format non supporté: {format_fichier}")
+
+
+def provisionner_bornes(
+    db: Session, lignes: List[dict], dry_run: bool = False, upsert: bool = False, avec_cles: bool = False
+) -> dict:
+    """
+    Crée (ou met à jour) un lot de bornes en une seule transaction.
+
+    - Les doublons d'UUID sont détectés par une seule requête ensembliste
+    - Sites et agents sont validés en bloc
+    - Si une ligne est en erreur, rien n'est écrit (tout ou rien)
+    - En mode `upsert`, une borne existante est mise à jour au lieu d'être refusée
+    - En mode `dry_run`, le rapport est calculé sans rien écrire
+    - Avec `avec_cles`, chaque borne créée reçoit sa clé d'authentification (`cle_borne` dans le rapport)
+    """
+    rapport = []
+    bornes_valides = []
+    uuids_vus = set()
+
+    # 1. Validation unitaire de chaque ligne
+    for numero, ligne in enumerate(lignes, start=1):
+        entree = {"ligne": numero, "uuid_esp": ligne.get("uuid_esp") if isinstance(ligne, dict) else None, "statut": "erreur", "erreurs": []}
+        rapport.append(entree)
+        try:
+            borne = schemas.BorneCreate(**ligne)
+        except (ValidationError, TypeError) as e:
+            if isinstance(e, ValidationError):
+                entree["erreurs"] = [f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()]
+            else:
+                entree["erreurs"] = ["Ligne invalide"]
+            continue
+        if borne.uuid_esp in uuids_vus:
+            entree["erreurs"].append(f"UUID '{borne.uuid_esp}' présent plusieurs fois dans le fichier")
+            continue
+        uuids_vus.add(borne.uuid_esp)
+        bornes_valides.append((entree, borne))
+
+    # 2. Vérifications ensemblistes : UUID existants, sites et agents
+    uuids = [borne.uuid_esp for _, borne in bornes_valides]
+    existantes = dict(db.execute(
+        select(models.Borne.uuid_esp, models.Borne.id_borne).where(models.Borne.uuid_esp.in_(uuids))
+    ).all()) if uuids else {}
+
+    ids_sites = {borne.id_site for _, borne in bornes_valides}
+    sites_connus = set(db.scalars(
+        select(models.Site.id_site).where(models.Site.id_site.in_(ids_sites))
+    )) if ids_sites else set()
+
+    ids_agents = {borne.id_agent_affecte for _, borne in bornes_valides if borne.id_agent_affecte is not None}
+    agents_connus = set(db.scalars(
+        select(models.Utilisateur.id_utilisateur).where(
+            models.Utilisateur.id_utilisateur.in_(ids_agents),
+            models.Utilisateur.role == models.RoleEnum.agent
+        )
+    )) if ids_agents else set()
+
+    a_creer, a_mettre_a_jour, entrees_creees = [], [], []
+    for entree, borne in bornes_valides:
+        if borne.id_site not in sites_connus:
+            entree["erreurs"].append(f"Site ID {borne.id_site} non trouvé")
+        if borne.id_agent_affecte is not None and borne.id_agent_affecte not in agents_connus:
+            entree["erreurs"].append(f"Agent ID {borne.id_agent_affecte} non trouvé ou n'a pas le rôle 'agent'")
+        if borne.uuid_esp in existantes and not upsert:
+            entree["erreurs"].append(f"Une borne avec l'UUID '{borne.uuid_esp}' existe déjà.")
+        if entree["erreurs"]:
+            continue
+
+        if borne.uuid_esp in existantes:
+            # Seules les colonnes présentes dans le fichier sont modifiées (pas les valeurs par défaut)
+            entree["statut"] = "mise_a_jour"
+            a_mettre_a_jour.append({**borne.dict(exclude_unset=True), "id_borne": existantes[borne.uuid_esp]})
+        else:
+            entree["statut"] = "creee"
+            a_creer.append(borne.dict())
+            entrees_creees.append(entree)
+
+    erreurs = sum(1 for entree in rapport if entree["erreurs"])
+    resultat = {
+        "dry_run": dry_run,
+        "total": len(rapport),
+        "creees": len(a_creer),
+        "mises_a_jour": len(a_mettre_a_jour),
+        "erreurs": erreurs,
+        "applique": False,
+        "lignes": rapport,
+    }
+
+    # 3. Écriture en une seule transaction
+    if dry_run or erreurs or not (a_creer or a_mettre_a_jour):
+        return resultat
+
+    for valeurs in a_creer:
+        valeurs["cle_sel"] = nouveau_sel() if avec_cles else None
+    # Agent ou site modifiés par la mise à jour : les utilisateurs qui voyaient ces bornes en sont avertis
+    anciennes = affectations(db, [valeurs["id_borne"] for valeurs in a_mettre_a_jour])
+    try:
+        if a_creer:
+            db.execute(insert(models.Borne), a_creer)
+        if a_mettre_a_jour:
+            db.execute(update(models.Borne), a_mettre_a_jour)
+        modifiees = [valeurs["id_borne"] for valeurs in a_mettre_a_jour]
+        if a_creer:
+            modifiees += list(db.scalars(select(models.Borne.id_borne).where(
+                models.Borne.uuid_esp.in_([valeurs["uuid_esp"] for valeurs in a_creer])
+            )))
+        journaliser(db, modifiees, anciennes)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for entree, valeurs in zip(entrees_creees, a_creer):
+        cle = deriver_cle(valeurs["uuid_esp"], valeurs["cle_sel"]) if avec_cles else None
+        authentification_bornes.cles.enregistrer(valeurs["uuid_esp"], cle)
+        if cle:
+            entree["cle_borne"] = cle.hex()
+
+    publier(BORNES_MODIFIEES, ids=modifiees)
+
+    resultat["applique"] = True
+    return resultat
@@ -0,0 +1,176 @@
+from typing import FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import func, null, select
+from sqlalchemy.orm import aliased
+
+from app import models
+from app.core.depot_mesures import depot_mesures
+
+
+def sous_requete_derniere_mesure():
+    """
+    Sous-requête scalaire : id de la mesure la plus récente de la borne courante (`models.Borne`).
+
+    En cas d'égalité d'horodatage, la mesure d'ID le plus élevé est retenue.
+    Corrélée à la borne : une recherche LIMIT 1 dans idx_borne_horodatage par
+    borne lue, sans parcourir ni regrouper tout l'historique des mesures.
+    """
+    mesure = aliased(models.Mesure)
+    return select(mesure.id_mesure).where(
+        mesure.id_borne == models.Borne.id_borne
+    ).order_by(
+        mesure.horodatage.desc(), mesure.id_mesure.desc()
+    ).limit(1).correlate(models.Borne).scalar_subquery()
+
+
+# Champs de la borne sélectionnables (`?fields=`) ; id_borne est toujours retourné
+CHAMPS_BORNE = (
+    "id_borne",
+    "uuid_esp",
+    "nom_borne",
+    "id_site",
+    "salle_local",
+    "seuil_alerte_gel",
+    "seuil_alerte_batterie",
+    "id_agent_affecte",
+    "date_installation",
+    "est_active",
+    "filtre_mesures",
+    "filtre_fenetre",
+)
+
+# Expansions (`?expand=`) : jointure ou sous-requête ajoutée, et champs produits
+EXPANSIONS_BORNE = {
+    "site": ("site_nom",),
+    "agent": ("agent_nom",),
+    "etat": ("dernier_niveau_gel", "dernier_niveau_batterie", "derniere_mesure"),
+    "alertes": ("alertes_actives",),
+}
+
+# Réponse complète des bornes (BorneAvecDetails)
+EXPANSIONS_DETAILS = frozenset({"site", "agent", "etat"})
+
+
+def projection_bornes(fields: Optional[str], expand: Optional[str]) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+    """
+    Champs et expansions demandés par `?fields=a,b` et `?expand=x,y` (ValueError si inconnus).
+
+    Sans aucun des deux : réponse complète. `expand` seul garde tous les
+    champs de la borne ; `fields` seul n'ajoute aucune expansion.
+    """
+    if fields is None and expand is None:
+        return CHAMPS_BORNE, EXPANSIONS_DETAILS
+
+    champs = CHAMPS_BORNE
+    if fields is not None:
+        demandes = {nom.strip() for nom in fields.split(",") if nom.strip()}
+        inconnus = demandes.difference(CHAMPS_BORNE)
+        if inconnus:
+            raise ValueError(
+                f"Champ(s) inconnu(s): {', '.join(sorted(inconnus))}. Champs possibles: {', '.join(CHAMPS_BORNE)}"
+            )
+        # Ordre du catalogue, id_borne en premier
+        champs = tuple(nom for nom in CHAMPS_BORNE if nom == "id_borne" or nom in demandes)
+
+    expansions = frozenset()
+    if expand is not None:
+        expansions = frozenset(nom.strip() for nom in expand.split(",") if nom.strip())
+        inconnues = expansions.difference(EXPANSIONS_BORNE)
+        if inconnues:
+            raise ValueError(
+                f"Expansion(s) inconnue(s): {', '.join(sorted(inconnues))}. "
+                f"Expansions possibles: {', '.join(EXPANSIONS_BORNE)}"
+            )
+    return champs, expansions
+
+
+def requete_bornes(
+    champs: Tuple[str, ...] = CHAMPS_BORNE,
+    expansions: FrozenSet[str] = EXPANSIONS_DETAILS,
+    avec_derniere_mesure: bool = True,
+    ids_bornes: Optional[List[int]] = None
+):
+    """
+    Sélection en colonnes (sans objets ORM) des bornes, réduite aux champs demandés.
+
+    Seules les expansions demandées coûtent une jointure ou une sous-requête :
+    `site` et `agent` une jointure, `etat` la dernière mesure, `alertes` le
+    nombre d'alertes actives (un seul regroupement pour toute la liste).
+    Quand les mesures ne sont pas dans la base principale (shards,
+    segments), la jointure est impossible : `avec_derniere_mesure=False` laisse
+    les colonnes de l'état vides, à remplir avec `completer_dernieres_mesures`.
+    `ids_bornes` restreint la requête à ces bornes.
+    """
+    requete = select(*(getattr(models.Borne, nom) for nom in champs)).select_from(models.Borne)
+    if ids_bornes is not None:
+        requete = requete.where(models.Borne.id_borne.in_(ids_bornes))
+
+    if "site" in expansions:
+        requete = requete.add_columns(models.Site.nom_site.label("site_nom")).outerjoin(
+            models.Site, models.Site.id_site == models.Borne.id_site
+        )
+    if "agent" in expansions:
+        requete = requete.add_columns(
+            models.Utilisateur.prenom.label("agent_prenom"),
+            models.Utilisateur.nom.label("agent_nom"),
+        ).outerjoin(
+            models.Utilisateur, models.Utilisateur.id_utilisateur == models.Borne.id_agent_affecte
+        )
+
+    if "etat" in expansions and not avec_derniere_mesure:
+        requete = requete.add_columns(
+            null().label("dernier_niveau_gel"),
+            null().label("dernier_niveau_batterie"),
+            null().label("derniere_mesure"),
+        )
+    elif "etat" in expansions:
+        requete = requete.add_columns(
+            models.Mesure.niveau_gel.label("dernier_niveau_gel"),
+            models.Mesure.niveau_batterie.label("dernier_niveau_batterie"),
+            models.Mesure.horodatage.label("derniere_mesure"),
+        ).outerjoin(
+            models.Mesure, models.Mesure.id_mesure == sous_requete_derniere_mesure()
+        )
+
+    if "alertes" in expansions:
+        actives = select(
+            models.Alerte.id_borne,
+            func.count().label("nb")
+        ).where(
+            models.Alerte.statut.in_([models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE])
+        )
+        if ids_bornes is not None:
+            actives = actives.where(models.Alerte.id_borne.in_(ids_bornes))
+        actives = actives.group_by(models.Alerte.id_borne).subquery()
+        requete = requete.add_columns(
+            func.coalesce(actives.c.nb, 0).label("alertes_actives")
+        ).outerjoin(actives, actives.c.id_borne == models.Borne.id_borne)
+
+    return requete
+
+
+def requete_bornes_details(avec_derniere_mesure: bool = True, ids_bornes: Optional[List[int]] = None):
+    """Bornes avec site, agent et dernière mesure (format BorneAvecDetails), en une seule requête."""
+    return requete_bornes(CHAMPS_BORNE, EXPANSIONS_DETAILS, avec_derniere_mesure, ids_bornes)
+
+
+def borne_depuis_ligne(ligne) -> dict:
+    """Convertit une ligne de `requete_bornes` en dictionnaire de réponse (nom complet de l'agent)."""
+    borne = ligne._asdict()
+    if "agent_prenom" in borne:
+        prenom = borne.pop("agent_prenom")
+        nom = borne.pop("agent_nom")
+        borne["agent_nom"] = f"{prenom} {nom}" if prenom or nom else None
+    return borne
+
+
+def completer_dernieres_mesures(bornes: List[dict]) -> List[dict]:
+    """Remplit la dernière mesure de chaque borne depuis le stockage des mesures."""
+    dernieres = depot_mesures.dernieres_flotte()
+    for borne in bornes:
+        derniere = dernieres.get(borne["id_borne"])
+        if derniere is not None:
+            borne["dernier_niveau_gel"] = derniere.niveau_gel
+            borne["dernier_niveau_batterie"] = derniere.niveau_batterie
+            borne["derniere_mesure"] = derniere.horodatage
+    return bornes
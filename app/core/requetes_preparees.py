@@ -0,0 +1,135 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Requêtes chaudes (à chaque mesure reçue ou requête authentifiée), construites
+# une seule fois au chargement du module. Les valeurs passent par des paramètres
+# liés : l'instruction est la même d'un appel à l'autre, sa clé de cache est
+# calculée une fois (mémorisée sur l'objet) et la version compilée est retrouvée
+# dans le cache du moteur. Une chaîne `db.query(...)` trouve aussi ce cache, mais
+# paie à chaque appel la construction de la requête et le calcul de sa clé.
+
+STATUTS_ACTIFS = [models.StatutAlerteEnum.NOUVELLE, models.StatutAlerteEnum.ASSIGNEE]
+
+BORNE_PAR_UUID = select(models.Borne).where(models.Borne.uuid_esp == bindparam("uuid_esp"))
+
+SEL_BORNE_PAR_UUID = select(models.Borne.cle_sel).where(models.Borne.uuid_esp == bindparam("uuid_esp"))
+
+UTILISATEUR_PAR_EMAIL = select(models.Utilisateur).where(models.Utilisateur.email == bindparam("email"))
+
+PRECEDENTE_MESURE = select(
+    models.Mesure.horodatage, models.Mesure.niveau_gel, models.Mesure.niveau_batterie
+).where(
+    models.Mesure.id_borne == bindparam("id_borne")
+).order_by(models.Mesure.horodatage.desc()).limit(1)
+
+DERNIERES_MESURES = select(
+    models.Mesure.id_mesure,
+    models.Mesure.id_borne,
+    models.Mesure.niveau_gel,
+    models.Mesure.niveau_batterie,
+    models.Mesure.horodatage,
+    models.Mesure.sequence
+).where(
+    models.Mesure.id_borne == bindparam("id_borne")
+).order_by(
+    models.Mesure.horodatage.desc(), models.Mesure.id_mesure.desc()
+).limit(bindparam("limite"))
+
+ALERTES_ACTIVES = select(models.Alerte).where(
+    models.Alerte.statut.in_(STATUTS_ACTIFS)
+).order_by(models.Alerte.date_declenchement.desc())
+
+ALERTES_ACTIVES_BORNE = ALERTES_ACTIVES.where(models.Alerte.id_borne == bindparam("id_borne"))
+
+# Nom de chaque requête dans les statistiques
+REQUETES = {
+    "borne_par_uuid": BORNE_PAR_UUID,
+    "sel_borne_par_uuid": SEL_BORNE_PAR_UUID,
+    "utilisateur_par_email": UTILISATEUR_PAR_EMAIL,
+    "precedente_mesure": PRECEDENTE_MESURE,
+    "dernieres_mesures": DERNIERES_MESURES,
+    "alertes_actives": ALERTES_ACTIVES,
+    "alertes_actives_borne": ALERTES_ACTIVES_BORNE,
+}
+
+
+def borne_par_uuid(db: Session, uuid_esp: str) -> Optional[models.Borne]:
+    return db.scalars(BORNE_PAR_UUID, {"uuid_esp": uuid_esp}).first()
+
+
+def sel_borne_par_uuid(db: Session, uuid_esp: str) -> Optional[str]:
+    return db.scalar(SEL_BORNE_PAR_UUID, {"uuid_esp": uuid_esp})
+
+
+def utilisateur_par_email(db: Session, email: str) -> Optional[models.Utilisateur]:
+    return db.scalars(UTILISATEUR_PAR_EMAIL, {"email": email}).first()
+
+
+def precedente_mesure(db: Session, id_borne: int) -> Optional[Tuple]:
+    """(horodatage, niveau_gel, niveau_batterie) de la mesure la plus récente de la borne."""
+    derniere = db.execute(PRECEDENTE_MESURE, {"id_borne": id_borne}).first()
+    return tuple(derniere) if derniere else None
+
+
+def dernieres_mesures(db: Session, id_borne: int, limite: int) -> List[dict]:
+    return [ligne._asdict() for ligne in db.execute(DERNIERES_MESURES, {"id_borne": id_borne, "limite": limite})]
+
+
+def alertes_actives(db: Session, id_borne: Optional[int] = None) -> List[models.Alerte]:
+    if id_borne:
+        return db.scalars(ALERTES_ACTIVES_BORNE, {"id_borne": id_borne}).all()
+    return db.scalars(ALERTES_ACTIVES).all()
+
+
+# --- Statistiques du cache des instructions compilées ---
+
+# Résultat de la recherche dans le cache, tel que noté par SQLAlchemy
+_ISSUES = {
+    CacheStats.CACHE_HIT: "trouvees",
+    CacheStats.CACHE_MISS: "compilees",
+    CacheStats.CACHING_DISABLED: "sans_cache",
+    CacheStats.NO_CACHE_KEY: "sans_cache",
+    CacheStats.NO_DIALECT_SUPPORT: "sans_cache",
+}
+
+_par_moteur: Dict[str, Counter] = defaultdict(Counter)
+_par_requete: Dict[str, Counter] = defaultdict(Counter)
+_noms = {id(requete): nom for nom, requete in REQUETES.items()}
+_moteurs_suivis = set()
+
+
+def suivre_cache(moteur, nom: str):
+    """Compte, pour ce moteur, les exécutions servies par le cache des instructions compilées."""
+    if id(moteur) in _moteurs_suivis:
+        return  # Moteur partagé par plusieurs pools (SQLite en mémoire) : compté une fois
+    _moteurs_suivis.add(id(moteur))
+
+    @event.listens_for(moteur, "before_cursor_execute")
+    def _noter(conn, cursor, statement, parameters, context, executemany):
+        issue = _ISSUES.get(context.cache_hit, "sans_cache")
+        _par_moteur[nom][issue] += 1
+        requete = _noms.get(id(context.invoked_statement))
+        if requete is not None:
+            _par_requete[requete][issue] += 1
+
+
+def _taux(compteurs: Counter) -> dict:
+    total = sum(compteurs.values())
+    return {
+        **{issue: compteurs[issue] for issue in ("trouvees", "compilees", "sans_cache")},
+        "taux_cache": round(compteurs["trouvees"] / total, 4) if total else None,
+    }
+
+
+def statistiques() -> dict:
+    """Exécutions par moteur et par requête chaude : trouvées dans le cache, compilées, hors cache."""
+    return {
+        "moteurs": {nom: _taux(compteurs) for nom, compteurs in _par_moteur.items()},
+        "requetes": {nom: _taux(_par_requete[nom]) for nom in REQUETES},
+    }
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Hors POSIX, seul le verrou du processus protège les fichiers
+    fcntl = None
+
+from app.core.config import settings
+from app.core.depot_mesures import DepotMesures, resume_intervalle
+
+logger = logging.getLogger("uvicorn.error")
+
+# Une mesure = 26 octets à largeur fixe (horodatage en µs epoch UTC)
+ENREGISTREMENT = np.dtype([
+    ("horodatage", "<i8"),
+    ("id_mesure", "<i8"),
+    ("sequence", "<i8"),
+    ("niveau_gel", "i1"),
+    ("niveau_batterie", "i1"),
+])
+SANS_SEQUENCE = -1
+EPOCH = datetime(1970, 1, 1)
+
+# Segment compacté (trié par horodatage) et journal des ajouts du jour
+EXT_SEGMENT = ".seg"
+EXT_JOURNAL = ".journal"
+# Dernier rang d'ID attribué aux mesures de la borne (8 octets, petit-boutiste)
+FICHIER_COMPTEUR = ".compteur"
+
+MesureEnregistree = namedtuple(
+    "MesureEnregistree", "id_mesure id_borne niveau_gel niveau_batterie horodatage sequence"
+)
+DerniereMesure = namedtuple("DerniereMesure", "niveau_gel niveau_batterie horodatage")
+
+
+def _en_microsecondes(horodatage: datetime) -> int:
+    return (horodatage - EPOCH) // timedelta(microseconds=1)
+
+
+def _depuis_microsecondes(valeur) -> datetime:
+    return EPOCH + timedelta(microseconds=int(valeur))
+
+
+def _en_dict(id_borne: int, ligne) -> dict:
+    sequence = int(ligne["sequence"])
+    return {
+        "id_mesure": int(ligne["id_mesure"]),
+        "id_borne": id_borne,
+        "niveau_gel": int(ligne["niveau_gel"]),
+        "niveau_batterie": int(ligne["niveau_batterie"]),
+        "horodatage": _depuis_microsecondes(ligne["horodatage"]),
+        "sequence": None if sequence == SANS_SEQUENCE else sequence,
+    }
+
+
+def _lire_fichier(chemin: str, memoire: bool) -> np.ndarray:
+    """Lit un fichier d'enregistrements ; un enregistrement tronqué (arrêt brutal) est ignoré."""
+    try:
+        nb = os.path.getsize(chemin) // ENREGISTREMENT.itemsize
+    except FileNotFoundError:
+        nb = 0
+    if nb == 0:
+        return np.empty(0, dtype=ENREGISTREMENT)
+    if memoire:
+        return np.memmap(chemin, dtype=ENREGISTREMENT, mode="r", shape=(nb,))
+    return np.fromfile(chemin, dtype=ENREGISTREMENT, count=nb)
+
+
+class DepotMesuresSegments(DepotMesures):
+    """
+    Stockage des mesures brutes en segments colonnaires, hors SQL.
+
+    Un dossier par borne, un couple de fichiers par jour (UTC) :
+    - `AAAAMMJJ.journal` : ajouts en fin de fichier, dans l'ordre d'arrivée
+    - `AAAAMMJJ.seg` : segment compacté, trié par horodatage, lu en memmap
+
+    Les lectures d'un segment compacté sont sans copie (recherche
+    dichotomique sur l'horodatage puis tranche du memmap) ; le compactage
+    en tâche de fond fusionne les journaux dans les segments.
+    Bornes, alertes et interventions restent en base SQL.
+    """
+
+    jointure_sql = False
+
+    def __init__(self, dossier: str):
+        self.dossier = dossier
+        os.makedirs(dossier, exist_ok=True)
+        self._verrous = {}
+        self._compteurs_verifies = set()
+        self._lock = Lock()
+
+    def _dossier_borne(self, id_borne: int) -> str:
+        return os.path.join(self.dossier, str(id_borne))
+
+    def _jours(self, id_borne: int) -> List[str]:
+        try:
+            noms = os.listdir(self._dossier_borne(id_borne))
+        except FileNotFoundError:
+            return []
+        return sorted({nom.split(".")[0] for nom in noms if nom.endswith((EXT_SEGMENT, EXT_JOURNAL))})
+
+    @contextmanager
+    def _verrou(self, id_borne: int):
+        """Verrou de la borne, partagé avec les autres processus (flock) quand c'est possible."""
+        with self._lock:
+            verrou = self._verrous.setdefault(id_borne, Lock())
+        dossier = self._dossier_borne(id_borne)
+        os.makedirs(dossier, exist_ok=True)
+        with verrou, open(os.path.join(dossier, ".verrou"), "a") as fichier:
+            if fcntl is not None:
+                fcntl.flock(fichier, fcntl.LOCK_EX)
+            yield dossier
+
+    def _lire_jour(self, dossier: str, jour: str) -> np.ndarray:
+        """Mesures d'un jour triées par horodatage (sans copie si le journal est vide)."""
+        segment = _lire_fichier(os.path.join(dossier, jour + EXT_SEGMENT), memoire=True)
+        journal = _lire_fichier(os.path.join(dossier, jour + EXT_JOURNAL), memoire=False)
+        if len(journal) == 0:
+            return segment
+        tout = np.concatenate([segment, journal])
+        tout = tout[np.lexsort((tout["id_mesure"], tout["horodatage"]))]
+        # Journal déjà fusionné dans le segment (arrêt entre os.replace et os.remove du compactage)
+        return tout[np.r_[True, tout["id_mesure"][1:] != tout["id_mesure"][:-1]]]
+
+    def _prochain_id(self, id_borne: int, dossier: str) -> int:
+        """
+        ID de la prochaine mesure, sous le verrou de la borne.
+
+        ID = (id_borne << 32) | rang de la mesure : unique sans base, et sûr en
+        JavaScript (< 2^53). Le dernier rang est lu et réécrit dans le dossier
+        de la borne, partagé par tous les processus. Au premier usage par le
+        processus, il est aussi recalculé depuis les mesures : une écriture du
+        compteur peut être perdue par un arrêt brutal du système.
+        """
+        descripteur = os.open(os.path.join(dossier, FICHIER_COMPTEUR), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            compteur = int.from_bytes(os.read(descripteur, 8), "little")
+            if id_borne not in self._compteurs_verifies:
+                for jour in self._jours(id_borne):
+                    mesures = self._lire_jour(dossier, jour)
+                    if len(mesures):
+                        compteur = max(compteur, int(mesures["id_mesure"].max()) & 0xFFFFFFFF)
+                self._compteurs_verifies.add(id_borne)
+            compteur += 1
+            # 8 octets en place, sans troncature : un arrêt du processus ne laisse pas de compteur vide
+            os.lseek(descripteur, 0, os.SEEK_SET)
+            os.write(descripteur, compteur.to_bytes(8, "little"))
+        finally:
+            os.close(descripteur)
+        return (id_borne << 32) | compteur
+
+    def _chercher_renvoi(self, id_borne: int, dossier: str, sequence: int, jours, horodatage: Optional[datetime],
+                         niveau_gel: int, niveau_batterie: int, limite: datetime) -> Optional[MesureEnregistree]:
+        """Mesure dont celle-ci est un renvoi : même horodatage, ou mêmes niveaux depuis `limite` sans horodatage."""
+        for jour in jours:
+            mesures = self._lire_jour(dossier, jour)
+            retenues = mesures["sequence"] == sequence
+            if horodatage is not None:
+                retenues &= mesures["horodatage"] == _en_microsecondes(horodatage)
+            else:
+                retenues &= (
+                    (mesures["niveau_gel"] == niveau_gel)
+                    & (mesures["niveau_batterie"] == niveau_batterie)
+                    & (mesures["horodatage"] >= _en_microsecondes(limite))
+                )
+            trouvees = np.nonzero(retenues)[0]
+            if len(trouvees):
+                return MesureEnregistree(**_en_dict(id_borne, mesures[trouvees[-1]]))
+        return None
+
+    def precedente(self, db, id_borne):
+        dernieres = self.dernieres(db, id_borne, 1)
+        if not dernieres:
+            return None
+        return dernieres[0]["horodatage"], dernieres[0]["niveau_gel"], dernieres[0]["niveau_batterie"]
+
+    def ajouter(self, db, id_borne, niveau_gel, niveau_batterie, horodatage, sequence):
+        # Précision de la seconde, comme une colonne DATETIME
+        maintenant = datetime.utcnow().replace(microsecond=0)
+        limite = maintenant - timedelta(seconds=settings.DEDUP_DUREE_SECONDES)
+        if horodatage is not None:
+            jours = {horodatage.strftime("%Y%m%d")}
+        else:
+            jours = {maintenant.strftime("%Y%m%d"), limite.strftime("%Y%m%d")}
+        envoye, horodatage = horodatage, horodatage or maintenant
+        jour = horodatage.strftime("%Y%m%d")
+
+        with self._verrou(id_borne) as dossier:
+            if sequence is not None:
+                # Renvoi non présent dans la fenêtre mémoire (ex: après redémarrage) : jour de la mesure
+                # ou, sans horodatage envoyé, jours couverts par DEDUP_DUREE_SECONDES
+                existante = self._chercher_renvoi(
+                    id_borne, dossier, sequence, jours, envoye, niveau_gel, niveau_batterie, limite
+                )
+                if existante:
+                    return existante, True
+
+            mesure = MesureEnregistree(
+                self._prochain_id(id_borne, dossier), id_borne, niveau_gel, niveau_batterie, horodatage, sequence
+            )
+            enregistrement = np.array([(
+                _en_microsecondes(horodatage), mesure.id_mesure,
+                SANS_SEQUENCE if sequence is None else sequence,
+                niveau_gel, niveau_batterie
+            )], dtype=ENREGISTREMENT)
+            with open(os.path.join(dossier, jour + EXT_JOURNAL), "ab") as fichier:
+                fichier.write(enregistrement.tobytes())
+                fichier.flush()
+                os.fsync(fichier.fileno())
+        return mesure, False
+
+    def dernieres(self, db, id_borne, limite):
+        resultat = []
+        jours = self._jours(id_borne)
+        if not jours:
+            return resultat
+        with self._verrou(id_borne) as dossier:
+            for jour in reversed(jours):
+                mesures = self._lire_jour(dossier, jour)
+                for index in range(len(mesures) - 1, -1, -1):
+                    resultat.append(_en_dict(id_borne, mesures[index]))
+                    if len(resultat) >= limite:
+                        return resultat
+        return resultat
+
+    def statistiques(self, db, id_borne):
+        total = somme_gel = somme_batterie = 0
+        jours = self._jours(id_borne)
+        if jours:
+            with self._verrou(id_borne) as dossier:
+                for jour in jours:
+                    mesures = self._lire_jour(dossier, jour)
+                    total += len(mesures)
+                    somme_gel += int(mesures["niveau_gel"].sum(dtype=np.int64))
+                    somme_batterie += int(mesures["niveau_batterie"].sum(dtype=np.int64))
+        if not total:
+            return 0, None, None
+        return total, somme_gel / total, somme_batterie / total
+
+    def agregats(self, db, id_borne, debut, fin, pas_secondes):
+        premier, dernier = debut.strftime("%Y%m%d"), fin.strftime("%Y%m%d")
+        jours = [jour for jour in self._jours(id_borne) if premier <= jour <= dernier]
+        if not jours:
+            return []
+
+        debut_us, fin_us = _en_microsecondes(debut), _en_microsecondes(fin)
+        tranches = []
+        with self._verrou(id_borne) as dossier:
+            for jour in jours:
+                mesures = self._lire_jour(dossier, jour)
+                horodatages = mesures["horodatage"]
+                bornes = np.searchsorted(horodatages, [debut_us, fin_us])
+                tranches.append(np.array(mesures[bornes[0]:bornes[1]]))
+        mesures = np.concatenate(tranches)
+        if not len(mesures):
+            return []
+
+        # Mesures triées : chaque intervalle est une plage contiguë, réduite en une passe
+        rangs = (mesures["horodatage"] - debut_us) // (pas_secondes * 1_000_000)
+        debuts = np.flatnonzero(np.r_[True, rangs[1:] != rangs[:-1]])
+        nb = np.diff(np.r_[debuts, len(mesures)])
+        gel = mesures["niveau_gel"].astype(np.int64)
+        batterie = mesures["niveau_batterie"].astype(np.int64)
+        origine = debut_us // 1_000_000
+        return [
+            resume_intervalle(origine + int(rangs[d]) * pas_secondes, int(n), s_gel, g_min, g_max, s_bat, b_min, b_max)
+            for d, n, s_gel, g_min, g_max, s_bat, b_min, b_max in zip(
+                debuts, nb,
+                np.add.reduceat(gel, debuts), np.minimum.reduceat(gel, debuts), np.maximum.reduceat(gel, debuts),
+                np.add.reduceat(batterie, debuts), np.minimum.reduceat(batterie, debuts), np.maximum.reduceat(batterie, debuts),
+            )
+        ]
+
+    def dernieres_flotte(self):
+        resultat = {}
+        for nom in os.listdir(self.dossier):
+            if not nom.isdigit():
+                continue
+            dernieres = self.dernieres(None, int(nom), 1)
+            if dernieres:
+                derniere = dernieres[0]
+                resultat[int(nom)] = DerniereMesure(derniere["niveau_gel"], derniere["niveau_batterie"], derniere["horodatage"])
+        return resultat
+
+    def compacter(self) -> int:
+        """Fusionne les journaux dans les segments triés ; retourne le nombre de journaux traités."""
+        nb = 0
+        for nom in os.listdir(self.dossier):
+            if not nom.isdigit():
+                continue
+            id_borne = int(nom)
+            with self._verrou(id_borne) as dossier:
+                for fichier in sorted(os.listdir(dossier)):
+                    if not fichier.endswith(EXT_JOURNAL):
+                        continue
+                    jour = fichier[:-len(EXT_JOURNAL)]
+                    mesures = self._lire_jour(dossier, jour)
+                    temporaire = os.path.join(dossier, jour + EXT_SEGMENT + ".tmp")
+                    with open(temporaire, "wb") as sortie:
+                        sortie.write(mesures.tobytes())
+                        sortie.flush()
+                        os.fsync(sortie.fileno())
+                    # Les lecteurs qui ont l'ancien segment en memmap le gardent jusqu'à la fin de leur lecture
+                    os.replace(temporaire, os.path.join(dossier, jour + EXT_SEGMENT))
+                    os.remove(os.path.join(dossier, fichier))
+                    nb += 1
+        return nb
+
+
+async def boucle_compactage(depot: DepotMesuresSegments):
+    """Tâche de fond : compacte périodiquement les journaux de mesures."""
+    while True:
+        await asyncio.sleep(settings.SEGMENTS_COMPACTAGE_SECONDES)
+        try:
+            nb = await asyncio.to_thread(depot.compacter)
+            if nb:
+                logger.info(f"{nb} journal(aux) de mesures compacté(s)")
+        except Exception as e:
+            logger.error(f"Erreur du compactage des segments: {str(e)}")
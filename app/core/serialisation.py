@@ -0,0 +1,121 @@
+import gzip
+from calendar import timegm
+from typing import List, Optional
+
+from fastapi import HTTPException, Request, Response, status
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack est optionnel
+    msgpack = None
+
+from pydantic_core import to_json
+
+# Types de contenu acceptés pour l'historique des mesures
+TYPE_COLONNES = "application/vnd.bornegel.colonnes+json"
+TYPE_MSGPACK = "application/x-msgpack"
+
+# En dessous de cette taille, la compression ne vaut pas le coût CPU
+TAILLE_MIN_COMPRESSION = 1024
+
+
+def encoder_json(donnees) -> bytes:
+    """Encode en JSON avec orjson s'il est installé, sinon avec le sérialiseur natif de pydantic."""
+    if orjson is not None:
+        return orjson.dumps(donnees, option=orjson.OPT_NON_STR_KEYS)
+    return to_json(donnees)
+
+
+def reponse_json(donnees, status_code: int = 200) -> Response:
+    """
+    Sérialise directement des données internes de confiance (dicts, listes, dates).
+
+    Contourne la revalidation par le response_model de FastAPI : à réserver aux
+    données construites par l'API elle-même (lignes SQL), pas aux entrées client.
+    """
+    return Response(content=encoder_json(donnees), status_code=status_code, media_type="application/json")
+
+
+def mesures_en_colonnes(lignes: List[dict]) -> dict:
+    """
+    Convertit une liste de mesures (toutes de la même borne) en tableaux par colonne.
+
+    - `horodatage` en secondes epoch (UTC)
+    - `id_mesure` encodé en deltas : premier ID puis écarts successifs
+    """
+    ids = [ligne["id_mesure"] for ligne in lignes]
+    return {
+        "n": len(lignes),
+        "id_borne": lignes[0]["id_borne"] if lignes else None,
+        "id_mesure": {
+            "premier": ids[0] if ids else None,
+            "deltas": [ids[i] - ids[i - 1] for i in range(1, len(ids))],
+        },
+        "horodatage": [timegm(ligne["horodatage"].utctimetuple()) for ligne in lignes],
+        "niveau_gel": [ligne["niveau_gel"] for ligne in lignes],
+        "niveau_batterie": [ligne["niveau_batterie"] for ligne in lignes],
+        "sequence": [ligne.get("sequence") for ligne in lignes],
+    }
+
+
+def choisir_format(request: Request, format_demande: Optional[str]) -> str:
+    """Choisit le format de réponse : paramètre `format` en priorité, sinon en-tête Accept."""
+    if format_demande:
+        return format_demande
+    accept = request.headers.get("accept", "")
+    if TYPE_MSGPACK in accept:
+        return "msgpack"
+    if TYPE_COLONNES in accept:
+        return "columnar"
+    return "json"
+
+
+def _compresser(request: Request, contenu: bytes) -> tuple:
+    """Compresse selon Accept-Encoding (brotli de préférence, sinon gzip)."""
+    if len(contenu) < TAILLE_MIN_COMPRESSION:
+        return contenu, None
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if brotli is not None and "br" in accept_encoding:
+        return brotli.compress(contenu, quality=5), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(contenu, compresslevel=6), "gzip"
+    return contenu, None
+
+
+def reponse_mesures(request: Request, lignes: List[dict], format_demande: Optional[str] = None) -> Response:
+    """
+    Construit la réponse d'un historique de mesures dans le format négocié.
+
+    - `json` : liste d'objets (format historique)
+    - `columnar` : tableaux par colonne en JSON
+    - `msgpack` : tableaux par colonne en MessagePack
+    """
+    format_reponse = choisir_format(request, format_demande)
+
+    if format_reponse == "msgpack":
+        if msgpack is None:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail="Format MessagePack indisponible sur ce serveur"
+            )
+        contenu, media_type = msgpack.packb(mesures_en_colonnes(lignes)), TYPE_MSGPACK
+    elif format_reponse == "columnar":
+        contenu, media_type = encoder_json(mesures_en_colonnes(lignes)), TYPE_COLONNES
+    else:
+        contenu, media_type = encoder_json(lignes), "application/json"
+
+    contenu, encodage = _compresser(request, contenu)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encodage:
+        headers["Content-Encoding"] = encodage
+    return Response(content=contenu, media_type=media_type, headers=headers)
@@ -0,0 +1,206 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, UniqueConstraint, and_, create_engine, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.core.config import settings
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger("uvicorn.error")
+
+# Shard des sites absents de SHARDS_SITES : la base principale (DATABASE_URL)
+PRINCIPAL = "principal"
+
+
+def _table_mesures_shard(metadata: MetaData) -> Table:
+    """
+    Copie de la table `mesures` sans clé étrangère, pour un shard.
+
+    Les bornes restent dans la base principale : un shard ne stocke que des
+    mesures, avec les mêmes colonnes, index et contrainte d'unicité.
+    """
+    source = models.Mesure.__table__
+    table = Table(source.name, metadata, *[
+        Column(
+            colonne.name, colonne.type,
+            primary_key=colonne.primary_key,
+            nullable=colonne.nullable,
+            server_default=colonne.server_default.arg if colonne.server_default is not None else None
+        ) for colonne in source.columns
+    ])
+    for index in source.indexes:
+        Index(index.name, *[table.c[colonne.name] for colonne in index.columns], unique=index.unique)
+    for contrainte in source.constraints:
+        if isinstance(contrainte, UniqueConstraint):
+            table.append_constraint(UniqueConstraint(*[colonne.name for colonne in contrainte.columns], name=contrainte.name))
+    return table
+
+
+class CarteShards:
+    """
+    Répartition du stockage des mesures par site.
+
+    Chaque site est rattaché à un shard (une base de données) ; les sites
+    non configurés restent dans la base principale, qui garde aussi bornes,
+    sites, alertes et interventions. Une borne est routée via son site.
+
+    Sans shard configuré, toutes les sessions sont celles de la base
+    principale : aucun coût supplémentaire. Changer une borne de site ne
+    déplace pas son historique vers le nouveau shard : les lectures par
+    borne du dépôt SQL le complètent avec les autres shards (`repartir`).
+    """
+
+    def __init__(self, urls: Dict[str, str], sites: Dict[int, str], parallelisme: int):
+        self._fabriques = {PRINCIPAL: SessionLocal}
+        self._moteurs = {PRINCIPAL: engine}
+        for nom, url in urls.items():
+            self._moteurs[nom] = create_engine(url, pool_pre_ping=True)
+            self._fabriques[nom] = sessionmaker(autocommit=False, autoflush=False, bind=self._moteurs[nom])
+
+        inconnus = set(sites.values()) - set(self._moteurs)
+        if inconnus:
+            raise ValueError(f"Shards inconnus dans SHARDS_SITES: {', '.join(sorted(inconnus))}")
+        self._sites = dict(sites)
+        self._parallelisme = parallelisme
+
+    @property
+    def active(self) -> bool:
+        """Vrai si des mesures sont stockées hors de la base principale."""
+        return len(self._moteurs) > 1
+
+    @property
+    def noms(self) -> List[str]:
+        return list(self._moteurs)
+
+    def url(self, nom: str):
+        """URL de la base du shard (ex: connexion dédiée avec d'autres options)."""
+        return self._moteurs[nom].url
+
+    def moteur(self, nom: str):
+        return self._moteurs[nom]
+
+    def shard_du_site(self, id_site: Optional[int]) -> str:
+        return self._sites.get(id_site, PRINCIPAL)
+
+    def shard_de_borne(self, db: Session, id_borne: int) -> str:
+        """
+        Shard d'une borne, via son site.
+
+        Le site est relu à chaque appel (clé primaire) : un autre processus
+        a pu changer la borne de site.
+        """
+        if not self.active:
+            return PRINCIPAL
+        return self.shard_du_site(db.scalar(select(models.Borne.id_site).where(models.Borne.id_borne == id_borne)))
+
+    def shard_de_session(self, session: Session) -> str:
+        """Shard d'une session ouverte par `ouvrir` (base principale pour toute autre session)."""
+        moteur = session.get_bind()
+        for nom, moteur_shard in self._moteurs.items():
+            if nom != PRINCIPAL and moteur_shard is moteur:
+                return nom
+        return PRINCIPAL
+
+    def ouvrir(self, db: Session, nom: str) -> Session:
+        """
+        Session du shard `nom`.
+
+        Pour la base principale, la session de la requête est réutilisée
+        (même transaction) ; sinon une session dédiée est ouverte, à libérer
+        avec `fermer`.
+        """
+        return db if nom == PRINCIPAL else self._fabriques[nom]()
+
+    def ouvrir_site(self, db: Session, id_site: Optional[int]) -> Session:
+        return self.ouvrir(db, self.shard_du_site(id_site))
+
+    @staticmethod
+    def fermer(db: Session, session: Session):
+        """Ferme une session de shard (annule ce qui n'a pas été validé)."""
+        if session is not db:
+            session.close()
+
+    @contextmanager
+    def session_borne(self, db: Session, id_borne: int) -> Iterator[Session]:
+        """Session du shard qui stocke les mesures d'une borne."""
+        session = self.ouvrir(db, self.shard_de_borne(db, id_borne))
+        try:
+            yield session
+        finally:
+            self.fermer(db, session)
+
+    def repartir(self, requete: Callable[[Session], Any], noms: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Exécute `requete` sur chaque shard (ou ceux de `noms`) en parallèle et retourne ses résultats par shard.
+
+        Chaque shard reçoit sa propre session ; la fusion est laissée à l'appelant.
+        """
+        def executer(nom: str):
+            session = self._fabriques[nom]()
+            try:
+                return requete(session)
+            finally:
+                session.close()
+
+        noms = list(self._fabriques) if noms is None else list(noms)
+        if len(noms) <= 1:
+            return {nom: executer(nom) for nom in noms}
+        with ThreadPoolExecutor(max_workers=min(self._parallelisme, len(noms))) as pool:
+            futurs = {nom: pool.submit(executer, nom) for nom in noms}
+            return {nom: futur.result() for nom, futur in futurs.items()}
+
+    def creer_tables(self):
+        """Crée la table des mesures sur les shards qui ne l'ont pas encore."""
+        for nom, moteur in self._moteurs.items():
+            if nom == PRINCIPAL:
+                continue  # Schéma géré par les migrations Alembic
+            metadata = MetaData()
+            _table_mesures_shard(metadata)
+            metadata.create_all(moteur, checkfirst=True)
+            logger.info(f"Shard de mesures '{nom}' prêt")
+
+
+def dernieres_mesures_flotte() -> Dict[int, Any]:
+    """
+    Dernière mesure de chaque borne, tous shards confondus.
+
+    Une requête groupée par shard, en parallèle. Si une borne a des mesures
+    dans plusieurs shards (changement de site), la plus récente l'emporte.
+    """
+    def requete(session: Session):
+        derniere_date = select(
+            models.Mesure.id_borne,
+            func.max(models.Mesure.horodatage).label("horodatage")
+        ).group_by(models.Mesure.id_borne).subquery()
+        # En cas d'égalité d'horodatage, la mesure d'ID le plus élevé l'emporte
+        lignes = session.execute(
+            select(
+                models.Mesure.id_borne,
+                models.Mesure.niveau_gel,
+                models.Mesure.niveau_batterie,
+                models.Mesure.horodatage
+            ).join(
+                derniere_date,
+                and_(
+                    derniere_date.c.id_borne == models.Mesure.id_borne,
+                    derniere_date.c.horodatage == models.Mesure.horodatage
+                )
+            ).order_by(models.Mesure.id_mesure)
+        )
+        return {ligne.id_borne: ligne for ligne in lignes}
+
+    fusion = {}
+    for resultat in carte_shards.repartir(requete).values():
+        for id_borne, ligne in resultat.items():
+            actuelle = fusion.get(id_borne)
+            if actuelle is None or ligne.horodatage > actuelle.horodatage:
+                fusion[id_borne] = ligne
+    return fusion
+
+
+# Instance partagée par le processus
+carte_shards = CarteShards(settings.SHARDS_MESURES, settings.SHARDS_SITES, settings.SHARDS_PARALLELISME)
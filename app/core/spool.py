@@ -0,0 +1,559 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from calendar import timegm
+from collections import namedtuple
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Hors POSIX, un seul processus doit utiliser le dossier du spool
+    fcntl = None
+
+from sqlalchemy import select
+
+from app import models
+from app.core.alerts import detecter_interventions, resoudre_alertes, verifier_et_creer_alertes
+from app.core.config import settings
+from app.core.depot_mesures import depot_mesures
+from app.core.disjoncteur import disjoncteur_base, est_panne_base
+from app.core.evenements import ALERTES_MODIFIEES, publier
+from app.core.filtrage import filtre_mesures
+from app.core.heatmaps import accumulateur_heatmaps, consommation
+from app.core.journal import journaliser
+from app.core.hors_ligne import suivi_hors_ligne
+from app.core.shards import carte_shards
+from app.core.tampon_mesures import cache_mesures
+
+logger = logging.getLogger("uvicorn.error")
+
+# Enregistrement = en-tête (longueur et CRC32 du corps) + corps
+ENTETE = struct.Struct("<HI")
+# gel, batterie, horodatage et réception (secondes epoch UTC), séquence ; suivi de l'uuid_esp en UTF-8.
+# Horodatages non signés : MesureCreate refuse les dates antérieures à 1970
+CORPS = struct.Struct("<BBIIq")
+SANS_SEQUENCE = -1
+# Position de relecture : numéro de fichier, décalage dans le fichier
+POSITION = struct.Struct("<QQ")
+EXT = ".spool"
+
+MesureEnAttente = namedtuple(
+    "MesureEnAttente", "uuid_esp niveau_gel niveau_batterie horodatage reception sequence"
+)
+
+
+class SpoolPlein(Exception):
+    """Le spool a atteint SPOOL_TAILLE_MAX_OCTETS."""
+
+
+def _en_secondes(horodatage: datetime) -> int:
+    return timegm(horodatage.utctimetuple())
+
+
+def encoder(mesure: MesureEnAttente) -> bytes:
+    corps = CORPS.pack(
+        mesure.niveau_gel, mesure.niveau_batterie,
+        _en_secondes(mesure.horodatage), _en_secondes(mesure.reception),
+        SANS_SEQUENCE if mesure.sequence is None else mesure.sequence
+    ) + mesure.uuid_esp.encode("utf-8")
+    return ENTETE.pack(len(corps), zlib.crc32(corps)) + corps
+
+
+def decoder(corps: bytes) -> MesureEnAttente:
+    gel, batterie, horodatage, reception, sequence = CORPS.unpack_from(corps)
+    return MesureEnAttente(
+        corps[CORPS.size:].decode("utf-8"), gel, batterie,
+        datetime.utcfromtimestamp(horodatage), datetime.utcfromtimestamp(reception),
+        None if sequence == SANS_SEQUENCE else sequence
+    )
+
+
+def _lire_enregistrements(donnees: bytes, debut: int = 0):
+    """Itère sur (fin, corps) des enregistrements complets et intègres à partir de `debut`."""
+    position = debut
+    while position + ENTETE.size <= len(donnees):
+        longueur, crc = ENTETE.unpack_from(donnees, position)
+        fin = position + ENTETE.size + longueur
+        corps = donnees[position + ENTETE.size:fin]
+        if fin > len(donnees) or zlib.crc32(corps) != crc:
+            return  # Écriture interrompue par un arrêt brutal
+        yield fin, corps
+        position = fin
+
+
+class Spool:
+    """
+    File locale des mesures reçues pendant une panne de la base de données.
+
+    Fichiers en ajout seul, découpés en morceaux de SPOOL_TAILLE_FICHIER_OCTETS ;
+    chaque enregistrement est préfixé de sa longueur et de son CRC32, ce qui
+    permet d'écarter une fin de fichier tronquée après un arrêt brutal.
+
+    Les écritures concurrentes sont regroupées en un seul fsync (quelques
+    millisecondes d'attente) avant de répondre à l'ESP32. La position de
+    relecture est écrite à part, de façon atomique, après chaque lot rejoué ;
+    les fichiers entièrement rejoués sont supprimés. Entre l'insertion d'un
+    lot et l'évaluation de ses alertes, un point de reprise (`insertion`)
+    évite de le réinsérer si l'évaluation échoue.
+
+    Chaque processus prend un sous-dossier `instance-N` libre (verrou flock),
+    et reprend donc au redémarrage les mesures laissées par un processus arrêté.
+    """
+
+    def __init__(self, dossier: str, taille_fichier: int, taille_max: int, delai_fsync_ms: float):
+        self.taille_fichier = taille_fichier
+        self.taille_max = taille_max
+        self.delai_fsync = delai_fsync_ms / 1000
+        self._lock = Lock()
+        self.dossier = self._reserver_dossier(dossier)
+
+        self._fichier_lu, self._decalage_lu = self._lire_position()
+        numeros = self._numeros()
+        if not numeros or numeros[-1] < self._fichier_lu:
+            numeros.append(self._fichier_lu)
+        self._fichier_ecrit = numeros[-1]
+        self._supprimer_avant(self._fichier_lu)
+
+        # Enregistrements en attente et fin de la dernière écriture intègre
+        self.en_attente = 0
+        self.octets = 0
+        for numero in self._numeros():
+            decalage = self._decalage_lu if numero == self._fichier_lu else 0
+            with open(self._chemin(numero), "rb") as f:
+                donnees = f.read()
+            fin = decalage
+            for fin, _ in _lire_enregistrements(donnees, decalage):
+                self.en_attente += 1
+            if numero == self._fichier_ecrit and fin < len(donnees):
+                logger.warning(f"Spool : fin de {self._chemin(numero)} tronquée ({len(donnees) - fin} octets)")
+                os.truncate(self._chemin(numero), fin)
+            self.octets += min(fin, len(donnees)) - decalage
+
+        self._fd = os.open(self._chemin(self._fichier_ecrit), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._taille_ecrite = os.fstat(self._fd).st_size
+
+        # Fichiers pleins, synchronisés et fermés par le prochain fsync groupé
+        self._pleins: List[int] = []
+
+        # Compteurs pour le regroupement des fsync et les métriques
+        self._ecrits = 0
+        self._synchronises = 0
+        self._synchronisation = None
+        self.rejouees = 0
+        self.ignorees = 0
+
+    def _reserver_dossier(self, racine: str) -> str:
+        os.makedirs(racine, exist_ok=True)
+        rang = 0
+        while True:
+            dossier = os.path.join(racine, f"instance-{rang}")
+            os.makedirs(dossier, exist_ok=True)
+            if fcntl is None:
+                return dossier
+            # Le descripteur reste ouvert : le verrou dure autant que le processus
+            self._verrou = open(os.path.join(dossier, ".verrou"), "a")
+            try:
+                fcntl.flock(self._verrou, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return dossier
+            except OSError:
+                self._verrou.close()
+                rang += 1
+
+    def _chemin(self, numero: int) -> str:
+        return os.path.join(self.dossier, f"{numero:012d}{EXT}")
+
+    def _numeros(self) -> List[int]:
+        return sorted(int(nom[:-len(EXT)]) for nom in os.listdir(self.dossier) if nom.endswith(EXT))
+
+    def _lire_position(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.dossier, "position"), "rb") as f:
+                return POSITION.unpack(f.read(POSITION.size))
+        except (FileNotFoundError, struct.error):
+            return 1, 0
+
+    def _synchroniser_dossier(self):
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.dossier, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _ecrire_atomique(self, nom: str, donnees: bytes):
+        # Écriture atomique : fichier temporaire synchronisé puis renommé
+        temporaire = os.path.join(self.dossier, nom + ".tmp")
+        with open(temporaire, "wb") as f:
+            f.write(donnees)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporaire, os.path.join(self.dossier, nom))
+        self._synchroniser_dossier()
+
+    def _ecrire_position(self, numero: int, decalage: int):
+        self._ecrire_atomique("position", POSITION.pack(numero, decalage))
+
+    def noter_insertion(self, etat: dict):
+        """
+        Retient un lot inséré en base dont les alertes restent à évaluer.
+
+        `etat` (sérialisable en JSON) est rendu par `insertion_en_attente`
+        tant que la position de relecture n'a pas avancé.
+        """
+        etat = {**etat, "debut": [self._fichier_lu, self._decalage_lu]}
+        self._ecrire_atomique("insertion", json.dumps(etat).encode())
+
+    def insertion_en_attente(self) -> Optional[dict]:
+        """Lot déjà inséré à partir de la position de relecture actuelle, sinon None."""
+        try:
+            with open(os.path.join(self.dossier, "insertion"), "rb") as f:
+                etat = json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+        # Point de reprise d'un lot déjà validé (arrêt avant sa suppression)
+        if etat.get("debut") != [self._fichier_lu, self._decalage_lu]:
+            return None
+        return etat
+
+    def _supprimer_avant(self, numero: int):
+        for ancien in self._numeros():
+            if ancien < numero:
+                os.remove(self._chemin(ancien))
+
+    def ajouter(self, mesure: MesureEnAttente) -> int:
+        """
+        Ajoute une mesure en fin de spool et retourne son rang d'écriture.
+
+        La mesure n'est durable qu'après `attendre_durabilite(rang)`.
+        Lève SpoolPlein si la taille maximale est atteinte.
+        """
+        donnees = encoder(mesure)
+        with self._lock:
+            if self.octets + len(donnees) > self.taille_max:
+                raise SpoolPlein()
+            if self._taille_ecrite + len(donnees) > self.taille_fichier and self._taille_ecrite:
+                # Le fichier plein est synchronisé puis fermé par le prochain fsync groupé, hors de la boucle asyncio
+                self._pleins.append(self._fd)
+                self._fichier_ecrit += 1
+                self._fd = os.open(self._chemin(self._fichier_ecrit), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+                self._taille_ecrite = 0
+            os.write(self._fd, donnees)
+            self._taille_ecrite += len(donnees)
+            self.octets += len(donnees)
+            self.en_attente += 1
+            self._ecrits += 1
+            return self._ecrits
+
+    def _fsync(self) -> int:
+        with self._lock:
+            cible = self._ecrits
+            fd = os.dup(self._fd)
+            pleins, self._pleins = self._pleins, []
+        try:
+            for plein in pleins:
+                try:
+                    os.fsync(plein)
+                finally:
+                    os.close(plein)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return cible
+
+    async def _synchroniser(self):
+        try:
+            # Laisse les requêtes concurrentes s'ajouter au même fsync
+            await asyncio.sleep(self.delai_fsync)
+            cible = await asyncio.to_thread(self._fsync)
+            self._synchronises = max(self._synchronises, cible)
+        finally:
+            self._synchronisation = None
+
+    async def attendre_durabilite(self, rang: int):
+        """Attend que l'écriture de rang `rang` soit sur disque (fsync groupé)."""
+        while self._synchronises < rang:
+            if self._synchronisation is None:
+                self._synchronisation = asyncio.ensure_future(self._synchroniser())
+            await asyncio.shield(self._synchronisation)
+
+    def lire(self, nb_max: int) -> Tuple[List[MesureEnAttente], Tuple[int, int], int]:
+        """
+        Lit jusqu'à `nb_max` mesures à partir de la position de relecture.
+
+        Retourne (mesures, position après la dernière, octets lus), à passer
+        à `valider` une fois les mesures enregistrées.
+        """
+        with self._lock:
+            fichier_ecrit, taille_ecrite = self._fichier_ecrit, self._taille_ecrite
+        mesures = []
+        numero, decalage = self._fichier_lu, self._decalage_lu
+        octets = 0
+        while len(mesures) < nb_max:
+            if numero > fichier_ecrit:
+                break
+            with open(self._chemin(numero), "rb") as f:
+                donnees = f.read(taille_ecrite if numero == fichier_ecrit else -1)
+            for fin, corps in _lire_enregistrements(donnees, decalage):
+                mesures.append(decoder(corps))
+                octets += fin - decalage
+                decalage = fin
+                if len(mesures) >= nb_max:
+                    break
+            if len(mesures) >= nb_max or numero == fichier_ecrit:
+                break
+            numero, decalage = numero + 1, 0
+        return mesures, (numero, decalage), octets
+
+    def valider(self, position: Tuple[int, int], nb: int, octets: int):
+        """Enregistre la nouvelle position de relecture et supprime les fichiers rejoués."""
+        self._ecrire_position(*position)
+        self._fichier_lu, self._decalage_lu = position
+        try:
+            os.remove(os.path.join(self.dossier, "insertion"))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.en_attente -= nb
+            self.octets -= octets
+        self._supprimer_avant(position[0])
+
+    def etat(self) -> dict:
+        return {
+            "disjoncteur": disjoncteur_base.etat,
+            "ouvertures_disjoncteur": disjoncteur_base.ouvertures,
+            "en_attente": self.en_attente,
+            "octets": self.octets,
+            "taille_max_octets": self.taille_max,
+            "fichiers": len(self._numeros()),
+            "rejouees": self.rejouees,
+            "ignorees": self.ignorees,
+        }
+
+
+def _en_etat(precedent: Optional[tuple]) -> Optional[list]:
+    return None if precedent is None else [precedent[0].isoformat(), precedent[1], precedent[2]]
+
+
+def _depuis_etat(etat: Optional[list]) -> Optional[tuple]:
+    return None if etat is None else (datetime.fromisoformat(etat[0]), etat[1], etat[2])
+
+
+def _rejouer_lot(session_factory, spool: Spool) -> int:
+    """
+    Rejoue un lot de mesures du spool dans la base.
+
+    Les mesures sont insérées en bloc par shard, puis les interventions et
+    alertes sont évaluées borne par borne, dans l'ordre chronologique, comme
+    à l'ingestion. La position de relecture n'avance qu'une fois les deux
+    étapes terminées. Les mesures d'une borne inconnue sont écartées.
+
+    Après l'insertion, le lot est noté dans le spool (`noter_insertion`) avec
+    les mesures nouvelles et l'état précédent de chaque borne : si
+    l'évaluation des alertes échoue, le rejeu suivant la reprend pour les
+    bornes restantes sans réinsérer le lot. Si le processus s'arrête avant
+    cette note, le lot est réinséré : les mesures avec séquence ne sont pas
+    dupliquées, les autres peuvent l'être.
+    """
+    reprise = spool.insertion_en_attente()
+    mesures, position, octets = spool.lire(reprise["nb"] if reprise else settings.SPOOL_LOT)
+    if not mesures:
+        return 0
+
+    db = session_factory()
+    sessions = {}
+    restantes = None
+    try:
+        bornes = {
+            borne.uuid_esp: borne for borne in db.scalars(
+                select(models.Borne).where(models.Borne.uuid_esp.in_({m.uuid_esp for m in mesures}))
+            )
+        }
+        bornes_par_id = {borne.id_borne: borne for borne in bornes.values()}
+
+        # Rang des mesures de chaque borne dans le lot
+        par_borne = {}
+        for rang, mesure in enumerate(mesures):
+            borne = bornes.get(mesure.uuid_esp)
+            if borne is None:
+                if reprise is None:
+                    spool.ignorees += 1
+                    logger.warning(f"Spool : mesure de la borne inconnue '{mesure.uuid_esp}' ignorée")
+                continue
+            par_borne.setdefault(borne.id_borne, []).append(rang)
+
+        def ligne(id_borne: int, rang: int) -> dict:
+            m = mesures[rang]
+            return {
+                "id_borne": id_borne,
+                "niveau_gel": m.niveau_gel,
+                "niveau_batterie": m.niveau_batterie,
+                "horodatage": m.horodatage,
+                "sequence": m.sequence,
+            }
+
+        if reprise is None:
+            # 1. Insertion groupée des mesures, shard par shard
+            precedents = {}
+            nouvelles = {}
+            par_shard = {}
+            for id_borne in par_borne:
+                par_shard.setdefault(carte_shards.shard_de_borne(db, id_borne), []).append(id_borne)
+            for nom, ids in par_shard.items():
+                session = sessions[nom] = carte_shards.ouvrir(db, nom)
+                for id_borne in ids:
+                    precedents[id_borne] = depot_mesures.precedente(session, id_borne)
+                rangs = {}
+                lignes = []
+                for id_borne in ids:
+                    for rang in par_borne[id_borne]:
+                        lignes.append(ligne(id_borne, rang))
+                        rangs[id(lignes[-1])] = rang
+                for inseree in depot_mesures.ajouter_lot(session, lignes):
+                    nouvelles.setdefault(inseree["id_borne"], []).append(rangs[id(inseree)])
+                if session is not db:
+                    session.commit()
+            journaliser(db, nouvelles)
+            db.commit()
+            spool.noter_insertion({
+                "nb": len(mesures),
+                "nouvelles": nouvelles,
+                "precedents": {id_borne: _en_etat(precedents[id_borne]) for id_borne in nouvelles},
+            })
+        else:
+            # Lot déjà inséré : seules les bornes dont les alertes n'ont pas été évaluées
+            nouvelles = {
+                int(id_borne): rangs for id_borne, rangs in reprise["nouvelles"].items() if int(id_borne) in bornes_par_id
+            }
+            precedents = {int(id_borne): _depuis_etat(etat) for id_borne, etat in reprise["precedents"].items()}
+            logger.warning(f"Spool : reprise de l'évaluation des alertes pour {len(nouvelles)} borne(s)")
+        restantes = dict(nouvelles)
+
+        # 2. Interventions et alertes, dans l'ordre chronologique de chaque borne
+        modifiees = []
+        for id_borne, rangs in nouvelles.items():
+            borne = bornes_par_id[id_borne]
+            precedent = precedents[id_borne]
+            derniere = filtree = None
+            for ligne_mesure in sorted((ligne(id_borne, rang) for rang in rangs), key=lambda l: l["horodatage"]):
+                if precedent is not None and ligne_mesure["horodatage"] < precedent[0]:
+                    accumulateur_heatmaps.noter(id_borne, ligne_mesure["horodatage"])
+                    continue  # Mesure plus ancienne que la dernière connue : pas d'alerte
+                accumulateur_heatmaps.noter(
+                    id_borne, ligne_mesure["horodatage"], consommation(precedent and precedent[1], ligne_mesure["niveau_gel"])
+                )
+                mesure = models.Mesure(**ligne_mesure)
+                if precedent is not None:
+                    resolution = detecter_interventions(db, borne, precedent[1], precedent[2], mesure)
+                    if resolution and resolution["alertes_resolues"]:
+                        modifiees.append(id_borne)
+                precedent = (ligne_mesure["horodatage"], ligne_mesure["niveau_gel"], ligne_mesure["niveau_batterie"])
+                derniere = mesure
+                # Les mesures rejouées suivent l'état du filtre sans le recharger (la base contient déjà les suivantes)
+                filtree = filtre_mesures.filtrer(borne, mesure.niveau_gel, mesure.niveau_batterie)
+
+            reception = max(mesures[rang].reception for rang in par_borne[id_borne])
+            if suivi_hors_ligne.est_hors_ligne(id_borne):
+                retour = resoudre_alertes(
+                    db, borne_id=id_borne, types=[models.TypeAlerteEnum.HORS_LIGNE], tracer_interventions=False
+                )
+                if retour["alertes_resolues"]:
+                    modifiees.append(id_borne)
+            db.commit()
+            suivi_hors_ligne.vu(id_borne, timegm(reception.utctimetuple()))
+
+            cache_mesures.invalider(id_borne)
+            if derniere is not None:
+                verifier_et_creer_alertes(db, borne, filtree)
+            del restantes[id_borne]
+
+        spool.valider(position, len(mesures), octets)
+        spool.rejouees += len(mesures)
+        if modifiees:
+            publier(ALERTES_MODIFIEES, ids=sorted(set(modifiees)))
+    except Exception:
+        db.rollback()
+        if restantes is not None and len(restantes) < len(nouvelles):
+            # Bornes déjà évaluées retirées du point de reprise : pas d'alerte en double
+            spool.noter_insertion({
+                "nb": len(mesures),
+                "nouvelles": restantes,
+                "precedents": {id_borne: _en_etat(precedents[id_borne]) for id_borne in restantes},
+            })
+        raise
+    finally:
+        for session in sessions.values():
+            carte_shards.fermer(db, session)
+        db.close()
+    return len(mesures)
+
+
+def rejouer(session_factory, spool: Spool) -> int:
+    """Vide le spool tant que la base répond ; retourne le nombre de mesures rejouées."""
+    total = 0
+    while spool.en_attente and disjoncteur_base.autoriser():
+        try:
+            nb = _rejouer_lot(session_factory, spool)
+        except Exception as e:
+            if est_panne_base(e):
+                disjoncteur_base.echec()
+            else:
+                # Le lot reste en tête du spool et sera retenté
+                disjoncteur_base.succes()
+                logger.error(f"Erreur lors du rejeu du spool: {str(e)}")
+            break
+        disjoncteur_base.succes()
+        if not nb:
+            break
+        total += nb
+    return total
+
+
+async def boucle_rejeu(session_factory, spool: Spool):
+    """Tâche de fond : rejoue le spool dès que la base est de nouveau disponible."""
+    if spool.en_attente:
+        logger.warning(f"Spool : {spool.en_attente} mesure(s) en attente au démarrage")
+    while True:
+        await asyncio.sleep(settings.SPOOL_REJEU_SECONDES)
+        if not spool.en_attente:
+            continue
+        try:
+            debut = time.perf_counter()
+            nb = await asyncio.to_thread(rejouer, session_factory, spool)
+            if nb:
+                logger.info(f"Spool : {nb} mesure(s) rejouée(s) en {time.perf_counter() - debut:.2f} s")
+        except Exception as e:
+            logger.error(f"Erreur du rejeu du spool: {str(e)}")
+
+
+# Instance partagée par le processus, ouverte au démarrage de l'API (None avant, ou si le spool est désactivé)
+_spool_mesures: Optional[Spool] = None
+
+
+def ouvrir_spool() -> Optional[Spool]:
+    """
+    Ouvre le spool du processus (sous-dossier `instance-N` et son verrou), une seule fois.
+
+    Appelé au démarrage de l'API : les scripts et processus qui importent
+    l'application sans la servir ne créent pas de dossier et ne prennent
+    pas de verrou.
+    """
+    global _spool_mesures
+    if _spool_mesures is None and settings.SPOOL_ACTIF:
+        _spool_mesures = Spool(
+            settings.SPOOL_DOSSIER,
+            settings.SPOOL_TAILLE_FICHIER_OCTETS,
+            settings.SPOOL_TAILLE_MAX_OCTETS,
+            settings.SPOOL_FSYNC_DELAI_MS
+        )
+    return _spool_mesures
+
+
+def spool_mesures() -> Optional[Spool]:
+    """Spool du processus, None s'il n'est pas ouvert."""
+    return _spool_mesures
@@ -0,0 +1,172 @@
+import time
+from array import array
+from calendar import timegm
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.depot_mesures import depot_mesures
+
+EPOCH = datetime(1970, 1, 1)
+SANS_SEQUENCE = -1
+
+
+def _en_microsecondes(horodatage: datetime) -> int:
+    return timegm(horodatage.utctimetuple()) * 1_000_000 + horodatage.microsecond
+
+
+def _depuis_microsecondes(valeur: int) -> datetime:
+    return EPOCH + timedelta(microseconds=valeur)
+
+
+class TamponCirculaire:
+    """
+    Dernières mesures d'une borne dans des tableaux typés de taille fixe.
+
+    Niveaux en `array('b')`, horodatages (µs epoch), IDs et séquences en
+    `array('q')` : environ 26 octets par mesure au lieu d'un objet ORM.
+    `complet` indique que le tampon contient tout l'historique de la borne,
+    `charge` l'instant (monotone) de son chargement depuis la base.
+    """
+
+    __slots__ = ("capacite", "debut", "taille", "complet", "charge", "gel", "batterie", "horodatage", "id_mesure", "sequence")
+
+    def __init__(self, capacite: int):
+        self.capacite = capacite
+        self.charge = time.monotonic()
+        self.debut = 0  # Index de la plus ancienne mesure
+        self.taille = 0
+        self.complet = False
+        self.gel = array("b", bytes(capacite))
+        self.batterie = array("b", bytes(capacite))
+        self.horodatage = array("q", bytes(8 * capacite))
+        self.id_mesure = array("q", bytes(8 * capacite))
+        self.sequence = array("q", bytes(8 * capacite))
+
+    @staticmethod
+    def octets_par_tampon(capacite: int) -> int:
+        return capacite * (1 + 1 + 8 + 8 + 8)
+
+    def ajouter(self, id_mesure: int, niveau_gel: int, niveau_batterie: int, horodatage: datetime, sequence: Optional[int]):
+        """Ajoute la mesure la plus récente, en écrasant la plus ancienne si le tampon est plein."""
+        if self.taille < self.capacite:
+            index = (self.debut + self.taille) % self.capacite
+            self.taille += 1
+        else:
+            index = self.debut
+            self.debut = (self.debut + 1) % self.capacite
+            self.complet = False
+        self.gel[index] = niveau_gel
+        self.batterie[index] = niveau_batterie
+        self.horodatage[index] = _en_microsecondes(horodatage)
+        self.id_mesure[index] = id_mesure
+        self.sequence[index] = SANS_SEQUENCE if sequence is None else sequence
+
+    def peut_servir(self, limite: int) -> bool:
+        return self.complet or limite <= self.taille
+
+    def dernieres(self, id_borne: int, limite: int) -> List[dict]:
+        """Retourne les `limite` mesures les plus récentes (plus récente en premier)."""
+        resultat = []
+        for rang in range(min(limite, self.taille)):
+            index = (self.debut + self.taille - 1 - rang) % self.capacite
+            sequence = self.sequence[index]
+            resultat.append({
+                "id_mesure": self.id_mesure[index],
+                "id_borne": id_borne,
+                "niveau_gel": self.gel[index],
+                "niveau_batterie": self.batterie[index],
+                "horodatage": _depuis_microsecondes(self.horodatage[index]),
+                "sequence": None if sequence == SANS_SEQUENCE else sequence,
+            })
+        return resultat
+
+
+class CacheMesuresRecentes:
+    """
+    Tampons circulaires par borne, sous un budget mémoire global.
+
+    - L'ingestion alimente les tampons déjà chauds
+    - Une lecture sur un tampon froid le charge depuis la base (une requête)
+    - Les bornes les moins récemment utilisées sont évincées (LRU)
+    - Un tampon chargé depuis plus de `duree_secondes` est rechargé : les
+      mesures reçues par les autres workers ou importées (scripts/importer_historique.py)
+      n'alimentent pas les tampons de ce processus
+    """
+
+    def __init__(self, capacite: int, budget_octets: int, duree_secondes: float = 10):
+        self.capacite = capacite
+        self.duree_secondes = duree_secondes
+        self.max_bornes = max(1, budget_octets // TamponCirculaire.octets_par_tampon(capacite))
+        self._tampons: "OrderedDict[int, TamponCirculaire]" = OrderedDict()
+        self._generations = {}
+        self._lock = Lock()
+        self.succes = 0
+        self.echecs = 0
+
+    def ajouter(self, mesure):
+        """Ajoute une mesure reçue à l'heure (la plus récente de sa borne)."""
+        with self._lock:
+            self._generations[mesure.id_borne] = self._generations.get(mesure.id_borne, 0) + 1
+            tampon = self._tampons.get(mesure.id_borne)
+            if tampon is not None:
+                tampon.ajouter(mesure.id_mesure, mesure.niveau_gel, mesure.niveau_batterie, mesure.horodatage, mesure.sequence)
+
+    def invalider(self, id_borne: int):
+        """Oublie le tampon d'une borne (ex: mesure différée insérée dans le passé)."""
+        with self._lock:
+            self._generations[id_borne] = self._generations.get(id_borne, 0) + 1
+            self._tampons.pop(id_borne, None)
+
+    def dernieres(self, db: Session, id_borne: int, limite: int) -> Optional[List[dict]]:
+        """
+        Retourne les `limite` dernières mesures d'une borne depuis le tampon.
+
+        Retourne None si la limite dépasse la capacité du tampon : l'appelant
+        interroge alors directement la base.
+        """
+        if limite > self.capacite:
+            return None
+
+        with self._lock:
+            tampon = self._tampons.get(id_borne)
+            if (
+                tampon is not None
+                and tampon.peut_servir(limite)
+                and time.monotonic() - tampon.charge < self.duree_secondes
+            ):
+                self._tampons.move_to_end(id_borne)
+                self.succes += 1
+                return tampon.dernieres(id_borne, limite)
+            generation = self._generations.get(id_borne, 0)
+            self.echecs += 1
+
+        tampon = self._charger(db, id_borne)
+
+        with self._lock:
+            # Une mesure est arrivée pendant le chargement : le tampon serait incomplet
+            if self._generations.get(id_borne, 0) == generation:
+                self._tampons[id_borne] = tampon
+                self._tampons.move_to_end(id_borne)
+                while len(self._tampons) > self.max_bornes:
+                    self._tampons.popitem(last=False)
+        return tampon.dernieres(id_borne, limite)
+
+    def _charger(self, db: Session, id_borne: int) -> TamponCirculaire:
+        lignes = depot_mesures.dernieres(db, id_borne, self.capacite)
+
+        tampon = TamponCirculaire(self.capacite)
+        for ligne in reversed(lignes):
+            tampon.ajouter(ligne["id_mesure"], ligne["niveau_gel"], ligne["niveau_batterie"], ligne["horodatage"], ligne["sequence"])
+        tampon.complet = len(lignes) < self.capacite
+        return tampon
+
+
+# Instance partagée par le processus
+cache_mesures = CacheMesuresRecentes(
+    settings.TAMPON_CAPACITE, settings.TAMPON_BUDGET_OCTETS, settings.TAMPON_DUREE_SECONDES
+)
@@ -1,40 +1,63 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger("uvicorn.error")
 
-# 1. Créer le moteur de connexion à la base de données
-try:
-    engine = create_engine(
+def _creer_moteur(taille_pool: int, debordement: int):
+    return create_engine(
         settings.DATABASE_URL,
         echo=True,  # Affiche les requêtes SQL dans le terminal
-        pool_pre_ping=True
+        pool_pre_ping=True,
+        pool_size=taille_pool,
+        max_overflow=debordement
     )
+
+# SQLite en mémoire (bancs d'essai) : la base n'existe que dans sa connexion
+_url = make_url(settings.DATABASE_URL)
+EN_MEMOIRE = _url.get_backend_name() == "sqlite" and _url.database in (None, "", ":memory:")
+
+# 1. Créer les moteurs de connexion à la base de données.
+# Un pool de connexions par classe de charge (cf. app/core/isolation.py) :
+# les lectures et rapports ne peuvent pas épuiser les connexions de l'ingestion.
+try:
+    if EN_MEMOIRE:
+        # Un seul moteur et une seule connexion, partagée par tous les threads (classes de
+        # charge comprises) : chaque moteur, ou chaque thread, aurait sinon sa propre base vide
+        engine = engine_lecture = engine_rapports = create_engine(
+            settings.DATABASE_URL,
+            echo=True,
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False}
+        )
+    else:
+        engine = _creer_moteur(settings.POOL_INGESTION_TAILLE, settings.POOL_INGESTION_DEBORDEMENT)
+        engine_lecture = _creer_moteur(settings.POOL_LECTURE_TAILLE, settings.POOL_LECTURE_DEBORDEMENT)
+        engine_rapports = _creer_moteur(settings.POOL_RAPPORTS_TAILLE, settings.POOL_RAPPORTS_DEBORDEMENT)
     logger.info(f"Connexion à la base de données établie: {settings.DATABASE_URL}")
 except Exception as e:
     logger.error(f"Erreur de connexion à la base de données: {str(e)}")
     raise
 
-# 2. Créer une fabrique de sessions
+# 2. Créer les fabriques de sessions (ingestion et écritures, lectures interactives, rapports)
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine
 )
+SessionLecture = sessionmaker(autocommit=False, autoflush=False, bind=engine_lecture)
+SessionRapports = sessionmaker(autocommit=False, autoflush=False, bind=engine_rapports)
 
 # 3. Base pour tous nos modèles SQLAlchemy
 Base = declarative_base()
 
-# 4. Fonction pour obtenir une session de base de données
-def get_db():
-    """
-    Fournit une session de base de données pour chaque requête.
-    Ferme automatiquement la session à la fin.
-    """
-    db = SessionLocal()
+# 4. Fonctions pour obtenir une session de base de données
+def _session(fabrique):
+    db = fabrique()
     try:
         yield db
     except Exception as e:
@@ -42,3 +65,18 @@ def get_db():
         raise
     finally:
         db.close()
+
+def get_db():
+    """
+    Fournit une session de base de données pour chaque requête.
+    Ferme automatiquement la session à la fin.
+    """
+    yield from _session(SessionLocal)
+
+def get_db_lecture():
+    """Session sur le pool de connexions des lectures interactives."""
+    yield from _session(SessionLecture)
+
+def get_db_rapports():
+    """Session sur le pool de connexions des rapports et traitements en masse."""
+    yield from _session(SessionRapports)
@@ -0,0 +1,57 @@
+"""
+Import en masse de bornes depuis un fichier CSV ou JSON.
+
+Usage :
+    python -m app.importer_bornes bornes.csv [--dry-run] [--upsert] [--avec-cles]
+
+Avec `--avec-cles`, chaque borne créée reçoit une clé d'authentification,
+affichée une seule fois : la programmer dans l'ESP32 avant sa mise en service.
+"""
+import argparse
+import sys
+
+from app.database import SessionLocal
+from app.core.provisionnement import lire_lignes, provisionner_bornes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import en masse de bornes (CSV ou JSON)")
+    parser.add_argument("fichier", help="Chemin du fichier .csv ou .json")
+    parser.add_argument("--dry-run", action="store_true", help="Valider sans rien enregistrer")
+    parser.add_argument("--upsert", action="store_true", help="Mettre à jour les bornes existantes")
+    parser.add_argument("--avec-cles", action="store_true", help="Générer la clé HMAC de chaque borne créée")
+    args = parser.parse_args(argv)
+
+    format_fichier = "csv" if args.fichier.lower().endswith(".csv") else "json"
+    with open(args.fichier, encoding="utf-8-sig") as f:
+        lignes = lire_lignes(f.read(), format_fichier)
+
+    db = SessionLocal()
+    try:
+        rapport = provisionner_bornes(db, lignes, dry_run=args.dry_run, upsert=args.upsert, avec_cles=args.avec_cles)
+    finally:
+        db.close()
+
+    for entree in rapport["lignes"]:
+        if entree["erreurs"]:
+            print(f"❌ Ligne {entree['ligne']} ({entree['uuid_esp']}): {'; '.join(entree['erreurs'])}")
+
+    print(f"\n📊 {rapport['total']} lignes : {rapport['creees']} à créer, "
+          f"{rapport['mises_a_jour']} à mettre à jour, {rapport['erreurs']} en erreur")
+    if rapport["applique"]:
+        print("✅ Import enregistré")
+        cles = [entree for entree in rapport["lignes"] if entree.get("cle_borne")]
+        if cles:
+            print("\n🔑 Clés des bornes créées (affichées une seule fois) :")
+            for entree in cles:
+                print(f"{entree['uuid_esp']}  {entree['cle_borne']}")
+    elif args.dry_run:
+        print("🔎 Mode dry-run : rien n'a été enregistré")
+    else:
+        print("⚠️  Aucune modification enregistrée")
+
+    return 1 if rapport["erreurs"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
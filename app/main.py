@@ -1,10 +1,25 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.auth_bornes import authentification_bornes, boucle_purge_nonces, precharger_cles
 from app.core.config import settings
+from app.core.depot_mesures import depot_mesures
+from app.core.heatmaps import boucle_heatmaps
+from app.core.hors_ligne import boucle_surveillance
+from app.core.isolation import Saturation
+from app.core.journal import boucle_purge
+from app.core.outbox import boucle_outbox, repartiteur_notifications
+from app.core.limitation import retry_after
+from app.core.profilage import MiddlewareProfilage, activer_suivi_sql
+from app.core.requetes_preparees import suivre_cache
+from app.core.shards import PRINCIPAL, carte_shards
+from app.core.spool import boucle_rejeu, ouvrir_spool
+from app.database import SessionLocal, engine, engine_lecture, engine_rapports
 from datetime import datetime
+import asyncio
 
 # Import des routeurs
-from app.api.endpoints import mesures, auth, bornes
+from app.api.endpoints import mesures, auth, bornes, alertes, interventions, dashboard, analyses, profils, charge
 
 # Création de l'application FastAPI
 app = FastAPI(
@@ -28,10 +43,73 @@ app.add_middleware(
     allow_headers=["*"],  # Autorise tous les headers (Authorization, Content-Type, etc.)
 )
 
+# Profilage à la demande (X-Profile: 1 pour un fournisseur, ou échantillonnage)
+if settings.PROFILAGE_ACTIF:
+    app.add_middleware(MiddlewareProfilage)
+    for moteur in (engine, engine_lecture, engine_rapports):
+        activer_suivi_sql(moteur)
+
+# Statistiques du cache des instructions compilées, par pool et par shard (cf. /api/charge)
+for nom, moteur in {"ingestion": engine, "lecture": engine_lecture, "rapports": engine_rapports}.items():
+    suivre_cache(moteur, nom)
+for nom in carte_shards.noms:
+    if nom != PRINCIPAL:
+        suivre_cache(carte_shards.moteur(nom), f"shard:{nom}")
+
+# Classe de charge saturée : le client réessaie plus tard
+@app.exception_handler(Saturation)
+async def classe_de_charge_saturee(request: Request, exc: Saturation):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service surchargé: trop de requêtes en attente"},
+        headers={"Retry-After": retry_after(1)}
+    )
+
 # Inclure les routeurs
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentification"])
 app.include_router(mesures.router, prefix="/api/mesures", tags=["Mesures"])
 app.include_router(bornes.router, prefix="/api/bornes", tags=["Bornes"])
+app.include_router(alertes.router, prefix="/api/alertes", tags=["Alertes"])
+app.include_router(interventions.router, prefix="/api/interventions", tags=["Interventions"])
+app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Tableau de bord"])
+app.include_router(analyses.router, prefix="/api/analyses", tags=["Analyses"])
+app.include_router(charge.router, prefix="/api/charge", tags=["Système"])
+if settings.PROFILAGE_ACTIF:
+    app.include_router(profils.router, prefix="/api/profils", tags=["Système"])
+
+# Tâches de fond
+@app.on_event("startup")
+async def demarrer_taches_de_fond():
+    if carte_shards.active:
+        await asyncio.to_thread(carte_shards.creer_tables)
+    if authentification_bornes.active:
+        await precharger_cles(SessionLocal, authentification_bornes)
+        if authentification_bornes.partages is not None:
+            app.state.purge_nonces = asyncio.create_task(boucle_purge_nonces(SessionLocal))
+    if settings.HORS_LIGNE_ACTIF:
+        app.state.suivi_hors_ligne = asyncio.create_task(boucle_surveillance(SessionLocal))
+    if settings.STOCKAGE_MESURES == "segments":
+        from app.core.segments import boucle_compactage
+        app.state.compactage = asyncio.create_task(boucle_compactage(depot_mesures))
+    app.state.purge_journal = asyncio.create_task(boucle_purge(SessionLocal))
+    app.state.heatmaps = asyncio.create_task(boucle_heatmaps(SessionLocal))
+    if settings.OUTBOX_ACTIF:
+        app.state.outbox = asyncio.create_task(boucle_outbox(SessionLocal, repartiteur_notifications))
+    spool = await asyncio.to_thread(ouvrir_spool)
+    if spool is not None:
+        app.state.rejeu_spool = asyncio.create_task(boucle_rejeu(SessionLocal, spool))
+
+@app.on_event("shutdown")
+async def arreter_taches_de_fond():
+    taches = [
+        getattr(app.state, nom, None)
+        for nom in ("suivi_hors_ligne", "compactage", "rejeu_spool", "purge_journal", "purge_nonces", "heatmaps", "outbox")
+    ]
+    taches = [tache for tache in taches if tache]
+    for tache in taches:
+        tache.cancel()
+    # Laisse les tâches terminer proprement (dernier enregistrement des heatmaps)
+    await asyncio.gather(*taches, return_exceptions=True)
 
 # Route racine
 @app.get("/", tags=["Accueil"])
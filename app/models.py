@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Enum, ForeignKey, Date, BigInteger
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Enum, ForeignKey, Date, BigInteger, UniqueConstraint, Index, LargeBinary, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -17,6 +17,7 @@ class TypeAlerteEnum(str, enum.Enum):
     BATTERIE_BASSE = "batterie_basse"
     GEL_CRITIQUE = "gel_critique"
     BATTERIE_CRITIQUE = "batterie_critique"
+    HORS_LIGNE = "hors_ligne"
 
 # Enumération pour le statut des alertes
 class StatutAlerteEnum(str, enum.Enum):
@@ -30,16 +31,32 @@ class TypeInterventionEnum(str, enum.Enum):
     CHANGEMENT_BATTERIE = "changement_batterie"
     MAINTENANCE = "maintenance"
 
+# Enumération pour le statut des notifications de l'outbox
+class StatutNotificationEnum(str, enum.Enum):
+    EN_ATTENTE = "en_attente"
+    ENVOYEE = "envoyee"
+    ABANDONNEE = "abandonnee"  # Nombre maximal de tentatives atteint
+
+# Enumération pour le filtre des mesures avant décision d'alerte (cf. app/core/filtrage.py)
+class FiltreMesuresEnum(str, enum.Enum):
+    AUCUN = "aucun"
+    MEDIANE = "mediane"  # Médiane des k dernières mesures
+    REBOND = "rebond"  # Alerte après k mesures consécutives sous le seuil
+
+def _enum(classe):
+    """Type ENUM stockant les valeurs ('gel_bas') et non les noms ('GEL_BAS'), comme le schéma SQL."""
+    return Enum(classe, values_callable=lambda membres: [m.value for m in membres])
+
 # Table utilisateurs
 class Utilisateur(Base):
     __tablename__ = "utilisateurs"
     
-    id_utilisateur = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, nullable=False, index=True)
+    id_utilisateur = Column(Integer, primary_key=True)
+    email = Column(String(255), unique=True, nullable=False)
     mot_de_passe_hash = Column(String(255), nullable=False)
     nom = Column(String(100))
     prenom = Column(String(100))
-    role = Column(Enum(RoleEnum), nullable=False)
+    role = Column(_enum(RoleEnum), nullable=False)
     date_creation = Column(DateTime, server_default=func.now())
     est_actif = Column(Boolean, default=True)
     
@@ -53,7 +70,7 @@ class Utilisateur(Base):
 class Site(Base):
     __tablename__ = "sites"
     
-    id_site = Column(Integer, primary_key=True, index=True)
+    id_site = Column(Integer, primary_key=True)
     nom_site = Column(String(255), nullable=False)
     adresse = Column(Text)
     id_responsable_technique = Column(Integer, ForeignKey("utilisateurs.id_utilisateur"))
@@ -66,8 +83,8 @@ class Site(Base):
 class Borne(Base):
     __tablename__ = "bornes"
     
-    id_borne = Column(Integer, primary_key=True, index=True)
-    uuid_esp = Column(String(255), unique=True, nullable=False, index=True)
+    id_borne = Column(Integer, primary_key=True)
+    uuid_esp = Column(String(255), unique=True, nullable=False)
     nom_borne = Column(String(100), default="Borne sans nom")
     id_site = Column(Integer, ForeignKey("sites.id_site"), nullable=False)
     salle_local = Column(String(100), nullable=False)
@@ -76,6 +93,16 @@ class Borne(Base):
     id_agent_affecte = Column(Integer, ForeignKey("utilisateurs.id_utilisateur"))
     date_installation = Column(Date)
     est_active = Column(Boolean, default=True)
+    # Filtre du bruit des capteurs (NULL : valeurs par défaut de la configuration)
+    filtre_mesures = Column(_enum(FiltreMesuresEnum), nullable=True)
+    filtre_fenetre = Column(Integer, nullable=True)
+    # Sel de la clé HMAC de la borne (clé dérivée, jamais stockée). NULL : borne sans clé
+    cle_sel = Column(String(32), nullable=True)
+    
+    __table_args__ = (
+        Index("idx_site", "id_site"),
+        Index("idx_agent", "id_agent_affecte"),
+    )
     
     # Relations
     site = relationship("Site", back_populates="bornes")
@@ -88,11 +115,20 @@ class Borne(Base):
 class Mesure(Base):
     __tablename__ = "mesures"
     
-    id_mesure = Column(BigInteger, primary_key=True, index=True)
+    id_mesure = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)  # SQLite n'auto-incrémente que INTEGER
     id_borne = Column(Integer, ForeignKey("bornes.id_borne"), nullable=False)
     niveau_gel = Column(Integer, nullable=False)  # Pourcentage (0-100)
     niveau_batterie = Column(Integer, nullable=False)  # Pourcentage (0-100)
-    horodatage = Column(DateTime, server_default=func.now())
+    horodatage = Column(DateTime, server_default=func.now())  # Date de mesure (ESP32) ou de réception
+    sequence = Column(BigInteger, nullable=True)  # Numéro de séquence envoyé par l'ESP32
+    
+    __table_args__ = (
+        # Historique et dernière mesure d'une borne
+        Index("idx_borne_horodatage", "id_borne", "horodatage"),
+        # Un renvoi de l'ESP32 ne peut pas créer une deuxième ligne. L'horodatage en fait
+        # partie : le compteur de séquence repart de zéro quand l'ESP32 redémarre
+        UniqueConstraint("id_borne", "sequence", "horodatage", name="uq_mesure_borne_sequence_horodatage"),
+    )
     
     # Relations
     borne = relationship("Borne", back_populates="mesures")
@@ -101,15 +137,27 @@ class Mesure(Base):
 class Alerte(Base):
     __tablename__ = "alertes"
     
-    id_alerte = Column(Integer, primary_key=True, index=True)
+    id_alerte = Column(Integer, primary_key=True)
     id_borne = Column(Integer, ForeignKey("bornes.id_borne"), nullable=False)
-    type_alerte = Column(Enum(TypeAlerteEnum), nullable=False)
+    type_alerte = Column(_enum(TypeAlerteEnum), nullable=False)
     niveau_valeur = Column(Integer, nullable=False)
-    statut = Column(Enum(StatutAlerteEnum), default=StatutAlerteEnum.NOUVELLE)
+    statut = Column(_enum(StatutAlerteEnum), default=StatutAlerteEnum.NOUVELLE)
     id_agent_assignee = Column(Integer, ForeignKey("utilisateurs.id_utilisateur"))
     date_declenchement = Column(DateTime, server_default=func.now())
     date_resolution = Column(DateTime)
     
+    __table_args__ = (
+        # Alertes actives de toute la flotte, triées par date
+        Index("idx_alertes_statut_date", "statut", "date_declenchement"),
+        # Alertes actives d'une borne (get_alertes_actives avec borne_id)
+        Index("idx_alertes_statut_borne_date", "statut", "id_borne", "date_declenchement"),
+        # Clé étrangère et historique des alertes d'une borne
+        Index("idx_alertes_borne_date", "id_borne", "date_declenchement"),
+        # Historique de la flotte et rafraîchissement des statistiques
+        Index("idx_alertes_date", "date_declenchement"),
+        Index("idx_alertes_date_resolution", "date_resolution"),
+    )
+    
     # Relations
     borne = relationship("Borne", back_populates="alertes")
     agent_assignee = relationship("Utilisateur", back_populates="alertes_assignees")
@@ -118,13 +166,129 @@ class Alerte(Base):
 class Intervention(Base):
     __tablename__ = "interventions"
     
-    id_intervention = Column(Integer, primary_key=True, index=True)
+    id_intervention = Column(Integer, primary_key=True)
     id_borne = Column(Integer, ForeignKey("bornes.id_borne"), nullable=False)
     id_agent = Column(Integer, ForeignKey("utilisateurs.id_utilisateur"), nullable=False)
-    type_intervention = Column(Enum(TypeInterventionEnum), nullable=False)
+    type_intervention = Column(_enum(TypeInterventionEnum), nullable=False)
     date_intervention = Column(DateTime, server_default=func.now())
     commentaire = Column(Text)
     
+    __table_args__ = (
+        Index("idx_interventions_borne_date", "id_borne", "date_intervention"),
+        # Rafraîchissement des statistiques et historique de la flotte par date
+        Index("idx_interventions_date", "date_intervention"),
+    )
+    
     # Relations
     borne = relationship("Borne", back_populates="interventions")
     agent = relationship("Utilisateur", back_populates="interventions")
+
+# Tables de statistiques journalières (recalculées depuis alertes et interventions,
+# cf. app/core/analyses.py) : sans clé étrangère, ce sont des données dérivées
+
+class StatAlertesJour(Base):
+    __tablename__ = "stats_alertes_jour"
+    
+    id = Column(Integer, primary_key=True)
+    jour = Column(Date, nullable=False)  # Jour de déclenchement
+    id_borne = Column(Integer, nullable=False)
+    type_alerte = Column(_enum(TypeAlerteEnum), nullable=False)
+    nb_declenchees = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("jour", "id_borne", "type_alerte", name="uq_stats_alertes_jour"),
+    )
+
+class StatResolutionsJour(Base):
+    __tablename__ = "stats_resolutions_jour"
+    
+    id = Column(Integer, primary_key=True)
+    jour = Column(Date, nullable=False)  # Jour de résolution
+    id_borne = Column(Integer, nullable=False)
+    id_agent = Column(Integer)  # Agent assigné à l'alerte, sinon affecté à la borne
+    type_alerte = Column(_enum(TypeAlerteEnum), nullable=False)
+    nb_resolues = Column(Integer, nullable=False)
+    duree_totale_secondes = Column(BigInteger, nullable=False)
+    duree_max_secondes = Column(BigInteger, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("jour", "id_borne", "id_agent", "type_alerte", name="uq_stats_resolutions_jour"),
+    )
+
+class StatInterventionsJour(Base):
+    __tablename__ = "stats_interventions_jour"
+    
+    id = Column(Integer, primary_key=True)
+    jour = Column(Date, nullable=False)
+    id_borne = Column(Integer, nullable=False)
+    id_agent = Column(Integer, nullable=False)
+    type_intervention = Column(_enum(TypeInterventionEnum), nullable=False)
+    nb = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("jour", "id_borne", "id_agent", "type_intervention", name="uq_stats_interventions_jour"),
+    )
+
+# Journal des changements de bornes (cf. app/core/journal.py) : une ligne par
+# borne modifiée et par transaction, l'id croissant sert de curseur de synchronisation
+class ChangementBorne(Base):
+    __tablename__ = "journal_bornes"
+    
+    id_changement = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    id_borne = Column(Integer, nullable=False)
+    date_changement = Column(DateTime, server_default=func.now(), nullable=False)
+    # Réaffectation ou changement de site : agent et site de la borne avant le changement
+    ancien_id_agent = Column(Integer)
+    ancien_id_site = Column(Integer)
+    
+    __table_args__ = (
+        # Purge des changements plus anciens que la rétention
+        Index("idx_journal_bornes_date", "date_changement"),
+    )
+
+# Heatmaps d'utilisation (cf. app/core/heatmaps.py) : 7 × 24 compteurs uint32
+# par borne, stockés en tableaux binaires de taille fixe (données dérivées)
+class HeatmapBorne(Base):
+    __tablename__ = "heatmaps_bornes"
+    
+    id_borne = Column(Integer, primary_key=True, autoincrement=False)
+    utilisations = Column(LargeBinary, nullable=False)  # Mesures reçues par créneau
+    gel_consomme = Column(LargeBinary, nullable=False)  # Baisse cumulée du niveau de gel (points de %) par créneau
+    date_maj = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+# Outbox des notifications d'alerte (cf. app/core/outbox.py) : écrite dans la
+# transaction de l'alerte, envoyée ensuite par la tâche de fond
+class Notification(Base):
+    __tablename__ = "outbox_notifications"
+    
+    id_notification = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    id_alerte = Column(Integer, nullable=False)
+    id_borne = Column(Integer, nullable=False)
+    id_agent = Column(Integer, nullable=True)  # Agent affecté à la borne à la création de l'alerte
+    type_alerte = Column(_enum(TypeAlerteEnum), nullable=False)
+    niveau_valeur = Column(Integer)
+    date_creation = Column(DateTime, server_default=func.now(), nullable=False)
+    statut = Column(_enum(StatutNotificationEnum), default=StatutNotificationEnum.EN_ATTENTE, nullable=False)
+    tentatives = Column(Integer, default=0, nullable=False)
+    prochain_essai = Column(DateTime, server_default=func.now(), nullable=False)
+    date_envoi = Column(DateTime, nullable=True)
+    erreur = Column(String(255), nullable=True)  # Dernière erreur d'envoi
+    
+    __table_args__ = (
+        # Notifications à envoyer, par échéance
+        Index("idx_outbox_a_envoyer", "statut", "prochain_essai"),
+    )
+
+# Nonces des requêtes signées des bornes (cf. app/core/auth_bornes.py), partagés
+# entre les processus : une requête rejouée vers un autre worker est refusée
+class NonceBorne(Base):
+    __tablename__ = "nonces_bornes"
+    
+    uuid_esp = Column(String(255), primary_key=True)
+    nonce = Column(String(64), primary_key=True)
+    expiration = Column(Float, nullable=False)  # Fin de la fenêtre de l'horodatage signé (secondes Unix)
+    
+    __table_args__ = (
+        # Purge des nonces expirés
+        Index("idx_nonces_expiration", "expiration"),
+    )
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from datetime import datetime, date
+from pydantic import BaseModel, EmailStr, Field, create_model, validator
+from datetime import datetime, date, timedelta, timezone
 from typing import Optional, List
 from enum import Enum
 
+from app.core.config import settings
+
 # Enums pour Pydantic
 class RoleEnum(str, Enum):
     fournisseur = "fournisseur"
@@ -10,11 +12,17 @@ class RoleEnum(str, Enum):
     responsable_agent = "responsable_agent"
     agent = "agent"
 
+class FiltreMesuresEnum(str, Enum):
+    aucun = "aucun"
+    mediane = "mediane"
+    rebond = "rebond"
+
 class TypeAlerteEnum(str, Enum):
     gel_bas = "gel_bas"
     batterie_basse = "batterie_basse"
     gel_critique = "gel_critique"
     batterie_critique = "batterie_critique"
+    hors_ligne = "hors_ligne"
 
 class StatutAlerteEnum(str, Enum):
     nouvelle = "nouvelle"
@@ -31,6 +39,24 @@ class MesureCreate(BaseModel):
     uuid_esp: str = Field(..., min_length=1, max_length=255)
     niveau_gel: int = Field(..., ge=0, le=100, description="Niveau de gel en pourcentage (0-100)")
     niveau_batterie: int = Field(..., ge=0, le=100, description="Niveau de batterie en pourcentage (0-100)")
+    sequence: Optional[int] = Field(None, ge=0, description="Numéro de séquence croissant propre à la borne (déduplication des renvois)")
+    horodatage: Optional[datetime] = Field(None, description="Date de la mesure côté ESP32 (mesures bufferisées hors ligne)")
+
+    @validator("horodatage")
+    def horodatage_en_utc(cls, v):
+        """Convertit l'horodatage en UTC naïf à la seconde et refuse les dates avant 1970 ou trop dans le futur."""
+        if v is None:
+            return v
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        # Précision d'une colonne DATETIME : un renvoi se compare à l'horodatage stocké
+        v = v.replace(microsecond=0)
+        # Secondes epoch non signées dans le spool (app/core/spool.py)
+        if v < datetime(1970, 1, 1):
+            raise ValueError("horodatage antérieur à 1970")
+        if v > datetime.utcnow() + timedelta(seconds=settings.DECALAGE_HORLOGE_MAX_SECONDES):
+            raise ValueError("horodatage dans le futur")
+        return v
 
 class BorneBase(BaseModel):
     uuid_esp: str = Field(..., min_length=1, max_length=255)
@@ -40,12 +66,34 @@ class BorneBase(BaseModel):
     seuil_alerte_gel: int = Field(default=10, ge=1, le=100)
     seuil_alerte_batterie: int = Field(default=10, ge=1, le=100)
     id_agent_affecte: Optional[int] = None
+    filtre_mesures: Optional[FiltreMesuresEnum] = None  # Défaut : FILTRE_MESURES_DEFAUT
+    filtre_fenetre: Optional[int] = Field(default=None, ge=1, le=15)
 
     # --- AJOUTER CECI APRÈS class BorneBase ---
 class BorneCreate(BorneBase):
     pass
 # ------------------------------------------
 
+class LigneImportBorne(BaseModel):
+    ligne: int
+    uuid_esp: Optional[str] = None
+    statut: str  # creee, mise_a_jour ou erreur
+    erreurs: List[str] = []
+    cle_borne: Optional[str] = None  # Clé HMAC d'une borne créée, affichée une seule fois
+
+class RapportImportBornes(BaseModel):
+    dry_run: bool
+    total: int
+    creees: int
+    mises_a_jour: int
+    erreurs: int
+    applique: bool
+    lignes: List[LigneImportBorne]
+
+class ResultatMiseAJourGroupee(BaseModel):
+    bornes_modifiees: int
+    ids_bornes: List[int]
+
 class UtilisateurBase(BaseModel):
     email: EmailStr
     nom: str = Field(..., max_length=100)
@@ -66,10 +114,21 @@ class Mesure(BaseModel):
     niveau_gel: int
     niveau_batterie: int
     horodatage: datetime
+    sequence: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+class AgregatMesures(BaseModel):
+    debut: datetime
+    nb_mesures: int
+    gel_moyen: float
+    gel_min: int
+    gel_max: int
+    batterie_moyenne: float
+    batterie_min: int
+    batterie_max: int
+
 class Borne(BorneBase):
     id_borne: int
     est_active: bool
@@ -78,6 +137,14 @@ class Borne(BorneBase):
     class Config:
         from_attributes = True
 
+class BorneCreee(Borne):
+    cle_borne: Optional[str] = None  # Clé HMAC à programmer dans l'ESP32 (avec_cle), affichée une seule fois
+
+class CleBorne(BaseModel):
+    id_borne: int
+    uuid_esp: str
+    cle_borne: str
+
 class Utilisateur(UtilisateurBase):
     id_utilisateur: int
     est_actif: bool
@@ -108,6 +175,17 @@ class Alerte(AlerteBase):
     class Config:
         from_attributes = True
 
+class ResolutionAlertes(BaseModel):
+    ids_alertes: Optional[List[int]] = None
+    borne_id: Optional[int] = None
+    site_id: Optional[int] = None
+    commentaire: str = Field(default="", max_length=1000)
+
+class ResultatResolutionAlertes(BaseModel):
+    alertes_resolues: int
+    interventions_creees: int
+    ids_alertes: List[int]
+
 # Réponses pour l'API
 class BorneAvecDetails(Borne):
     site_nom: Optional[str] = None
@@ -119,6 +197,48 @@ class BorneAvecDetails(Borne):
     class Config:
         from_attributes = True
 
+class BorneChangee(BorneAvecDetails):
+    alertes_actives: int = 0
+
+# Borne réduite par `?fields=` et `?expand=` : champs de BorneChangee, seuls ceux demandés sont présents
+BornePartielle = create_model(
+    "BornePartielle",
+    id_borne=(int, ...),
+    **{
+        nom: (Optional[champ.annotation], None)
+        for nom, champ in BorneChangee.model_fields.items() if nom != "id_borne"
+    }
+)
+
+class ChangementsBornes(BaseModel):
+    curseur: int
+    reste: bool  # D'autres changements sont à lire avec le nouveau curseur
+    bornes: List[BorneChangee]
+    ids_retires: List[int]  # Bornes modifiées qui ne sont plus visibles par l'utilisateur
+
+class EtatNotifications(BaseModel):
+    sinks: List[str]
+    en_attente: int
+    envoyees_en_base: int
+    abandonnees_en_base: int
+    # Compteurs du répartiteur depuis le démarrage du processus
+    envoyees: int
+    echecs: int
+    abandonnees: int
+    derniere_erreur: Optional[str] = None
+
+class HeatmapUtilisation(BaseModel):
+    fuseau: str
+    id_borne: Optional[int] = None
+    id_site: Optional[int] = None
+    salle_local: Optional[str] = None
+    nb_bornes: int
+    # Grilles 7 × 24 : une ligne par jour (lundi en premier), une colonne par heure
+    utilisations: List[List[int]]
+    gel_consomme: List[List[int]]  # Points de pourcentage de gel consommés
+    total_utilisations: int
+    total_gel_consomme: int
+
 class SiteBase(BaseModel):
     nom_site: str = Field(..., max_length=255)
     adresse: Optional[str] = None
@@ -129,3 +249,91 @@ class Site(SiteBase):
     
     class Config:
         from_attributes = True
+
+class AgregatsBornes(BaseModel):
+    nb_bornes: int
+    nb_sans_mesure: int
+    nb_gel_bas: int
+    nb_gel_critique: int
+    nb_batterie_basse: int
+    nb_batterie_critique: int
+    alertes_ouvertes: int
+    moyenne_gel: Optional[float] = None
+    moyenne_batterie: Optional[float] = None
+
+class AgregatsSite(AgregatsBornes):
+    id_site: int
+    nom_site: str
+
+class AgregatsAgent(AgregatsBornes):
+    id_agent: Optional[int] = None
+    agent_nom: Optional[str] = None
+
+class ResumeFlotte(BaseModel):
+    total: AgregatsBornes
+    par_site: List[AgregatsSite]
+    par_agent: List[AgregatsAgent]
+
+class Intervention(BaseModel):
+    id_intervention: int
+    id_borne: int
+    id_agent: int
+    type_intervention: TypeInterventionEnum
+    date_intervention: datetime
+    commentaire: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+# Historique paginé par curseur (passer `curseur_suivant` à la requête suivante)
+class PageAlertes(BaseModel):
+    elements: List[Alerte]
+    curseur_suivant: Optional[str] = None
+
+class PageInterventions(BaseModel):
+    elements: List[Intervention]
+    curseur_suivant: Optional[str] = None
+
+# Analyses des alertes et interventions
+class LigneMTTR(BaseModel):
+    id: Optional[int] = None
+    libelle: Optional[str] = None
+    nb_resolues: int
+    mttr_secondes: float
+    duree_max_secondes: int
+    rang: int
+
+class FrequenceAlertesBorne(BaseModel):
+    id_borne: int
+    nom_borne: Optional[str] = None
+    id_site: int
+    salle_local: str
+    nb_alertes: int
+    nb_gel: int
+    nb_batterie: int
+    nb_hors_ligne: int
+    rang: int
+
+class PageFrequenceAlertes(BaseModel):
+    page: int
+    taille: int
+    total: int
+    elements: List[FrequenceAlertesBorne]
+
+class InterventionsPeriode(BaseModel):
+    periode: date
+    nb_interventions: int
+    nb_remplissage_gel: int
+    nb_changement_batterie: int
+    nb_maintenance: int
+    cumul: int
+
+class EtatSpool(BaseModel):
+    disjoncteur: str
+    ouvertures_disjoncteur: int
+    en_attente: int
+    octets: int
+    taille_max_octets: int
+    fichiers: int
+    rejouees: int
+    ignorees: int
@@ -0,0 +1,109 @@
+"""
+Banc d'essai de l'authentification des bornes sur l'ingestion.
+
+Envoie des mesures à POST /api/mesures/ (client de test, base SQLite
+temporaire) sans authentification puis signées HMAC, et compare les
+latences. Mesure aussi le coût seul de la vérification (cache des clés,
+HMAC, fenêtre des nonces) et vérifie qu'elle ne lit pas la base.
+
+Usage :
+    python scripts/bench_auth_bornes.py [nb_requetes] [nb_bornes]
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Base SQLite temporaire et limites de débit hors de portée, avant l'import de l'application
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{FICHIER_BASE}"
+os.environ["LIMITE_BORNE_CAPACITE"] = os.environ["LIMITE_IP_CAPACITE"] = "1000000000"
+os.environ["SPOOL_ACTIF"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app import models
+from app.core.auth_bornes import DESACTIVE, SI_CLE, authentification_bornes, deriver_cle, signer
+from app.database import Base, SessionLocal, engine, engine_lecture, engine_rapports
+from app.main import app
+
+NB_REQUETES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+NB_BORNES = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+def preparer_base() -> dict:
+    for moteur in (engine, engine_lecture, engine_rapports):
+        moteur.echo = False
+    Base.metadata.create_all(engine)
+    sels = {f"ESP32-{i:05d}": uuid.uuid4().hex for i in range(1, NB_BORNES + 1)}
+    db = SessionLocal()
+    db.execute(insert(models.Site), [{"id_site": 1, "nom_site": "Site de test"}])
+    db.execute(insert(models.Borne), [{
+        "id_borne": i, "uuid_esp": uuid_esp, "id_site": 1, "salle_local": "Hall", "cle_sel": sel
+    } for i, (uuid_esp, sel) in enumerate(sels.items(), start=1)])
+    db.commit()
+    authentification_bornes.cles.charger(db)
+    db.close()
+    return {uuid_esp: deriver_cle(uuid_esp, sel) for uuid_esp, sel in sels.items()}
+
+
+def requetes(cles: dict, signees: bool):
+    uuids = list(cles)
+    for i in range(NB_REQUETES):
+        uuid_esp = uuids[i % len(uuids)]
+        corps = json.dumps({"uuid_esp": uuid_esp, "niveau_gel": 50 + i % 40, "niveau_batterie": 90}).encode()
+        en_tetes = {"Content-Type": "application/json"}
+        if signees:
+            horodatage, nonce = str(int(time.time())), uuid.uuid4().hex
+            en_tetes.update({
+                "X-Borne-Horodatage": horodatage,
+                "X-Borne-Nonce": nonce,
+                "X-Borne-Signature": signer(cles[uuid_esp], horodatage, nonce, corps),
+            })
+        yield corps, en_tetes
+
+
+def mesurer_ingestion(client: TestClient, cles: dict, nom: str, mode: str):
+    authentification_bornes.mode = mode
+    lectures = authentification_bornes.cles.lectures_base
+    durees = []
+    for corps, en_tetes in requetes(cles, signees=mode != DESACTIVE):
+        debut = time.perf_counter()
+        reponse = client.post("/api/mesures/", content=corps, headers=en_tetes)
+        durees.append(time.perf_counter() - debut)
+        assert reponse.status_code == 201, reponse.text
+    durees.sort()
+    print(
+        f"{nom:<26} {statistics.median(durees) * 1000:>8.2f} ms  "
+        f"{durees[int(len(durees) * 0.99)] * 1000:>8.2f} ms  "
+        f"{authentification_bornes.cles.lectures_base - lectures:>13}"
+    )
+
+
+def mesurer_verification(cles: dict):
+    authentification_bornes.mode = SI_CLE
+    preparees = [(json.loads(corps)["uuid_esp"], corps, en_tetes) for corps, en_tetes in requetes(cles, signees=True)]
+    debut = time.perf_counter()
+    for uuid_esp, corps, en_tetes in preparees:
+        _, cle = authentification_bornes.cles.obtenir(uuid_esp)
+        authentification_bornes.verifier(uuid_esp, cle, en_tetes, corps)
+    duree = time.perf_counter() - debut
+    print(f"\nVérification seule : {duree / len(preparees) * 1e6:.1f} µs par requête")
+
+
+if __name__ == "__main__":
+    cles = preparer_base()
+    client = TestClient(app)
+    print(f"📊 {NB_REQUETES} mesures, {NB_BORNES} bornes\n")
+    print(f"{'ingestion':<26} {'médiane':>11}  {'p99':>11}  {'lectures base':>13}")
+    # Premier passage pour chauffer connexions et caches
+    mesurer_ingestion(client, cles, "(chauffe)", DESACTIVE)
+    mesurer_ingestion(client, cles, "sans authentification", DESACTIVE)
+    mesurer_ingestion(client, cles, "signée HMAC", SI_CLE)
+    mesurer_verification(cles)
+    os.remove(FICHIER_BASE)
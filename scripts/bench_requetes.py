@@ -0,0 +1,184 @@
+"""
+Banc d'essai du coût Python des requêtes chaudes.
+
+Pour chaque requête exécutée à chaque mesure reçue ou requête authentifiée
+(borne par uuid_esp, dernière mesure d'une borne, utilisateur par email),
+compare quatre façons de l'écrire : chaîne `db.query(...)` reconstruite,
+`select()` reconstruit, `lambda_stmt` et instruction construite une fois
+(app/core/requetes_preparees.py).
+
+Deux mesures par variante, en microsecondes par appel :
+- construction : création de l'instruction et calcul de sa clé de cache,
+  c'est-à-dire le travail Python fait avant de consulter le cache compilé ;
+- exécution : appel complet sur une base SQLite en mémoire.
+
+Usage :
+    python scripts/bench_requetes.py [nb_appels]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Base SQLite en mémoire, à définir avant l'import de l'application
+os.environ["DATABASE_URL"] = "sqlite://"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert, lambda_stmt, select
+
+from app import models
+from app.core import requetes_preparees
+from app.database import Base, SessionLocal, engine
+
+NB_APPELS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+NB_BORNES = 500
+
+
+def preparer_base():
+    engine.echo = False
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.execute(insert(models.Utilisateur), [{
+        "id_utilisateur": i, "email": f"agent{i}@bench.fr", "mot_de_passe_hash": "x",
+        "nom": "Bench", "prenom": "Agent", "role": models.RoleEnum.agent
+    } for i in range(1, 51)])
+    db.execute(insert(models.Site), [{"id_site": 1, "nom_site": "Site de test"}])
+    db.execute(insert(models.Borne), [{
+        "id_borne": i, "uuid_esp": f"ESP32-{i:05d}", "id_site": 1, "salle_local": "Hall"
+    } for i in range(1, NB_BORNES + 1)])
+    debut = datetime(2024, 1, 1)
+    db.execute(insert(models.Mesure), [{
+        "id_mesure": i, "id_borne": 1 + i % NB_BORNES, "niveau_gel": i % 100,
+        "niveau_batterie": 90, "horodatage": debut + timedelta(minutes=i)
+    } for i in range(1, 20 * NB_BORNES + 1)])
+    db.commit()
+    db.close()
+
+
+# --- Les trois requêtes, construites à chaque appel ---
+
+def borne_query(db, uuid_esp):
+    return db.query(models.Borne).filter(models.Borne.uuid_esp == uuid_esp)
+
+
+def borne_select(uuid_esp):
+    return select(models.Borne).where(models.Borne.uuid_esp == uuid_esp)
+
+
+def borne_lambda(uuid_esp):
+    return lambda_stmt(lambda: select(models.Borne).where(models.Borne.uuid_esp == uuid_esp))
+
+
+def mesure_query(db, id_borne):
+    return db.query(
+        models.Mesure.horodatage, models.Mesure.niveau_gel, models.Mesure.niveau_batterie
+    ).filter(models.Mesure.id_borne == id_borne).order_by(models.Mesure.horodatage.desc()).limit(1)
+
+
+def mesure_select(id_borne):
+    return select(
+        models.Mesure.horodatage, models.Mesure.niveau_gel, models.Mesure.niveau_batterie
+    ).where(models.Mesure.id_borne == id_borne).order_by(models.Mesure.horodatage.desc()).limit(1)
+
+
+def mesure_lambda(id_borne):
+    return lambda_stmt(lambda: select(
+        models.Mesure.horodatage, models.Mesure.niveau_gel, models.Mesure.niveau_batterie
+    ).where(models.Mesure.id_borne == id_borne).order_by(models.Mesure.horodatage.desc()).limit(1))
+
+
+def utilisateur_query(db, email):
+    return db.query(models.Utilisateur).filter(models.Utilisateur.email == email)
+
+
+def utilisateur_select(email):
+    return select(models.Utilisateur).where(models.Utilisateur.email == email)
+
+
+def utilisateur_lambda(email):
+    return lambda_stmt(lambda: select(models.Utilisateur).where(models.Utilisateur.email == email))
+
+
+def variantes(query, construire, construire_lambda, preparee, parametre, executer, fonction):
+    """Par variante : (construction de l'instruction avec sa clé de cache, exécution complète)."""
+    return {
+        "db.query()": (
+            lambda db, v: query(db, v)._statement_20()._generate_cache_key(),
+            lambda db, v: query(db, v).first(),
+        ),
+        "select()": (
+            lambda db, v: construire(v)._generate_cache_key(),
+            lambda db, v: executer(db, construire(v)),
+        ),
+        "lambda_stmt": (
+            lambda db, v: construire_lambda(v)._generate_cache_key(),
+            lambda db, v: executer(db, construire_lambda(v)),
+        ),
+        "préparée": (
+            lambda db, v: (preparee._generate_cache_key(), {parametre: v}),
+            fonction,
+        ),
+    }
+
+
+def premiere_entite(db, instruction):
+    return db.scalars(instruction).first()
+
+
+def premiere_ligne(db, instruction):
+    return db.execute(instruction).first()
+
+
+REQUETES = {
+    "borne par uuid_esp": (
+        lambda i: f"ESP32-{1 + i % NB_BORNES:05d}",
+        variantes(
+            borne_query, borne_select, borne_lambda, requetes_preparees.BORNE_PAR_UUID, "uuid_esp",
+            premiere_entite, requetes_preparees.borne_par_uuid
+        ),
+    ),
+    "dernière mesure": (
+        lambda i: 1 + i % NB_BORNES,
+        variantes(
+            mesure_query, mesure_select, mesure_lambda, requetes_preparees.PRECEDENTE_MESURE, "id_borne",
+            premiere_ligne, requetes_preparees.precedente_mesure
+        ),
+    ),
+    "utilisateur par email": (
+        lambda i: f"agent{1 + i % 50}@bench.fr",
+        variantes(
+            utilisateur_query, utilisateur_select, utilisateur_lambda, requetes_preparees.UTILISATEUR_PAR_EMAIL, "email",
+            premiere_entite, requetes_preparees.utilisateur_par_email
+        ),
+    ),
+}
+
+
+def par_appel(fonction) -> float:
+    """Durée moyenne d'un appel, en microsecondes."""
+    fonction(0)  # Premier appel : compilation et mise en cache
+    debut = time.perf_counter()
+    for i in range(NB_APPELS):
+        fonction(i)
+    return (time.perf_counter() - debut) / NB_APPELS * 1e6
+
+
+def mesurer(nom: str, valeur, variantes_requete: dict):
+    db = SessionLocal()
+    print(f"\n{nom}")
+    for variante, (construire, executer) in variantes_requete.items():
+        construction = par_appel(lambda i: construire(db, valeur(i)))
+        execution = par_appel(lambda i: executer(db, valeur(i)))
+        print(f"  {variante:<14} {construction:>10.1f} µs  {execution:>10.1f} µs")
+    db.close()
+
+
+if __name__ == "__main__":
+    preparer_base()
+    requetes_preparees.suivre_cache(engine, "bench")
+    print(f"📊 {NB_APPELS} appels par variante\n")
+    print(f"  {'variante':<14} {'construction':>13}  {'exécution':>11}")
+    for nom, (valeur, variantes_requete) in REQUETES.items():
+        mesurer(nom, valeur, variantes_requete)
+    moteur = requetes_preparees.statistiques()["moteurs"]["bench"]
+    print(f"\nCache compilé : {moteur['trouvees']} exécutions trouvées, {moteur['compilees']} compilées")
@@ -0,0 +1,121 @@
+"""
+Banc d'essai du chemin de sérialisation rapide des listes.
+
+Compare, sur 10 000 lignes, l'ancien chemin (objets ORM + revalidation
+pydantic + jsonable_encoder) et le nouveau (lignes SQL + reponse_json),
+en temps CPU et en pic mémoire (tracemalloc).
+
+Usage :
+    python scripts/bench_serialisation.py [nb_lignes]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+
+# Base SQLite en mémoire, à définir avant l'import de l'application
+os.environ["DATABASE_URL"] = "sqlite://"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.orm import joinedload
+
+from app import models, schemas
+from app.database import Base, SessionLocal, engine
+from app.core.requetes import borne_depuis_ligne, requete_bornes_details
+from app.core.serialisation import reponse_json
+
+NB_LIGNES = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+def preparer_base():
+    engine.echo = False
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.execute(insert(models.Utilisateur), [{
+        "id_utilisateur": 1, "email": "agent@bench.fr", "mot_de_passe_hash": "x",
+        "nom": "Bench", "prenom": "Agent", "role": models.RoleEnum.agent
+    }])
+    db.execute(insert(models.Site), [{"id_site": 1, "nom_site": "Site de test"}])
+    db.execute(insert(models.Borne), [{
+        "id_borne": i, "uuid_esp": f"ESP32-{i:05d}", "nom_borne": f"Borne {i}", "id_site": 1,
+        "salle_local": "Hall", "seuil_alerte_gel": 10, "seuil_alerte_batterie": 10,
+        "id_agent_affecte": 1, "est_active": True
+    } for i in range(1, NB_LIGNES + 1)])
+    debut = datetime(2024, 1, 1)
+    db.execute(insert(models.Mesure), [{
+        "id_mesure": i, "id_borne": 1 + (i % NB_LIGNES) if i > NB_LIGNES else i,
+        "niveau_gel": i % 100, "niveau_batterie": (i * 7) % 100,
+        "horodatage": debut + timedelta(minutes=i)
+    } for i in range(1, 2 * NB_LIGNES + 1)])
+    db.commit()
+    db.close()
+
+
+def ancien_get_bornes(db) -> bytes:
+    bornes = db.query(models.Borne).options(
+        joinedload(models.Borne.site),
+        joinedload(models.Borne.agent_affecte)
+    ).all()
+    result = []
+    for borne in bornes:
+        derniere_mesure = db.query(models.Mesure).filter(
+            models.Mesure.id_borne == borne.id_borne
+        ).order_by(models.Mesure.horodatage.desc()).first()
+        result.append({
+            **borne.__dict__,
+            "site_nom": borne.site.nom_site if borne.site else None,
+            "agent_nom": f"{borne.agent_affecte.prenom} {borne.agent_affecte.nom}" if borne.agent_affecte else None,
+            "dernier_niveau_gel": derniere_mesure.niveau_gel if derniere_mesure else None,
+            "dernier_niveau_batterie": derniere_mesure.niveau_batterie if derniere_mesure else None,
+            "derniere_mesure": derniere_mesure.horodatage if derniere_mesure else None
+        })
+    valides = TypeAdapter(List[schemas.BorneAvecDetails]).validate_python(result)
+    return json.dumps(jsonable_encoder(valides)).encode()
+
+
+def nouveau_get_bornes(db) -> bytes:
+    return reponse_json([borne_depuis_ligne(ligne) for ligne in db.execute(requete_bornes_details())]).body
+
+
+def ancien_historique(db) -> bytes:
+    mesures = db.query(models.Mesure).order_by(models.Mesure.horodatage.desc()).limit(NB_LIGNES).all()
+    valides = TypeAdapter(List[schemas.Mesure]).validate_python(mesures, from_attributes=True)
+    return json.dumps(jsonable_encoder(valides)).encode()
+
+
+def nouveau_historique(db) -> bytes:
+    lignes = db.execute(select(
+        models.Mesure.id_mesure, models.Mesure.id_borne, models.Mesure.niveau_gel,
+        models.Mesure.niveau_batterie, models.Mesure.horodatage, models.Mesure.sequence
+    ).order_by(models.Mesure.horodatage.desc()).limit(NB_LIGNES)).all()
+    return reponse_json([ligne._asdict() for ligne in lignes]).body
+
+
+def mesurer(nom: str, fonction):
+    db = SessionLocal()
+    tracemalloc.start()
+    debut_cpu = time.process_time()
+    debut = time.perf_counter()
+    corps = fonction(db)
+    duree = time.perf_counter() - debut
+    cpu = time.process_time() - debut_cpu
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    print(f"{nom:<22} {duree * 1000:>9.1f} ms  {cpu * 1000:>9.1f} ms CPU  {pic / 1024 / 1024:>7.1f} Mo pic  {len(corps) / 1024:>8.1f} Ko")
+
+
+if __name__ == "__main__":
+    preparer_base()
+    print(f"📊 {NB_LIGNES} lignes\n")
+    print(f"{'chemin':<22} {'durée':>12}  {'CPU':>13}  {'mémoire':>14}  {'taille':>11}")
+    mesurer("get_bornes (ancien)", ancien_get_bornes)
+    mesurer("get_bornes (rapide)", nouveau_get_bornes)
+    mesurer("historique (ancien)", ancien_historique)
+    mesurer("historique (rapide)", nouveau_historique)
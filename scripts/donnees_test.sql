@@ -0,0 +1,14 @@
+-- Données de test, à charger après `alembic upgrade head`
+USE borne_gel_db;
+
+-- Insertion d'un utilisateur administrateur de test (mot de passe: admin123)
+INSERT INTO utilisateurs (email, mot_de_passe_hash, nom, prenom, role) VALUES
+('admin@bornegel.fr', '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW', 'Admin', 'System', 'fournisseur');
+
+-- Insertion d'un site de test
+INSERT INTO sites (nom_site, adresse, id_responsable_technique) VALUES
+('Lycée Jean Rostand - Bâtiment A', '123 Avenue de la République, Villepinte', 1);
+
+-- Insertion d'une borne de test
+INSERT INTO bornes (uuid_esp, nom_borne, id_site, salle_local, seuil_alerte_gel, seuil_alerte_batterie) VALUES
+('ESP32-001', 'Borne Entrée Principale', 1, 'Hall RDC', 15, 20);
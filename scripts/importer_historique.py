@@ -0,0 +1,94 @@
+"""
+Import hors ligne d'un historique de mesures (reprise des données d'un autre système).
+
+Le fichier (CSV avec en-têtes, JSON Lines ou liste JSON) contient une mesure
+par ligne : uuid_esp, niveau_gel, niveau_batterie, horodatage (ISO 8601 ou
+secondes Unix, UTC si sans fuseau) et sequence (facultative). Les lignes
+invalides ou de bornes inconnues sont écrites dans `<fichier>.rejets.csv`
+avec leur numéro et le motif du refus.
+
+L'import est réparti sur plusieurs processus (`--voies`), par lots, et
+reprend là où il s'était arrêté s'il est relancé sur le même fichier
+(point de reprise `<fichier>.reprise.json` ; `--recommencer` l'ignore).
+Les heatmaps des bornes importées sont ensuite recalculées (sauf
+`--sans-rollups`) ; les alertes ne sont créées qu'avec `--alertes etat_final`,
+d'après la dernière mesure de chaque borne.
+
+À lancer API arrêtée (stockage segments, recalcul des heatmaps) ; redémarrer
+ensuite l'API, dont les caches ignorent les mesures importées.
+`--methode load_data` (LOAD DATA LOCAL INFILE) demande MySQL, le stockage
+SQL et `local_infile` activé sur le serveur.
+
+Usage :
+    python scripts/importer_historique.py fichier.csv [--voies 4] [--lot 5000]
+        [--format csv|jsonl|json] [--methode insert|load_data] [--alertes aucune|etat_final]
+        [--sans-rollups] [--recommencer] [--rejets rejets.csv]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core import import_historique
+from app.core.import_historique import ImportHistorique
+
+
+def format_du_fichier(chemin: str) -> str:
+    extension = os.path.splitext(chemin)[1].lower()
+    return {".jsonl": import_historique.JSONL, ".ndjson": import_historique.JSONL, ".json": import_historique.JSON}.get(
+        extension, import_historique.CSV
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("fichier")
+    parser.add_argument("--format", choices=[import_historique.CSV, import_historique.JSONL, import_historique.JSON])
+    parser.add_argument("--voies", type=int, default=4, help="Processus d'import en parallèle")
+    parser.add_argument("--lot", type=int, default=5000, help="Lignes lues par lot")
+    parser.add_argument("--methode", choices=[import_historique.INSERT, import_historique.LOAD_DATA], default=import_historique.INSERT)
+    parser.add_argument("--alertes", choices=[import_historique.AUCUNE, import_historique.ETAT_FINAL], default=import_historique.AUCUNE)
+    parser.add_argument("--sans-rollups", action="store_true", help="Ne pas recalculer les heatmaps")
+    parser.add_argument("--recommencer", action="store_true", help="Ignorer le point de reprise")
+    parser.add_argument("--rejets", help="Fichier CSV des lignes refusées")
+    arguments = parser.parse_args()
+
+    try:
+        importation = ImportHistorique(
+            arguments.fichier,
+            arguments.format or format_du_fichier(arguments.fichier),
+            voies=arguments.voies,
+            taille_lot=arguments.lot,
+            methode=arguments.methode,
+            alertes=arguments.alertes,
+            rollups=not arguments.sans_rollups,
+            chemin_rejets=arguments.rejets,
+        )
+        if not arguments.recommencer and importation.charger_reprise():
+            print(f"Reprise : étape {importation.reprise['etape']}, ligne {importation.reprise['ligne']}")
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    debut = time.perf_counter()
+
+    def afficher(etat: dict):
+        duree = time.perf_counter() - debut
+        if "lues" in etat:
+            print(f"\r{etat['lues']} lues, {etat['nouvelles']} enregistrées, {etat['rejetees']} rejetées "
+                  f"({etat['lues'] / duree:,.0f} lignes/s)", end="", flush=True)
+        else:
+            print(f"\n{', '.join(f'{cle} : {valeur}' for cle, valeur in etat.items())}", end="", flush=True)
+
+    compteurs = importation.executer(afficher)
+    print(f"\n✅ Import terminé en {time.perf_counter() - debut:.1f} s : {compteurs['lues']} lignes lues, "
+          f"{compteurs['nouvelles']} mesures enregistrées, {compteurs['rejetees']} rejetées")
+    if compteurs["rejetees"]:
+        print(f"Lignes refusées : {importation.chemin_rejets}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
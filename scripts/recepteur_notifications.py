@@ -0,0 +1,79 @@
+"""
+Récepteur HTTP local des notifications d'alerte, pour tester le répartiteur.
+
+Remplace la passerelle réelle (e-mail, SMS) derrière le sink `webhook` :
+affiche chaque message reçu et peut simuler des pannes pour vérifier les
+nouvelles tentatives et le délai exponentiel.
+
+Usage :
+    python scripts/recepteur_notifications.py [--port 8099] [--echecs 0.3] [--sortie messages.jsonl]
+
+puis lancer l'API avec :
+    OUTBOX_SINKS='["webhook"]' OUTBOX_WEBHOOK_URL=http://127.0.0.1:8099/notifications
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def creer_serveur(port: int, taux_echec: float = 0.0, sortie=None) -> ThreadingHTTPServer:
+    """Serveur prêt à lancer (`serve_forever`). `serveur.messages` garde les messages reçus."""
+    verrou = threading.Lock()
+    vus = set()
+
+    class Recepteur(BaseHTTPRequestHandler):
+        def do_POST(self):
+            corps = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if random.random() < taux_echec:
+                self.send_response(503)
+                self.end_headers()
+                return
+            message = json.loads(corps)
+            ids = [alerte["id_notification"] for alerte in message["alertes"]]
+            with verrou:
+                # Envoi « au moins une fois » : les renvois sont reconnus
+                doublons = [i for i in ids if i in vus]
+                vus.update(ids)
+                serveur.messages.append(message)
+                if sortie:
+                    sortie.write(json.dumps(message) + "\n")
+                    sortie.flush()
+            agent = message["agent"]["email"] if message["agent"] else "sans agent"
+            print(f"{agent}: {message['nb_alertes']} alerte(s)" + (f", {len(doublons)} déjà reçue(s)" if doublons else ""))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    serveur = ThreadingHTTPServer(("127.0.0.1", port), Recepteur)
+    serveur.messages = []
+    return serveur
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--echecs", type=float, default=0.0, help="Proportion de réponses 503 simulées")
+    parser.add_argument("--sortie", help="Fichier JSONL des messages reçus")
+    arguments = parser.parse_args()
+
+    sortie = open(arguments.sortie, "a", encoding="utf-8") if arguments.sortie else None
+    serveur = creer_serveur(arguments.port, arguments.echecs, sortie)
+    print(f"Récepteur de notifications sur http://127.0.0.1:{arguments.port}/notifications")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+        if sortie:
+            sortie.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Reconstruction des heatmaps d'utilisation depuis l'historique des mesures.
+
+Les heatmaps sont tenues à jour par l'ingestion ; ce script les recalcule
+entièrement, par exemple à leur mise en service ou après un arrêt brutal
+(les compteurs accumulés en mémoire depuis le dernier enregistrement sont
+alors perdus). Fonctionne avec les deux stockages de mesures (SQL, shards
+compris, ou segments).
+
+À lancer API arrêtée : les mesures reçues pendant la reconstruction d'une
+borne pourraient sinon être comptées deux fois.
+
+Usage :
+    python scripts/reconstruire_heatmaps.py [id_borne ...]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select
+
+from app import models
+from app.core import heatmaps
+from app.database import SessionLocal
+
+
+def main(ids_bornes) -> int:
+    db = SessionLocal()
+    try:
+        if not ids_bornes:
+            ids_bornes = list(db.scalars(select(models.Borne.id_borne).order_by(models.Borne.id_borne)))
+        for id_borne in ids_bornes:
+            nb = heatmaps.reconstruire_borne(db, id_borne)
+            db.commit()
+            print(f"Borne {id_borne} : {nb} mesures")
+    finally:
+        db.close()
+    print(f"{len(ids_bornes)} heatmap(s) reconstruite(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main([int(argument) for argument in sys.argv[1:]]))